@@ -0,0 +1,120 @@
+import threading
+import weakref
+
+
+class ReaderHandle:
+    """スレッドローカルに置く読み取り接続の保持用オブジェクト
+
+    スレッドの終了時（QThreadPool のスレッドでは1つのジョブの終了時）に
+    スレッドローカルのデータと一緒に破棄され、その時点で接続を閉じる。
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+
+class ConnectionPool:
+    """スレッドごとの読み取り接続と、単一の書き込み接続を管理するプール
+
+    読み取りは呼び出したスレッド専用の接続で行うため、バックグラウンド処理の
+    検索とUIスレッドの一覧表示は互いを待たない。読み取り接続はスレッドが
+    終わると閉じるため、ワーカースレッドが入れ替わっても接続は増え続けない。
+    一覧の検索のように短いジョブを繰り返す処理は acquire_reader /
+    return_reader で共有の接続を借りて返し、最大 max_idle_readers 本を使い回す。
+    書き込みは1本の接続に限定し、write_lock で直列化する。
+    """
+
+    def __init__(self, connect_func, write_lock=None, max_idle_readers=2):
+        """初期化
+
+        connect_func は設定済みの新しい sqlite3.Connection を返す関数。
+        """
+        self.connect_func = connect_func
+        self.write_lock = write_lock or threading.RLock()
+        self.writer = connect_func()
+        self.local = threading.local()
+        self.readers = []
+        # 返却されて次の貸し出しを待っている共有の読み取り接続
+        self.idle_readers = []
+        self.max_idle_readers = max_idle_readers
+        self.readers_lock = threading.Lock()
+        self.closed = False
+
+    def get_reader(self):
+        """現在のスレッド専用の読み取り接続を取得（初回のみ作成）"""
+        if self.closed:
+            raise Exception("データベースが接続されていません")
+
+        handle = getattr(self.local, 'handle', None)
+        if handle is None:
+            connection = self.connect_func()
+            handle = ReaderHandle(connection)
+            self.local.handle = handle
+            weakref.finalize(handle, self.release_reader, connection)
+
+            with self.readers_lock:
+                self.readers.append(connection)
+
+        return handle.connection
+
+    def acquire_reader(self):
+        """共有の読み取り接続を借りる（使い終わったら return_reader で返す）"""
+        if self.closed:
+            raise Exception("データベースが接続されていません")
+
+        with self.readers_lock:
+            if self.idle_readers:
+                return self.idle_readers.pop()
+
+        connection = self.connect_func()
+
+        with self.readers_lock:
+            self.readers.append(connection)
+
+        return connection
+
+    def return_reader(self, connection):
+        """借りた読み取り接続を返す（待機中の接続が上限に達していれば閉じる）"""
+        with self.readers_lock:
+            if not self.closed and len(self.idle_readers) < self.max_idle_readers:
+                self.idle_readers.append(connection)
+                return
+
+        self.release_reader(connection)
+
+    def release_reader(self, connection):
+        """スレッドの終了した読み取り接続を閉じる"""
+        with self.readers_lock:
+            if connection in self.readers:
+                self.readers.remove(connection)
+
+        try:
+            connection.close()
+        except Exception as e:
+            print(f"読み取り接続切断エラー: {e}")
+
+    def get_reader_count(self):
+        """開いている読み取り接続数を取得"""
+        with self.readers_lock:
+            return len(self.readers)
+
+    def close_all(self):
+        """全ての接続を閉じる"""
+        self.closed = True
+
+        with self.readers_lock:
+            readers = list(self.readers)
+            self.readers = []
+            self.idle_readers = []
+
+        for connection in readers:
+            try:
+                connection.close()
+            except Exception as e:
+                print(f"読み取り接続切断エラー: {e}")
+
+        with self.write_lock:
+            try:
+                self.writer.close()
+            except Exception as e:
+                print(f"書き込み接続切断エラー: {e}")
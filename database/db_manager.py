@@ -1,11 +1,32 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from database.connection_pool import ConnectionPool
+from database.migrations import run_migrations, sync_table_columns, ensure_enrollment_indexes, get_schema_version, DATA_TABLES
+from database.slice_statistics import refresh_slice_statistics, rebuild_slice_statistics
 
 
 class DatabaseManager:
     """データベース管理クラス"""
     
-    def __init__(self, db_path=None):
+    # 接続プロファイルの既定値（settings.json の database.connection_profile で上書き）
+    # マスタ管理アプリと同じファイルを同時に読み書きするため WAL を使う。
+    # WAL はネットワーク共有上のファイルでは使えないため、その場合は DELETE を指定する。
+    DEFAULT_CONNECTION_PROFILE = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size_kb': 65536,
+        'mmap_size_mb': 256,
+        'temp_store': 'MEMORY',
+        'busy_timeout_ms': 10000
+    }
+    
+    JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+    SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+    TEMP_STORE_MODES = {'DEFAULT', 'FILE', 'MEMORY'}
+    
+    def __init__(self, db_path=None, connection_profile=None):
         """初期化"""
         if db_path is None:
             # デフォルトパス
@@ -16,19 +37,224 @@ class DatabaseManager:
         else:
             self.db_path = db_path
         
+        # 書き込み用の接続（読み取りはスレッドごとの接続を使う）
         self.connection = None
+        self.pool = None
+        self.connection_profile = self.build_connection_profile(connection_profile)
+        # 書き込み接続を使う処理を直列化するロック
+        self.lock = threading.RLock()
+        # transaction() の入れ子の深さ（0 のときは文ごとにコミット）と実行中のスレッド
+        self.transaction_depth = 0
+        self.transaction_owner = None
+        # テーブルごとの変更カウンタ（取り込み・削除で増やし、一覧のキャッシュの判定に使う）
+        self.table_versions = {}
+        self.table_versions_lock = threading.Lock()
+        self.external_data_version = 0
     
     def connect(self):
         """データベース接続"""
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row
+            self.pool = ConnectionPool(self.open_connection, self.lock)
+            self.connection = self.pool.writer
             self.create_tables()
+            self.migrate()
             return True
         except Exception as e:
             print(f"データベース接続エラー: {e}")
             raise
     
+    def build_connection_profile(self, connection_profile):
+        """既定値に設定値を重ねて接続プロファイルを作成（不正な値は既定値を使用）"""
+        profile = dict(self.DEFAULT_CONNECTION_PROFILE)
+        
+        for key, value in (connection_profile or {}).items():
+            if key not in profile:
+                print(f"警告: 未対応の接続設定を無視しました: {key}")
+                continue
+            
+            default = self.DEFAULT_CONNECTION_PROFILE[key]
+            
+            try:
+                if isinstance(default, int):
+                    value = int(value)
+                else:
+                    value = str(value).upper()
+            except (TypeError, ValueError):
+                print(f"警告: 接続設定の値が不正です。既定値を使用します: {key}={value}")
+                continue
+            
+            allowed = {
+                'journal_mode': self.JOURNAL_MODES,
+                'synchronous': self.SYNCHRONOUS_MODES,
+                'temp_store': self.TEMP_STORE_MODES
+            }.get(key)
+            
+            if (allowed and value not in allowed) or (isinstance(value, int) and value < 0):
+                print(f"警告: 接続設定の値が不正です。既定値を使用します: {key}={value}")
+                continue
+            
+            profile[key] = value
+        
+        return profile
+    
+    def open_connection(self):
+        """接続プロファイルを適用した新しい接続を作成（プールから呼ばれる）"""
+        # 書き込み接続はロックで直列化して複数スレッドから使うため、スレッド間共有を許可
+        connection = sqlite3.connect(
+            self.db_path,
+            timeout=self.connection_profile['busy_timeout_ms'] / 1000,
+            check_same_thread=False
+        )
+        connection.row_factory = sqlite3.Row
+        self.apply_connection_profile(connection)
+        return connection
+    
+    def apply_connection_profile(self, connection):
+        """接続プロファイルのPRAGMAを適用"""
+        profile = self.connection_profile
+        
+        connection.execute(f"PRAGMA busy_timeout = {profile['busy_timeout_ms']}")
+        
+        # journal_mode は他の接続がロック中だと変更できないため、失敗しても接続は続行
+        try:
+            mode = connection.execute(f"PRAGMA journal_mode = {profile['journal_mode']}").fetchone()[0]
+            if mode.upper() != profile['journal_mode']:
+                print(f"警告: journal_mode を {profile['journal_mode']} に変更できませんでした（現在: {mode}）")
+        except sqlite3.OperationalError as e:
+            print(f"警告: journal_mode 設定エラー: {e}")
+        
+        connection.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+        # 負の値は KiB 単位の指定
+        connection.execute(f"PRAGMA cache_size = -{profile['cache_size_kb']}")
+        connection.execute(f"PRAGMA mmap_size = {profile['mmap_size_mb'] * 1024 * 1024}")
+        connection.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+    
+    def get_pragma_report(self):
+        """現在有効なPRAGMAの値を取得"""
+        synchronous_names = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+        temp_store_names = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+        
+        with self.lock:
+            def pragma(name):
+                return self.connection.execute(f"PRAGMA {name}").fetchone()[0]
+            
+            cache_size = pragma('cache_size')
+            page_size = pragma('page_size')
+            
+            return {
+                'journal_mode': str(pragma('journal_mode')).upper(),
+                'synchronous': synchronous_names.get(pragma('synchronous'), 'UNKNOWN'),
+                # 正の値はページ数、負の値は KiB
+                'cache_size_kb': -cache_size if cache_size < 0 else cache_size * page_size // 1024,
+                'mmap_size_mb': pragma('mmap_size') // (1024 * 1024),
+                'temp_store': temp_store_names.get(pragma('temp_store'), 'UNKNOWN'),
+                'busy_timeout_ms': pragma('busy_timeout'),
+                'page_size': page_size
+            }
+    
+    def migrate(self):
+        """スキーマのマイグレーションと db_columns.json のカラム反映"""
+        with self.lock:
+            run_migrations(self.connection)
+            
+            config_path = Path(__file__).parent.parent / 'config' / 'db_columns.json'
+            sync_table_columns(self.connection, config_path)
+            
+            # 履修者テーブルはマイグレーション後に作られることがあるため毎回確認
+            ensure_enrollment_indexes(self.connection)
+    
+    def get_schema_version(self):
+        """適用済みのスキーマバージョンを取得"""
+        with self.lock:
+            return get_schema_version(self.connection)
+    
+    def mark_table_changed(self, table_name):
+        """テーブルの変更カウンタを増やす（取り込み・削除の後に呼ぶ）"""
+        with self.table_versions_lock:
+            self.table_versions[table_name] = self.table_versions.get(table_name, 0) + 1
+    
+    def get_table_version(self, table_name):
+        """テーブルの変更カウンタを取得"""
+        with self.table_versions_lock:
+            return self.table_versions.get(table_name, 0)
+    
+    def get_external_data_version(self):
+        """他のプロセス（マスタ管理アプリなど）による更新を検出するための値を取得
+        
+        書き込み接続の PRAGMA data_version は、このアプリ自身の書き込み（操作ログを
+        含む）では変わらず、他の接続のコミットでだけ変わる。読み取り接続はコミット
+        しないため、変わった場合は他のプロセスによる書き込みとみなせる。
+        取り込み中などで書き込み接続が使用中の場合は待たずに前回の値を返す。
+        """
+        if not self.connection or not self.lock.acquire(blocking=False):
+            return self.external_data_version
+        
+        try:
+            self.external_data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"データバージョン取得エラー: {e}")
+        finally:
+            self.lock.release()
+        
+        return self.external_data_version
+    
+    def refresh_slice_statistics(self, table_name, year, period=None, source_file=None):
+        """年度・期間の集計を再計算（取り込み・削除と同じトランザクション内でも呼べる）
+        
+        集計を更新したテーブルは変更カウンタも増やす。
+        """
+        try:
+            with self.transaction() as connection:
+                refresh_slice_statistics(connection, table_name, year, period, source_file)
+        except Exception as e:
+            print(f"集計更新エラー: {e}")
+            raise
+        finally:
+            self.mark_table_changed(table_name)
+    
+    def rebuild_slice_statistics(self):
+        """全テーブルの集計を作り直す"""
+        try:
+            with self.transaction() as connection:
+                rebuild_slice_statistics(
+                    connection,
+                    [table_name for table_name in DATA_TABLES.values() if self.table_exists(table_name)]
+                )
+        except Exception as e:
+            print(f"集計再作成エラー: {e}")
+            raise
+        finally:
+            for table_name in DATA_TABLES.values():
+                self.mark_table_changed(table_name)
+    
+    def get_slice_statistics(self, table_name, year, period=None):
+        """集計テーブルから件数を取得（period 省略時は年度の全期間の合計）
+        
+        生徒数・講座数は期間をまたいで合計できないため、1期間分のときだけ返す。
+        """
+        query = "SELECT * FROM slice_statistics WHERE table_name = ? AND year = ?"
+        params = [table_name, year]
+        if period is not None:
+            query += " AND period = ?"
+            params.append(period)
+        
+        rows = [dict(row) for row in self.fetch_all(query, tuple(params))]
+        latest = max(rows, key=lambda row: row['last_import_at'] or '', default={})
+        
+        return {
+            'row_count': sum(row['row_count'] for row in rows),
+            'student_count': rows[0]['student_count'] if len(rows) == 1 else None,
+            'course_count': rows[0]['course_count'] if len(rows) == 1 else None,
+            'last_import_at': latest.get('last_import_at'),
+            'source_file': latest.get('source_file'),
+            'slice_count': len(rows)
+        }
+    
+    def list_slice_statistics(self):
+        """全テーブル・全期間の集計を取得"""
+        query = "SELECT * FROM slice_statistics ORDER BY year DESC, table_name, period"
+        return [dict(row) for row in self.fetch_all(query)]
+    
     def get_connection(self):
         """データベース接続を取得"""
         if self.connection is None:
@@ -37,123 +263,222 @@ class DatabaseManager:
     
     def close(self):
         """データベース切断"""
-        if self.connection:
+        if self.pool:
             try:
-                self.connection.close()
-                self.connection = None
+                self.pool.close_all()
             except Exception as e:
                 print(f"データベース切断エラー: {e}")
+            
+            self.pool = None
+            self.connection = None
     
     def create_tables(self):
         """テーブル作成 (db_columns.json の定義に基づく)"""
         try:
-            # 評定テーブル
-            self.execute_query("""
-                CREATE TABLE IF NOT EXISTS grades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    year INTEGER,
-                    period TEXT,
-                    student_number TEXT,
-                    student_name TEXT,
-                    course_number TEXT,
-                    course_name TEXT,
-                    school_subject_name TEXT,
-                    grade_value INTEGER,
-                    credits INTEGER,
-                    acquisition_credits INTEGER,
-                    remarks TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_number, course_number, period, year)
-                )
-            """)
-            
-            # 観点別評価テーブル
-            self.execute_query("""
-                CREATE TABLE IF NOT EXISTS viewpoint_evaluations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    year INTEGER,
-                    period TEXT,
-                    student_number TEXT,
-                    student_name TEXT,
-                    course_number TEXT,
-                    course_name TEXT,
-                    school_subject_name TEXT,
-                    viewpoint_1 TEXT,
-                    viewpoint_2 TEXT,
-                    viewpoint_3 TEXT,
-                    viewpoint_4 TEXT,
-                    viewpoint_5 TEXT,
-                    remarks TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_number, course_number, period, year)
-                )
-            """)
-            
-            # 欠課情報テーブル
-            self.execute_query("""
-                CREATE TABLE IF NOT EXISTS absences (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_number TEXT,
-                    class_name TEXT,
-                    attendance_number INTEGER,
-                    student_name TEXT,
-                    absent_count INTEGER,
-                    course_name TEXT,
-                    subject_category_number TEXT,
-                    subject_number TEXT,
-                    course_number TEXT,
-                    year INTEGER,
-                    period TEXT,
-                    absence_mark TEXT,
-                    absence_type INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(student_number, course_number, period, year)
-                )
-            """)
-            
-            # 操作ログテーブル
-            self.execute_query("""
-                CREATE TABLE IF NOT EXISTS action_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    action_type TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            # 全テーブルの作成を1回のコミットにまとめる
+            with self.transaction():
+                # 評定テーブル
+                self.execute_query("""
+                    CREATE TABLE IF NOT EXISTS grades (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        year INTEGER,
+                        period TEXT,
+                        student_number TEXT,
+                        student_name TEXT,
+                        course_number TEXT,
+                        course_name TEXT,
+                        school_subject_name TEXT,
+                        grade_value INTEGER,
+                        credits INTEGER,
+                        acquisition_credits INTEGER,
+                        remarks TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(student_number, course_number, period, year)
+                    )
+                """)
+            
+                # 観点別評価テーブル
+                self.execute_query("""
+                    CREATE TABLE IF NOT EXISTS viewpoint_evaluations (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        year INTEGER,
+                        period TEXT,
+                        student_number TEXT,
+                        student_name TEXT,
+                        course_number TEXT,
+                        course_name TEXT,
+                        school_subject_name TEXT,
+                        viewpoint_1 TEXT,
+                        viewpoint_2 TEXT,
+                        viewpoint_3 TEXT,
+                        viewpoint_4 TEXT,
+                        viewpoint_5 TEXT,
+                        remarks TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(student_number, course_number, period, year)
+                    )
+                """)
+            
+                # 欠課情報テーブル
+                self.execute_query("""
+                    CREATE TABLE IF NOT EXISTS absences (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        student_number TEXT,
+                        class_name TEXT,
+                        attendance_number INTEGER,
+                        student_name TEXT,
+                        absent_count INTEGER,
+                        course_name TEXT,
+                        subject_category_number TEXT,
+                        subject_number TEXT,
+                        course_number TEXT,
+                        year INTEGER,
+                        period TEXT,
+                        absence_mark TEXT,
+                        absence_type INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(student_number, course_number, period, year)
+                    )
+                """)
+            
+                # 操作ログテーブル
+                self.execute_query("""
+                    CREATE TABLE IF NOT EXISTS action_logs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        action_type TEXT NOT NULL,
+                        description TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
             
         except Exception as e:
             print(f"テーブル作成エラー: {e}")
             raise
     
+    @contextmanager
+    def transaction(self, immediate=True):
+        """複数の更新を1回のコミットにまとめるトランザクション
+        
+        使用例:
+            with db_manager.transaction():
+                db_manager.execute_query(...)
+                db_manager.execute_many(...)
+        
+        ブロック内の execute_query / execute_many はコミットせず、ブロックを
+        抜けた時点で1回だけコミットする（例外時はロールバック）。入れ子の場合は
+        最も外側のトランザクションにまとめられる。immediate=True の場合は開始時に
+        書き込みロックを取得し、途中でのロック昇格待ちを避ける。
+        """
+        if not self.connection:
+            raise Exception("データベースが接続されていません")
+        
+        with self.lock:
+            # ロックを取得できた時点で、他スレッドのトランザクションは終了している
+            if self.transaction_depth > 0:
+                self.transaction_depth += 1
+                try:
+                    yield self.connection
+                finally:
+                    self.transaction_depth -= 1
+                return
+            
+            if self.connection.in_transaction:
+                # 暗黙に開始されたトランザクションが残っていれば先に確定
+                self.connection.commit()
+            
+            self.connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            self.transaction_depth = 1
+            self.transaction_owner = threading.get_ident()
+            
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.rollback()
+                raise
+            else:
+                self.connection.commit()
+            finally:
+                self.transaction_depth = 0
+                self.transaction_owner = None
+    
+    def in_transaction(self):
+        """現在のスレッドが transaction() ブロック内か"""
+        return self.transaction_depth > 0 and self.transaction_owner == threading.get_ident()
+    
+    def get_read_connection(self):
+        """読み取り用の接続を取得
+        
+        トランザクション内では未コミットの変更を読めるよう書き込み接続を、
+        それ以外は現在のスレッド専用の接続を返す。
+        """
+        if not self.pool:
+            raise Exception("データベースが接続されていません")
+        
+        if self.in_transaction():
+            return self.connection
+        
+        return self.pool.get_reader()
+    
+    @contextmanager
+    def borrow_read_connection(self):
+        """共有の読み取り接続を借りる（ブロックを抜けると返却し、次の検索で使い回す）"""
+        if not self.pool:
+            raise Exception("データベースが接続されていません")
+        
+        connection = self.pool.acquire_reader()
+        try:
+            yield connection
+        finally:
+            self.pool.return_reader(connection)
+    
     def execute_query(self, query, params=None):
-        """クエリ実行"""
+        """クエリ実行（transaction() ブロック外では1文ごとにコミット）"""
         try:
             if not self.connection:
                 raise Exception("データベースが接続されていません")
             
-            cursor = self.connection.cursor()
-            
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            self.connection.commit()
-            return cursor
+            with self.lock:
+                cursor = self.connection.cursor()
+                
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                
+                if self.transaction_depth == 0:
+                    self.connection.commit()
+                return cursor
             
         except Exception as e:
             print(f"クエリ実行エラー: {e}")
-            if self.connection:
+            # トランザクション内のロールバックは transaction() 側で行う
+            if self.connection and self.transaction_depth == 0:
                 self.connection.rollback()
             raise
     
+    def execute_many(self, query, params_seq):
+        """同じ文を複数のパラメータで実行（1トランザクション・1コミット）"""
+        try:
+            with self.transaction():
+                cursor = self.connection.cursor()
+                cursor.executemany(query, params_seq)
+                return cursor.rowcount
+        except Exception as e:
+            print(f"一括実行エラー: {e}")
+            raise
+    
+    def execute_read(self, query, params=None):
+        """読み取りクエリ実行（コミットしない・書き込みロックを取らない）"""
+        connection = self.get_read_connection()
+        return connection.execute(query, params or ())
+    
     def fetch_all(self, query, params=None):
         """全行取得"""
         try:
-            cursor = self.execute_query(query, params)
+            cursor = self.execute_read(query, params)
             return cursor.fetchall()
         except Exception as e:
             print(f"データ取得エラー: {e}")
@@ -162,12 +487,27 @@ class DatabaseManager:
     def fetch_one(self, query, params=None):
         """1行取得"""
         try:
-            cursor = self.execute_query(query, params)
+            cursor = self.execute_read(query, params)
             return cursor.fetchone()
         except Exception as e:
             print(f"データ取得エラー: {e}")
             return None
     
+    def iter_query(self, query, params=None, batch_size=1000):
+        """SELECT結果を batch_size 行ずつ返すジェネレータ（全件をメモリに載せない）"""
+        cursor = self.execute_read(query, params)
+        
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                
+                if not rows:
+                    break
+                
+                yield rows
+        finally:
+            cursor.close()
+    
     def get_table_info(self, table_name):
         """テーブル情報取得"""
         try:
@@ -0,0 +1,246 @@
+import json
+import re
+from pathlib import Path
+from database.slice_statistics import create_statistics_table, rebuild_slice_statistics
+
+
+# データタイプとテーブル名の対応（db_columns.json のキー）
+DATA_TABLES = {
+    '評定': 'grades',
+    '観点': 'viewpoint_evaluations',
+    '欠課情報': 'absences'
+}
+
+# db_columns.json から追加できるカラム型
+ALLOWED_COLUMN_TYPES = {'INTEGER', 'TEXT', 'REAL', 'NUMERIC', 'BLOB', 'TIMESTAMP'}
+
+COLUMN_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def get_columns(connection, table_name):
+    """テーブルのカラム名一覧を取得"""
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table_name})").fetchall()]
+
+
+def table_exists(connection, table_name):
+    """テーブル存在確認"""
+    row = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (table_name,)
+    ).fetchone()
+    return row is not None
+
+
+def add_missing_columns(connection, table_name, column_defs):
+    """存在しないカラムを ALTER TABLE ADD COLUMN で追加し、追加したカラム名を返す"""
+    existing = set(get_columns(connection, table_name))
+    added = []
+
+    for name, column_type in column_defs:
+        if name in existing:
+            continue
+
+        connection.execute(f'ALTER TABLE {table_name} ADD COLUMN "{name}" {column_type}')
+        existing.add(name)
+        added.append(name)
+
+    return added
+
+
+def migration_001_slice_indexes(connection):
+    """年度・期間で絞り込むクエリ用のインデックスを作成
+
+    一覧表示・件数取得・取り込み時のスコープ削除はいずれも year, period で
+    絞り込み、一覧表示は id 順にページングするため (year, period, id) とする。
+    未入力チェックの結合は UNIQUE(student_number, course_number, period, year)
+    の自動インデックスを使う。履修者テーブルのインデックスは
+    ensure_enrollment_indexes で作成する。
+    """
+    for table_name in DATA_TABLES.values():
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_year_period "
+            f"ON {table_name}(year, period, id)"
+        )
+
+
+def migration_002_action_log_columns(connection):
+    """操作ログテーブルに Logger が書き込むカラムを追加"""
+    add_missing_columns(connection, 'action_logs', [
+        ('timestamp', 'TIMESTAMP'),
+        ('details', 'TEXT'),
+        ('user', 'TEXT')
+    ])
+
+
+def migration_003_action_log_duration(connection):
+    """操作ログに処理時間（ミリ秒）のカラムを追加"""
+    add_missing_columns(connection, 'action_logs', [('duration_ms', 'REAL')])
+
+
+def migration_004_action_log_indexes(connection):
+    """操作ログの期間検索・種別検索用インデックスを作成"""
+    # Logger 対応前の行は timestamp が空のため created_at から補完
+    connection.execute(
+        "UPDATE action_logs SET timestamp = replace(created_at, ' ', 'T') "
+        "WHERE timestamp IS NULL AND created_at IS NOT NULL"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_action_logs_timestamp ON action_logs(timestamp)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_action_logs_type_timestamp ON action_logs(action_type, timestamp)"
+    )
+
+
+def migration_005_slice_statistics(connection):
+    """年度・期間ごとの件数を保持する集計テーブルを作成し、既存データから集計
+
+    一覧表示・削除確認の件数はこのテーブルから読む。取り込みと削除の際に
+    対象の期間だけ再集計する。
+    """
+    create_statistics_table(connection)
+    rebuild_slice_statistics(
+        connection,
+        [table_name for table_name in DATA_TABLES.values() if table_exists(connection, table_name)]
+    )
+
+
+# (バージョン, 説明, 適用関数) を適用順に並べる
+MIGRATIONS = [
+    (1, "年度・期間インデックス作成", migration_001_slice_indexes),
+    (2, "操作ログのカラム追加", migration_002_action_log_columns),
+    (3, "操作ログの処理時間カラム追加", migration_003_action_log_duration),
+    (4, "操作ログのインデックス作成", migration_004_action_log_indexes),
+    (5, "年度・期間ごとの集計テーブル作成", migration_005_slice_statistics),
+]
+
+
+def get_schema_version(connection):
+    """適用済みのスキーマバージョンを取得"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(connection):
+    """未適用のマイグレーションを順に適用し、適用したバージョンのリストを返す
+
+    各マイグレーションはバージョンの記録と同じトランザクションで実行するため、
+    途中で失敗した場合はそのマイグレーションごとロールバックされる。
+    """
+    current_version = get_schema_version(connection)
+    connection.commit()
+    applied = []
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        try:
+            connection.execute("BEGIN")
+            migrate(connection)
+            connection.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            print(f"マイグレーションエラー (v{version} {description}): {e}")
+            raise
+
+        print(f"マイグレーション適用: v{version} {description}")
+        applied.append(version)
+
+    return applied
+
+
+def load_column_definitions(config_path):
+    """db_columns.json からテーブルごとのカラム定義を読み込む"""
+    config_path = Path(config_path)
+    if not config_path.exists():
+        return {}
+
+    with open(config_path, 'r', encoding='utf-8-sig') as f:
+        config = json.load(f)
+
+    definitions = {}
+
+    for data_type, table_name in DATA_TABLES.items():
+        column_defs = []
+
+        for column in config.get(data_type, []):
+            name = column.get('name', '')
+            column_type = str(column.get('type', 'TEXT')).upper()
+
+            if not COLUMN_NAME_PATTERN.match(name):
+                print(f"警告: 不正なカラム名をスキップしました: {data_type}.{name}")
+                continue
+
+            if column_type not in ALLOWED_COLUMN_TYPES:
+                print(f"警告: 未対応の型のため TEXT として追加します: {data_type}.{name} ({column_type})")
+                column_type = 'TEXT'
+
+            column_defs.append((name, column_type))
+
+        definitions[table_name] = column_defs
+
+    return definitions
+
+
+def ensure_enrollment_indexes(connection):
+    """履修者テーブルのインデックスを作成（接続のたびに実行）
+
+    履修者テーブルはマスタ管理アプリが作成するため、マイグレーションの
+    適用後に作られる場合がある。未入力チェックで講座・生徒順に走査する。
+    """
+    if not table_exists(connection, 'enrollments'):
+        return
+
+    try:
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_enrollments_course_student "
+            "ON enrollments(course_number, student_number)"
+        )
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        print(f"インデックス作成エラー: {e}")
+        raise
+
+
+def sync_table_columns(connection, config_path):
+    """db_columns.json に追加されたカラムをテーブルに反映
+
+    カラムの追加のみ行い、削除・型変更は行わない（既存データを保護するため）。
+    """
+    definitions = load_column_definitions(config_path)
+    added_columns = {}
+
+    try:
+        connection.execute("BEGIN")
+
+        for table_name, column_defs in definitions.items():
+            if not table_exists(connection, table_name):
+                continue
+
+            added = add_missing_columns(connection, table_name, column_defs)
+            if added:
+                added_columns[table_name] = added
+
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        print(f"カラム同期エラー: {e}")
+        raise
+
+    for table_name, added in added_columns.items():
+        print(f"カラム追加: {table_name} ({', '.join(added)})")
+
+    return added_columns
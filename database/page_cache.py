@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+
+class PageCache:
+    """一覧表示で取得したページを保持する LRU キャッシュ
+
+    キーは (テーブル名, 絞り込み条件, ページ) で、保存時のテーブルのバージョン
+    （DatabaseManager.get_table_version と get_external_data_version の組）と
+    一緒に保持する。取り込み・削除でテーブルの変更カウンタが増えるか、
+    マスタ管理アプリなど他のプロセスが書き込むとバージョンが変わり、
+    そのテーブルのページは次の取得時に破棄される。
+    """
+
+    def __init__(self, db_manager, max_pages=64):
+        """初期化"""
+        self.db = db_manager
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_version(self, table_name):
+        """テーブルの現在のバージョン"""
+        return (self.db.get_table_version(table_name), self.db.get_external_data_version())
+
+    def get(self, table_name, key):
+        """保持しているページを取得（無い・古い場合は None）"""
+        version = self.get_version(table_name)
+
+        with self.lock:
+            entry = self.pages.get((table_name, key))
+
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self.pages[(table_name, key)]
+                self.misses += 1
+                return None
+
+            self.pages.move_to_end((table_name, key))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, table_name, key, value, version=None):
+        """ページを保存
+
+        version には取得を始める前に get_version で取得した値を渡す。取得中に
+        書き込みがあった場合、保存したページは次の get で古いものとして扱われる。
+        """
+        if version is None:
+            version = self.get_version(table_name)
+
+        with self.lock:
+            self.pages[(table_name, key)] = (version, value)
+            self.pages.move_to_end((table_name, key))
+
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+
+    def invalidate(self, table_name=None):
+        """保持しているページを破棄（table_name 省略時は全て）"""
+        with self.lock:
+            if table_name is None:
+                self.pages.clear()
+                return
+
+            for key in [k for k in self.pages if k[0] == table_name]:
+                del self.pages[key]
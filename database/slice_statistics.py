@@ -0,0 +1,104 @@
+from datetime import datetime
+
+
+def create_statistics_table(connection):
+    """年度・期間ごとの集計テーブルを作成"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS slice_statistics (
+            table_name TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            student_count INTEGER NOT NULL DEFAULT 0,
+            course_count INTEGER NOT NULL DEFAULT 0,
+            last_import_at TIMESTAMP,
+            source_file TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, year, period)
+        )
+    """)
+
+
+def refresh_slice_statistics(connection, table_name, year, period=None, source_file=None):
+    """指定した年度・期間の集計を再計算して slice_statistics に反映
+
+    period 省略時はその年度の全期間を再計算する。source_file を指定した場合は
+    取り込みとして、その期間の最終取り込み日時と取り込みファイルを更新する
+    （取り込み件数が0件でも記録を残す）。行が無くなった期間の集計は削除する。
+    呼び出し側のトランザクション内で実行し、コミットは行わない。
+    """
+    conditions = ["year = ?"]
+    params = [year]
+    if period is not None:
+        conditions.append("period = ?")
+        params.append(period)
+
+    where_str = " AND ".join(conditions)
+
+    # (year, period, id) のインデックスで対象の期間だけを走査する
+    counts = {
+        row[0]: tuple(row[1:])
+        for row in connection.execute(
+            f"SELECT period, COUNT(*), COUNT(DISTINCT student_number), COUNT(DISTINCT course_number) "
+            f"FROM {table_name} WHERE {where_str} AND period IS NOT NULL GROUP BY period",
+            params
+        ).fetchall()
+    }
+
+    imported_at = None
+    if source_file is not None and period is not None:
+        imported_at = datetime.now().isoformat(timespec='seconds')
+        counts.setdefault(period, (0, 0, 0))
+
+    existing = [
+        row[0] for row in connection.execute(
+            f"SELECT period FROM slice_statistics WHERE table_name = ? AND {where_str}",
+            [table_name] + params
+        ).fetchall()
+    ]
+    for stale_period in set(existing) - set(counts):
+        connection.execute(
+            "DELETE FROM slice_statistics WHERE table_name = ? AND year = ? AND period = ?",
+            (table_name, year, stale_period)
+        )
+
+    connection.executemany(
+        """
+        INSERT INTO slice_statistics
+            (table_name, year, period, row_count, student_count, course_count, last_import_at, source_file, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(table_name, year, period) DO UPDATE SET
+            row_count = excluded.row_count,
+            student_count = excluded.student_count,
+            course_count = excluded.course_count,
+            last_import_at = COALESCE(excluded.last_import_at, last_import_at),
+            source_file = COALESCE(excluded.source_file, source_file),
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        [
+            (table_name, year, slice_period) + values + (
+                (imported_at, source_file) if slice_period == period else (None, None)
+            )
+            for slice_period, values in counts.items()
+        ]
+    )
+
+
+def rebuild_slice_statistics(connection, table_names):
+    """全テーブル・全期間の集計を作り直す（最終取り込み日時・ファイルは残す）"""
+    for table_name in table_names:
+        years = [
+            row[0] for row in connection.execute(
+                f"SELECT DISTINCT year FROM {table_name} WHERE year IS NOT NULL"
+            ).fetchall()
+        ]
+        years += [
+            row[0] for row in connection.execute(
+                "SELECT DISTINCT year FROM slice_statistics WHERE table_name = ?",
+                (table_name,)
+            ).fetchall()
+            if row[0] not in years
+        ]
+
+        for year in years:
+            refresh_slice_statistics(connection, table_name, year)
@@ -1,5 +1,6 @@
 import sys
 import traceback
+import multiprocessing
 from pathlib import Path
 from PySide6.QtWidgets import QApplication
 
@@ -12,6 +13,7 @@ from utils.config_manager import ConfigManager
 from utils.file_manager import FileManager
 from utils.logger import Logger
 from utils.data_importer import DataImporter
+from utils.import_cache import ImportCache
 from ui.main_window import MainWindow
 
 
@@ -70,15 +72,27 @@ def main():
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         
         # データベース接続
-        db_manager = DatabaseManager(db_path=str(db_path))
+        connection_profile = config_manager.get_settings().get('database', {}).get('connection_profile')
+        db_manager = DatabaseManager(db_path=str(db_path), connection_profile=connection_profile)
         db_manager.connect()
         
         print(f"使用中のデータベース: {db_manager.db_path}")
+        print(f"接続設定: {db_manager.get_pragma_report()}")
         
         # 各種マネージャー初期化
         file_manager = FileManager(config_manager)
-        logger = Logger(db_manager)
-        data_importer = DataImporter(db_manager, file_manager, logger)
+        log_settings = config_manager.get_settings().get('logging', {})
+        logger = Logger(
+            db_manager,
+            buffered=log_settings.get('buffered', True),
+            batch_size=log_settings.get('batch_size', 200),
+            flush_interval=log_settings.get('flush_interval_sec', 1.0)
+        )
+        import_settings = config_manager.get_settings().get('import', {})
+        import_cache = None
+        if import_settings.get('cache_enabled', True):
+            import_cache = ImportCache(max_size_mb=import_settings.get('cache_max_mb', 512))
+        data_importer = DataImporter(db_manager, file_manager, logger, import_cache)
         
         print("アプリケーション起動完了！")
         
@@ -93,6 +107,13 @@ def main():
         
         main_window.show()
         
+        # 保持期間を過ぎたログをアーカイブして削除（バックグラウンド）
+        if log_settings.get('retention_days'):
+            logger.start_retention_job(
+                log_settings['retention_days'],
+                log_settings.get('archive_dir')
+            )
+        
         # ログ記録 - ウィンドウ表示後
         logger.log_action("application_start", "アプリケーション起動")
         
@@ -105,6 +126,9 @@ def main():
         except Exception as log_error:
             print(f"終了ログ記録エラー: {log_error}")
         
+        # 未書き込みのログを書き込んでから接続を閉じる
+        logger.close()
+        
         if db_manager:
             db_manager.close()
         
@@ -126,4 +150,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 欠課データ前処理の並列処理（ワーカープロセス）用
+    multiprocessing.freeze_support()
     sys.exit(main())
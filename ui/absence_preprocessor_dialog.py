@@ -1,11 +1,14 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                                QPushButton, QListWidget, QSpinBox, QFileDialog,
-                               QMessageBox, QProgressDialog, QGroupBox, QTextEdit,
+                               QMessageBox, QGroupBox, QTextEdit,
                                QTableWidget, QTableWidgetItem, QCheckBox, QComboBox,
                                QListWidgetItem)
 from PySide6.QtCore import Qt
 from pathlib import Path
 from utils.absence_processor import AbsenceProcessor
+from utils.preview_service import PreviewService, count_data_rows
+from ui.sheet_prefetcher import SheetPrefetcher
+from ui.background_job import start_job_with_progress
 import json
 
 
@@ -19,12 +22,27 @@ class AbsencePreprocessorDialog(QDialog):
         self.file_paths = []
         self.column_mapping = {}
         self.log_viewer = None
+        self.preview_service = PreviewService()
+        self.file_sheet_names = {}
+        self.file_sheet_info = {}
+        
+        # シート情報の先読み（ファイル追加後にバックグラウンドで実行）
+        self.prefetcher = SheetPrefetcher(self.preview_service, self)
+        self.prefetcher.sheet_names_ready.connect(self.on_sheet_names_prefetched)
+        self.prefetcher.sheet_scanned.connect(self.on_sheet_prefetched)
+        self.prefetcher.failed.connect(self.on_prefetch_failed)
         
         # DBカラム情報を読み込む
         self.load_db_columns()
         
         self.setup_ui()
     
+    def done(self, result):
+        """ダイアログ終了時に先読みを止め、プレビュー用のブックを閉じる"""
+        self.prefetcher.cancel()
+        self.preview_service.close()
+        super().done(result)
+    
     def load_db_columns(self):
         """DBカラム設定を読み込む"""
         db_columns_path = Path('config/db_columns.json')
@@ -134,6 +152,7 @@ class AbsencePreprocessorDialog(QDialog):
         self.header_spin.setValue(0)
         self.header_spin.setToolTip("0 = 1行目がヘッダー")
         self.header_spin.valueChanged.connect(self.update_preview)
+        self.header_spin.valueChanged.connect(self.update_file_labels)
         header_layout.addWidget(self.header_spin)
         
         header_layout.addWidget(QLabel("行目（0始まり）"))
@@ -338,20 +357,84 @@ class AbsencePreprocessorDialog(QDialog):
         )
         
         if file_paths:
+            new_paths = []
             for file_path in file_paths:
                 if file_path not in self.file_paths:
                     self.file_paths.append(file_path)
-                    self.file_list.addItem(Path(file_path).name)
+                    self.file_list.addItem(self.get_file_label(file_path))
+                    new_paths.append(file_path)
+            
+            # シート数・行数・プレビューはバックグラウンドで読み込む
+            if new_paths:
+                self.prefetcher.start(new_paths, self.header_spin.value())
             
             if len(self.file_paths) == len(file_paths):
                 self.file_list.setCurrentRow(0)
     
+    def get_file_label(self, file_path):
+        """ファイル一覧の表示名（先読み済みならシート数と行数を付ける）"""
+        name = Path(file_path).name
+        sheet_names = self.file_sheet_names.get(file_path)
+        sheet_info = self.file_sheet_info.get(file_path, {})
+        
+        if sheet_names is None:
+            return f"{name}（読み込み中...）"
+        
+        total_rows = self.get_file_row_count(file_path)
+        if len(sheet_info) < len(sheet_names):
+            return f"{name}（{len(sheet_names)}シート・集計中 {total_rows:,}行〜）"
+        return f"{name}（{len(sheet_names)}シート・{total_rows:,}行）"
+    
+    def get_file_row_count(self, file_path):
+        """先読み済みシートのデータ行数の合計"""
+        header_row = self.header_spin.value()
+        return sum(
+            count_data_rows(info, header_row)
+            for info in self.file_sheet_info.get(file_path, {}).values()
+        )
+    
+    def update_file_labels(self):
+        """ファイル一覧の表示名を更新"""
+        for i, file_path in enumerate(self.file_paths):
+            self.file_list.item(i).setText(self.get_file_label(file_path))
+    
+    def on_sheet_names_prefetched(self, file_path, sheet_names):
+        """先読みでシート名が取得できたときの処理"""
+        if file_path not in self.file_paths:
+            return
+        self.file_sheet_names[file_path] = sheet_names
+        self.file_sheet_info[file_path] = {}
+        self.update_file_labels()
+    
+    def on_sheet_prefetched(self, file_path, info):
+        """先読みで1シートの走査が終わったときの処理"""
+        if file_path not in self.file_paths:
+            return
+        
+        self.file_sheet_info.setdefault(file_path, {})[info['sheet_name']] = info
+        self.update_file_labels()
+        
+        # 選択中ファイルの先頭シートが読み込めたらプレビューを表示
+        current_row = self.file_list.currentRow()
+        sheet_names = self.file_sheet_names.get(file_path, [])
+        if (0 <= current_row < len(self.file_paths) and self.file_paths[current_row] == file_path
+                and sheet_names and info['sheet_name'] == sheet_names[0]):
+            self.update_preview()
+    
+    def on_prefetch_failed(self, file_path, message):
+        """先読み失敗時の処理"""
+        if file_path in self.file_paths:
+            row = self.file_paths.index(file_path)
+            self.file_list.item(row).setText(f"{Path(file_path).name}（読み込みエラー）")
+    
     def remove_selected_file(self):
         """選択ファイル削除"""
         current_row = self.file_list.currentRow()
         if current_row >= 0:
             self.file_list.takeItem(current_row)
-            del self.file_paths[current_row]
+            file_path = self.file_paths.pop(current_row)
+            self.file_sheet_names.pop(file_path, None)
+            self.file_sheet_info.pop(file_path, None)
             
             if not self.file_paths:
                 self.preview_table.clear()
@@ -361,8 +444,11 @@ class AbsencePreprocessorDialog(QDialog):
     
     def clear_files(self):
         """全ファイル削除"""
+        self.prefetcher.cancel()
         self.file_list.clear()
         self.file_paths = []
+        self.file_sheet_names = {}
+        self.file_sheet_info = {}
         self.preview_table.clear()
         self.preview_table.setRowCount(0)
         self.preview_table.setColumnCount(0)
@@ -370,7 +456,8 @@ class AbsencePreprocessorDialog(QDialog):
     
     def on_file_selected(self, row):
         """ファイル選択時の処理"""
-        if row >= 0:
+        # 先読み中のファイルは、先頭シートの読み込み完了時にプレビューを表示する
+        if row >= 0 and self.file_paths[row] in self.file_sheet_info:
             self.update_preview()
     
     def update_preview(self):
@@ -385,7 +472,8 @@ class AbsencePreprocessorDialog(QDialog):
             file_path = self.file_paths[current_row]
             header_row = self.header_spin.value()
             
-            df = pd.read_excel(file_path, header=header_row, nrows=10)
+            # 先頭シートの先頭10行のみ読み込み（読み込み済みはキャッシュから）
+            df = self.preview_service.get_preview(file_path, header_row=header_row)
             
             self.preview_table.clear()
             self.preview_table.setRowCount(len(df))
@@ -493,9 +581,7 @@ class AbsencePreprocessorDialog(QDialog):
             file_path = self.file_paths[current_row]
             header_row = self.header_spin.value()
             
-            import pandas as pd
-            df = pd.read_excel(file_path, header=header_row, nrows=0)
-            excel_columns = df.columns.tolist()
+            excel_columns = self.preview_service.get_columns(file_path, header_row=header_row)
             
             dialog = ColumnMappingDialog('欠課情報', self.config_manager, excel_columns, self)
             
@@ -555,50 +641,59 @@ class AbsencePreprocessorDialog(QDialog):
             )
             return
         
+        # 先読み済みなら全シートの合計行数を表示
+        if all(
+            len(self.file_sheet_info.get(p, {})) == len(self.file_sheet_names.get(p, [None]))
+            for p in self.file_paths
+        ):
+            total_rows = sum(self.get_file_row_count(p) for p in self.file_paths)
+            files_text = f"{len(self.file_paths)}個のファイル（{total_rows:,}行）"
+        else:
+            files_text = f"{len(self.file_paths)}個のファイル"
+        
         reply = QMessageBox.question(
             self,
             "確認",
-            f"{len(self.file_paths)}個のファイルを処理しますか？",
+            f"{files_text}を処理しますか？",
             QMessageBox.Yes | QMessageBox.No
         )
         
         if reply == QMessageBox.No:
             return
         
-        progress = QProgressDialog("前処理実行中...", "キャンセル", 0, 100, self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)
-        progress.setValue(0)
+        header_row = self.header_spin.value()
         
-        def update_progress(current, total, message):
-            if total > 0:
-                percent = int((current / total) * 100)
-                progress.setValue(percent)
-                progress.setLabelText(message)
+        # 並列処理・逐次集計の設定（settings.json の absence_preprocess）
+        preprocess_settings = self.config_manager.get_settings().get('absence_preprocess', {})
+        
+        # 前処理はバックグラウンドで実行（進捗ダイアログからキャンセル可能）
+        start_job_with_progress(
+            self,
+            "前処理実行中...",
+            self.processor.process_multiple_files,
+            on_finished=self.on_preprocessing_finished,
+            on_failed=self.on_preprocessing_failed,
+            on_cancelled=self.on_preprocessing_cancelled,
+            file_paths=self.file_paths,
+            header_row=header_row,
+            column_mapping=self.column_mapping,
+            parallel=preprocess_settings.get('parallel', False),
+            max_workers=preprocess_settings.get('max_workers') or None,
+            streaming=preprocess_settings.get('streaming', False)
+        )
+    
+    def on_preprocessing_finished(self, result_df):
+        """前処理完了時の処理"""
+        if result_df is None or len(result_df) == 0:
+            QMessageBox.warning(self, "警告", "欠課データが見つかりませんでした")
+            return
         
         try:
-            header_row = self.header_spin.value()
-            
-            result_df = self.processor.process_multiple_files(
-                self.file_paths,
-                header_row=header_row,
-                column_mapping=self.column_mapping,
-                progress_callback=update_progress
-            )
-            
-            debug_info = self.processor.get_debug_info()
-            
-            if result_df is None or len(result_df) == 0:
-                progress.close()
-                QMessageBox.warning(self, "警告", "欠課データが見つかりませんでした")
-                return
-            
             summary = self.processor.get_summary()
             
             preview_text = f""" 処理完了！ 【処理結果サマリー】 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━ 総レコード数: {summary['total_records']:,}件 ユニーク学生数: {summary['unique_students']}人 ユニーク講座数: {summary['unique_courses']}科目 総欠課数: {summary['total_absences']:,}回 平均欠課数: {summary['average_absences']}回/人・科目 欠課0の組み合わせ: {summary['zero_absence_count']:,}件 生徒あたり平均履修講座数: {summary['courses_per_student']}講座 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━ 【次のステップ】 出力カラムを確認して「Excel出力」を実行してください。 """
             
             self.result_text.setText(preview_text)
-            progress.setValue(100)
             
             reply = QMessageBox.question(
                 self,
@@ -650,7 +745,14 @@ class AbsencePreprocessorDialog(QDialog):
                 self.accept()
         
         except Exception as e:
-            progress.close()
             import traceback
             traceback.print_exc()
-            QMessageBox.critical(self, "エラー", f"前処理エラー:\n{str(e)}")
\ No newline at end of file
+            QMessageBox.critical(self, "エラー", f"前処理エラー:\n{str(e)}")
+    
+    def on_preprocessing_failed(self, message):
+        """前処理エラー時の処理"""
+        QMessageBox.critical(self, "エラー", f"前処理エラー:\n{message}")
+    
+    def on_preprocessing_cancelled(self):
+        """前処理キャンセル時の処理"""
+        QMessageBox.information(self, "キャンセル", "前処理をキャンセルしました")
\ No newline at end of file
@@ -0,0 +1,118 @@
+from PySide6.QtWidgets import QProgressDialog
+from PySide6.QtCore import Qt, QObject, QRunnable, QThreadPool, Signal
+import traceback
+from utils.job_control import CancelToken, OperationCancelled
+
+
+class JobSignals(QObject):
+    """バックグラウンド処理の通知シグナル"""
+    progress = Signal(int, int, str)
+    finished = Signal(object)
+    failed = Signal(str, str)
+    cancelled = Signal()
+
+
+class BackgroundJob(QRunnable):
+    """UIスレッド外で処理を実行するジョブ
+
+    func には progress_callback と cancel_token がキーワード引数で渡される。
+    進捗・結果はシグナル経由でUIスレッドに届く。
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self.cancel_token = CancelToken()
+        self.setAutoDelete(False)
+
+    def report_progress(self, current, total, message):
+        """処理側から呼ばれる進捗コールバック"""
+        self.signals.progress.emit(current, total, message)
+
+    def cancel(self):
+        """キャンセルを要求（処理側が次の確認ポイントで中断する）"""
+        self.cancel_token.cancel()
+
+    def run(self):
+        """ジョブ実行（ワーカースレッド）"""
+        try:
+            result = self.func(
+                *self.args,
+                progress_callback=self.report_progress,
+                cancel_token=self.cancel_token,
+                **self.kwargs
+            )
+        except OperationCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e), traceback.format_exc())
+        else:
+            self.signals.finished.emit(result)
+
+
+def start_job_with_progress(parent, label, func, on_finished, on_failed=None, on_cancelled=None, **kwargs):
+    """進捗ダイアログ付きでバックグラウンドジョブを開始
+
+    進捗ダイアログはウィンドウモーダルで表示し、キャンセルボタンはジョブに
+    キャンセルを要求する（ジョブが中断するまでダイアログは閉じない）。
+    kwargs はそのまま func に渡される。
+    """
+    job = BackgroundJob(func, **kwargs)
+
+    progress = QProgressDialog(label, "キャンセル", 0, 100, parent)
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setMinimumDuration(0)
+    progress.setAutoClose(False)
+    progress.setAutoReset(False)
+    progress.setValue(0)
+
+    def update_progress(current, total, message):
+        if total > 0:
+            progress.setValue(int((current / total) * 100))
+        progress.setLabelText(message)
+
+    def request_cancel():
+        job.cancel()
+        # キャンセル完了までダイアログを残す
+        progress.setLabelText("キャンセル中...")
+        progress.setCancelButtonText("キャンセル中...")
+        progress.show()
+
+    def finish():
+        progress.canceled.disconnect(request_cancel)
+        progress.close()
+        # 実行中ジョブの参照を解放
+        parent._running_jobs.discard(job)
+
+    def handle_finished(result):
+        finish()
+        on_finished(result)
+
+    def handle_failed(message, detail):
+        finish()
+        print(detail)
+        if on_failed:
+            on_failed(message)
+
+    def handle_cancelled():
+        finish()
+        if on_cancelled:
+            on_cancelled()
+
+    job.signals.progress.connect(update_progress)
+    job.signals.finished.connect(handle_finished)
+    job.signals.failed.connect(handle_failed)
+    job.signals.cancelled.connect(handle_cancelled)
+    progress.canceled.connect(request_cancel)
+
+    # ジョブ完了までPythonオブジェクトを保持
+    if not hasattr(parent, '_running_jobs'):
+        parent._running_jobs = set()
+    parent._running_jobs.add(job)
+
+    QThreadPool.globalInstance().start(job)
+
+    return job
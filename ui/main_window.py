@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                               QPushButton, QTabWidget, QTableWidget, QMenuBar,
-                               QMenu, QMessageBox, QLabel, QStatusBar, QTableWidgetItem,
+                               QPushButton, QTabWidget, QTableView, QMenuBar,
+                               QMenu, QMessageBox, QLabel, QStatusBar,
                                QSpinBox, QCheckBox, QComboBox, QHeaderView, QGroupBox,
                                QFrame)
 from PySide6.QtCore import Qt
@@ -8,6 +8,11 @@ from PySide6.QtGui import QAction, QFont
 import json
 from pathlib import Path
 from datetime import datetime
+from ui.background_job import start_job_with_progress
+from ui.sqlite_table_model import SqliteTableModel, fit_columns_to_sample
+from ui.query_scheduler import QueryScheduler
+from database.page_cache import PageCache
+from utils.missing_entry_checker import MissingEntryChecker
 
 
 class MainWindow(QMainWindow):
@@ -20,6 +25,14 @@ class MainWindow(QMainWindow):
         self.file_manager = file_manager
         self.data_importer = data_importer
         self.logger = logger
+        # 未入力チェックの結果はダイアログを閉じても保持する
+        self.missing_entry_checker = MissingEntryChecker(self.db_manager)
+        # 一覧で取得したページ（タブ・条件を戻した場合は再検索しない）
+        self.page_cache = PageCache(self.db_manager)
+        # 一覧の検索（フィルタ変更はまとめて1回・古い検索は中断）
+        self.query_scheduler = QueryScheduler(self.db_manager, parent=self)
+        self.query_scheduler.result_ready.connect(self.on_query_finished)
+        self.query_scheduler.failed.connect(self.on_query_failed)
         
         self.load_settings()
         self.setup_ui()
@@ -71,24 +84,16 @@ class MainWindow(QMainWindow):
         self.year_filter.setMinimum(2000)
         self.year_filter.setMaximum(2100)
         self.year_filter.setValue(datetime.now().year)
-        self.year_filter.valueChanged.connect(self.refresh_current_tab)
+        self.year_filter.valueChanged.connect(self.schedule_refresh)
         filter_layout.addWidget(self.year_filter)
         
         filter_layout.addWidget(QLabel("期間:"))
         self.period_filter = QComboBox()
         self.period_filter.addItem("全て")
         self.period_filter.addItems(self.settings['periods'])
-        self.period_filter.currentTextChanged.connect(self.refresh_current_tab)
+        self.period_filter.currentTextChanged.connect(self.schedule_refresh)
         filter_layout.addWidget(self.period_filter)
         
-        filter_layout.addWidget(QLabel("表示件数:"))
-        self.limit_spin = QSpinBox()
-        self.limit_spin.setMinimum(10)
-        self.limit_spin.setMaximum(10000)
-        self.limit_spin.setValue(100)
-        self.limit_spin.setSingleStep(100)
-        filter_layout.addWidget(self.limit_spin)
-        
         refresh_btn = QPushButton("データ更新")
         refresh_btn.clicked.connect(self.refresh_current_tab)
         filter_layout.addWidget(refresh_btn)
@@ -104,10 +109,13 @@ class MainWindow(QMainWindow):
         self.tab_widget = QTabWidget()
         self.tables = {}
         
-        # 各データタイプのタブを作成
+        # 各データタイプのタブを作成（スクロールに合わせて順次読み込むモデル）
         tab_order = ['評定', '観点', '欠課情報']
         for data_type in tab_order:
-            table = QTableWidget()
+            table = QTableView()
+            table.setModel(SqliteTableModel(self.db_manager, table, page_cache=self.page_cache))
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+            table.verticalHeader().setDefaultSectionSize(22)
             self.tables[data_type] = table
             self.tab_widget.addTab(table, data_type)
         
@@ -238,6 +246,11 @@ class MainWindow(QMainWindow):
         refresh_action.triggered.connect(self.refresh_current_tab)
         file_menu.addAction(refresh_action)
         
+        # 取り込み状況一覧
+        statistics_action = QAction("取り込み状況一覧(&S)", self)
+        statistics_action.triggered.connect(self.show_slice_statistics)
+        file_menu.addAction(statistics_action)
+        
         file_menu.addSeparator()
         
         # Excel出力
@@ -321,6 +334,10 @@ class MainWindow(QMainWindow):
         workflow_guide_action.triggered.connect(self.show_workflow_guide)
         help_menu.addAction(workflow_guide_action)
         
+        db_info_action = QAction("データベース接続情報(&D)", self)
+        db_info_action.triggered.connect(self.show_database_info)
+        help_menu.addAction(db_info_action)
+        
         about_action = QAction("バージョン情報(&A)", self)
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
@@ -351,7 +368,20 @@ class MainWindow(QMainWindow):
                     pass
                 
                 from database.db_manager import DatabaseManager
-                self.db_manager = DatabaseManager(new_db_path)
+                self.db_manager = DatabaseManager(
+                    new_db_path,
+                    connection_profile=self.settings['database'].get('connection_profile')
+                )
+                self.db_manager.connect()
+                
+                # 一覧表示のモデルも新しい接続に切り替える
+                self.page_cache = PageCache(self.db_manager)
+                for table in self.tables.values():
+                    table.model().db = self.db_manager
+                    table.model().page_cache = self.page_cache
+                self.missing_entry_checker = MissingEntryChecker(self.db_manager)
+                self.query_scheduler.cancel()
+                self.query_scheduler.db = self.db_manager
                 
                 # データ更新
                 self.refresh_current_tab()
@@ -429,7 +459,7 @@ class MainWindow(QMainWindow):
         try:
             from ui.missing_entry_checker_dialog import MissingEntryCheckerDialog
             
-            dialog = MissingEntryCheckerDialog(self.db_manager, self)
+            dialog = MissingEntryCheckerDialog(self.db_manager, self, checker=self.missing_entry_checker)
             dialog.exec()
             
             # チェック後、欠課データ前処理を提案
@@ -486,11 +516,30 @@ class MainWindow(QMainWindow):
             )
     
     def on_tab_changed(self, index):
-        """タブ変更時の処理"""
-        self.refresh_current_tab()
+        """タブ変更時の処理（データが変わっていなければ保持しているページを表示）"""
+        self.request_current_tab(immediate=True)
     
     def refresh_current_tab(self):
-        """現在のタブを更新"""
+        """現在のタブを更新（保持しているページは使わずに読み直す）"""
+        table_mapping = {
+            '評定': 'grades',
+            '観点': 'viewpoint_evaluations',
+            '欠課情報': 'absences'
+        }
+        
+        current_index = self.tab_widget.currentIndex()
+        if current_index >= 0:
+            data_type = ['評定', '観点', '欠課情報'][current_index]
+            self.page_cache.invalidate(table_mapping[data_type])
+        
+        self.request_current_tab(immediate=True)
+    
+    def schedule_refresh(self):
+        """フィルタ変更時の更新（続けて変更された場合は最後の条件だけ検索する）"""
+        self.request_current_tab(immediate=False)
+    
+    def request_current_tab(self, immediate=True):
+        """現在のタブの検索を予約"""
         current_index = self.tab_widget.currentIndex()
         if current_index < 0:
             return
@@ -501,10 +550,10 @@ class MainWindow(QMainWindow):
         
         self.status_bar.showMessage("データ読み込み中...")
         
-        self.load_data_to_table(data_type, table)
+        self.load_data_to_table(data_type, table, immediate)
     
-    def load_data_to_table(self, data_type, table):
-        """データベースからデータをテーブルに読み込む"""
+    def load_data_to_table(self, data_type, table, immediate=True):
+        """データベースからデータをテーブルに読み込む（検索はワーカースレッドで実行）"""
         table_mapping = {
             '評定': 'grades',
             '観点': 'viewpoint_evaluations',
@@ -516,62 +565,87 @@ class MainWindow(QMainWindow):
             self.status_bar.showMessage(f"{data_type}: 未対応のデータタイプです")
             return
         
-        try:
-            # フィルタ条件
-            year = self.year_filter.value()
-            period = self.period_filter.currentText()
-            limit = self.limit_spin.value()
-            
-            # WHERE句作成
-            where_clauses = [f"year = {year}"]
-            if period != "全て":
-                where_clauses.append(f"period = '{period}'")
-            
-            where_str = " AND ".join(where_clauses)
-            
-            # 件数取得
-            count_query = f"SELECT COUNT(*) as count FROM {table_name} WHERE {where_str}"
-            count_result = self.db_manager.fetch_one(count_query)
-            total_count = count_result['count'] if count_result else 0
-            
-            if total_count == 0:
-                table.clear()
-                table.setRowCount(0)
-                table.setColumnCount(0)
-                self.status_bar.showMessage(f"{data_type}: データがありません（年度: {year}, 期間: {period}）")
-                return
-            
-            # データ取得
-            query = f"SELECT * FROM {table_name} WHERE {where_str} LIMIT {limit}"
-            rows = self.db_manager.fetch_all(query)
-            
-            if not rows:
-                table.clear()
-                table.setRowCount(0)
-                table.setColumnCount(0)
-                self.status_bar.showMessage(f"{data_type}: データがありません")
-                return
-            
-            # テーブルに表示
-            table.clear()
-            table.setRowCount(len(rows))
-            table.setColumnCount(len(rows[0].keys()))
-            table.setHorizontalHeaderLabels(rows[0].keys())
-            
-            for i, row in enumerate(rows):
-                for j, key in enumerate(row.keys()):
-                    value = row[key]
-                    item = QTableWidgetItem(str(value) if value is not None else '')
-                    table.setItem(i, j, item)
-            
-            table.resizeColumnsToContents()
-            
-            status_msg = f"{data_type}: {len(rows)}件表示中（全{total_count}件） | 年度: {year}, 期間: {period}"
-            self.status_bar.showMessage(status_msg)
-            
-        except Exception as e:
-            self.status_bar.showMessage(f"エラー: {str(e)}")
-            QMessageBox.warning(self, "エラー", f"データ読み込みエラー:\n{str(e)}")
+        model = table.model()
+        
+        # フィルタ条件
+        year = self.year_filter.value()
+        period = self.period_filter.currentText()
+        
+        # WHERE句作成
+        where_clauses = ["year = ?"]
+        params = [year]
+        if period != "全て":
+            where_clauses.append("period = ?")
+            params.append(period)
+        
+        where_str = " AND ".join(where_clauses)
+        
+        def run_query(connection):
+            """件数と先頭ページの取得（ワーカースレッドで実行）"""
+            # 表示用の件数は集計テーブルから取得（テーブルを COUNT しない）
+            statistics = self.db_manager.get_slice_statistics(
+                table_name, year, None if period == "全て" else period
+            )
+            # 先頭ページの読み込み（残りはスクロールに合わせて読み込む）
+            page = model.fetch_first_page(
+                connection, table_name, where_str, params, statistics['row_count']
+            )
+            return {'statistics': statistics, 'page': page}
+        
+        request = {'data_type': data_type, 'year': year, 'period': period}
+        cache_key = ('first', where_str, tuple(params), model.PAGE_SIZE)
+        
+        # 前回から変更が無ければ検索せずに表示
+        cached = self.page_cache.get(table_name, cache_key)
+        if cached is not None:
+            self.query_scheduler.cancel()
+            self.on_query_finished(request, cached)
+            return
+        
+        # 検索開始前のバージョンで保存する（検索中の書き込みは次回の取得で検出される）
+        request.update({
+            'table_name': table_name,
+            'cache_key': cache_key,
+            'version': self.page_cache.get_version(table_name)
+        })
+        self.query_scheduler.schedule(request, run_query, immediate)
+    
+    def on_query_finished(self, request, result):
+        """検索結果を表示（最新の検索の結果だけが届く）"""
+        data_type = request['data_type']
+        year = request['year']
+        period = request['period']
+        table = self.tables[data_type]
+        statistics = result['statistics']
+        
+        if 'cache_key' in request:
+            self.page_cache.put(request['table_name'], request['cache_key'], result, request['version'])
+        
+        model = table.model()
+        model.apply_first_page(result['page'])
+        
+        # 集計は他のツールの書き込みで古くなることがあるため、読み込んだ行で判断する
+        if model.rowCount() == 0:
+            self.status_bar.showMessage(f"{data_type}: データがありません（年度: {year}, 期間: {period}）")
+            return
+        
+        fit_columns_to_sample(table)
+        
+        status_msg = f"{data_type}: 全{model.get_display_count()}件"
+        if not model.exhausted and model.get_loaded_count() > model.total_count:
+            status_msg += "以上"
+        if statistics['student_count'] is not None:
+            status_msg += f"（生徒{statistics['student_count']}人・講座{statistics['course_count']}）"
+        status_msg += f" | 年度: {year}, 期間: {period}"
+        if statistics['last_import_at']:
+            status_msg += f" | 最終取り込み: {statistics['last_import_at'].replace('T', ' ')}"
+        self.status_bar.showMessage(status_msg)
+    
+    def on_query_failed(self, request, message):
+        """検索エラー"""
+        self.tables[request['data_type']].model().clear()
+        self.status_bar.showMessage(f"エラー: {message}")
+        QMessageBox.warning(self, "エラー", f"データ読み込みエラー:\n{message}")
     
     def export_current_data(self):
         """現在のデータをExcel出力"""
@@ -590,45 +664,53 @@ class MainWindow(QMainWindow):
         }
         
         table_name = table_mapping.get(data_type)
+        year = self.year_filter.value()
+        period = self.period_filter.currentText()
         
-        try:
-            year = self.year_filter.value()
-            period = self.period_filter.currentText()
-            
-            where_clauses = [f"year = {year}"]
+        def run_export(progress_callback=None, cancel_token=None):
+            """検索とExcel出力（ワーカースレッドで実行）"""
+            where_clauses = ["year = ?"]
+            params = [year]
             if period != "全て":
-                where_clauses.append(f"period = '{period}'")
+                where_clauses.append("period = ?")
+                params.append(period)
             
             where_str = " AND ".join(where_clauses)
             
-            query = f"SELECT * FROM {table_name} WHERE {where_str}"
-            rows = self.db_manager.fetch_all(query)
-            
-            if not rows or len(rows) == 0:
-                QMessageBox.information(self, "情報", f"{data_type}にはデータがありません")
-                return
-            
-            data = [dict(row) for row in rows]
-            columns = list(data[0].keys())
+            if progress_callback:
+                progress_callback(0, 1, f"{data_type}を検索中...")
             
             from utils.excel_exporter import ExcelExporter
             exporter = ExcelExporter()
             
-            export_path = exporter.export_to_excel(
-                data=data,
-                columns=columns,
+            # 検索結果はカーソルから直接書き出す（全件をリストにしない）
+            export_path, record_count = exporter.export_query_to_excel(
+                self.db_manager,
+                f"SELECT * FROM {table_name} WHERE {where_str}",
+                tuple(params),
                 filename=f"{data_type}_{year}_{period}.xlsx",
-                sheet_name=data_type
+                sheet_name=data_type,
+                progress_callback=progress_callback,
+                cancel_token=cancel_token
             )
             
+            if record_count == 0:
+                return None
+            
+            return {'export_path': export_path, 'record_count': record_count}
+        
+        def on_finished(result):
+            if result is None:
+                QMessageBox.information(self, "情報", f"{data_type}にはデータがありません")
+                return
+            
+            export_path = result['export_path']
+            
             if self.logger:
                 self.logger.log_action(
-                    action_type='export',
-                    master_type=data_type,
-                    file_path=export_path,
-                    record_count=len(data),
-                    status='success',
-                    details=f'Excel出力: 年度{year}, 期間{period}'
+                    'export',
+                    f'Excel出力: {data_type}, 年度{year}, 期間{period}, '
+                    f'{result["record_count"]}件, {export_path}'
                 )
             
             reply = QMessageBox.information(
@@ -636,7 +718,7 @@ class MainWindow(QMainWindow):
                 "出力完了",
                 f"{data_type}をExcelファイルに出力しました。\n\n"
                 f"ファイル: {Path(export_path).name}\n"
-                f"レコード数: {len(data)}件\n\n"
+                f"レコード数: {result['record_count']}件\n\n"
                 f"出力先フォルダを開きますか？",
                 QMessageBox.Yes | QMessageBox.No
             )
@@ -648,8 +730,14 @@ class MainWindow(QMainWindow):
                 if os.name == 'nt':
                     os.startfile(export_dir)
         
-        except Exception as e:
-            QMessageBox.critical(self, "エラー", f"Excel出力に失敗:\n{str(e)}")
+        start_job_with_progress(
+            self,
+            "Excel出力中...",
+            run_export,
+            on_finished=on_finished,
+            on_failed=lambda message: QMessageBox.critical(self, "エラー", f"Excel出力に失敗:\n{message}"),
+            on_cancelled=lambda: self.status_bar.showMessage("Excel出力をキャンセルしました")
+        )
     
     def export_all_data(self):
         """全データをExcel出力"""
@@ -669,45 +757,51 @@ class MainWindow(QMainWindow):
         if reply == QMessageBox.No:
             return
         
-        try:
-            data_dict = {}
-            total_records = 0
-            
-            for data_type, table_name in table_mapping.items():
-                try:
-                    query = f"SELECT * FROM {table_name}"
-                    rows = self.db_manager.fetch_all(query)
-                    
-                    if rows and len(rows) > 0:
-                        data = [dict(row) for row in rows]
-                        columns = list(data[0].keys())
-                        data_dict[data_type] = (data, columns)
-                        total_records += len(data)
-                except:
-                    pass
-            
-            if not data_dict:
-                QMessageBox.information(self, "情報", "出力するデータがありません")
-                return
+        def run_export(progress_callback=None, cancel_token=None):
+            """全テーブルの検索とExcel出力（ワーカースレッドで実行）"""
+            query_dict = {
+                data_type: (f"SELECT * FROM {table_name}", ())
+                for data_type, table_name in table_mapping.items()
+            }
             
             from utils.excel_exporter import ExcelExporter
             exporter = ExcelExporter()
             
-            export_path = exporter.export_multiple_sheets(
-                data_dict=data_dict,
-                filename="全評価データ.xlsx"
+            # テーブルごとにカーソルから直接シートへ書き出す（0件のテーブルは省略）
+            export_path, total_records = exporter.export_queries_to_excel(
+                self.db_manager,
+                query_dict,
+                filename="全評価データ.xlsx",
+                progress_callback=progress_callback,
+                cancel_token=cancel_token
             )
             
+            if total_records == 0:
+                return None
+            
+            return {'export_path': export_path, 'record_count': total_records}
+        
+        def on_finished(result):
+            if result is None:
+                QMessageBox.information(self, "情報", "出力するデータがありません")
+                return
+            
             QMessageBox.information(
                 self,
                 "出力完了",
                 f"全データをExcelファイルに出力しました。\n\n"
-                f"ファイル: {Path(export_path).name}\n"
-                f"総レコード数: {total_records}件"
+                f"ファイル: {Path(result['export_path']).name}\n"
+                f"総レコード数: {result['record_count']}件"
             )
         
-        except Exception as e:
-            QMessageBox.critical(self, "エラー", f"Excel出力に失敗:\n{str(e)}")
+        start_job_with_progress(
+            self,
+            "Excel出力中...",
+            run_export,
+            on_finished=on_finished,
+            on_failed=lambda message: QMessageBox.critical(self, "エラー", f"Excel出力に失敗:\n{message}"),
+            on_cancelled=lambda: self.status_bar.showMessage("Excel出力をキャンセルしました")
+        )
     
     def clear_current_data(self):
         """現在のデータを削除"""
@@ -730,15 +824,25 @@ class MainWindow(QMainWindow):
             year = self.year_filter.value()
             period = self.period_filter.currentText()
             
-            where_clauses = [f"year = {year}"]
+            where_clauses = ["year = ?"]
+            params = [year]
             if period != "全て":
-                where_clauses.append(f"period = '{period}'")
+                where_clauses.append("period = ?")
+                params.append(period)
             
             where_str = " AND ".join(where_clauses)
             
-            count_query = f"SELECT COUNT(*) as count FROM {table_name} WHERE {where_str}"
-            result = self.db_manager.fetch_one(count_query)
-            count = result['count'] if result else 0
+            count = self.db_manager.get_slice_statistics(
+                table_name, year, None if period == "全て" else period
+            )['row_count']
+            
+            if count == 0:
+                # 集計が古い場合（他のツールで書き込まれた場合など）に備えて実際の件数を確認
+                count_result = self.db_manager.execute_read(
+                    f"SELECT COUNT(*) FROM {table_name} WHERE {where_str}",
+                    tuple(params)
+                ).fetchone()
+                count = count_result[0] if count_result else 0
             
             if count == 0:
                 QMessageBox.information(self, "情報", "データがありません")
@@ -755,7 +859,15 @@ class MainWindow(QMainWindow):
             
             if reply == QMessageBox.Yes:
                 delete_query = f"DELETE FROM {table_name} WHERE {where_str}"
-                self.db_manager.execute_query(delete_query)
+                
+                with self.db_manager.transaction():
+                    count = self.db_manager.execute_query(delete_query, tuple(params)).rowcount
+                    self.db_manager.refresh_slice_statistics(
+                        table_name, year, None if period == "全て" else period
+                    )
+                    
+                    if self.logger:
+                        self.logger.log_action('data_clear', f'{data_type}: 年度{year}, 期間{period}, {count}件削除')
                 
                 QMessageBox.information(self, "削除完了", f"{count}件のデータを削除しました。")
                 self.refresh_current_tab()
@@ -763,6 +875,26 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"削除に失敗:\n{str(e)}")
     
+    def show_slice_statistics(self):
+        """年度・期間ごとの取り込み状況を表示"""
+        try:
+            from ui.slice_statistics_dialog import SliceStatisticsDialog
+            
+            dialog = SliceStatisticsDialog(self.db_manager, self)
+            dialog.exec()
+            
+            # 再集計した場合に件数表示を合わせる
+            self.refresh_current_tab()
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            print(error_detail)
+            QMessageBox.critical(
+                self,
+                "エラー",
+                f"取り込み状況一覧の表示に失敗しました:\n{str(e)}"
+            )
+    
     def open_required_columns_manager(self):
         """必須カラム管理ダイアログを開く"""
         try:
@@ -824,6 +956,20 @@ class MainWindow(QMainWindow):
         msg.setStyleSheet("QLabel{min-width: 600px; font-family: 'MS Gothic';}")
         msg.exec()
     
+    def show_database_info(self):
+        """データベースの接続設定（有効なPRAGMA）を表示"""
+        try:
+            report = self.db_manager.get_pragma_report()
+            lines = [f"{key}: {value}" for key, value in report.items()]
+            
+            QMessageBox.information(
+                self,
+                "データベース接続情報",
+                f"データベース: {self.db_manager.db_path}\n\n" + "\n".join(lines)
+            )
+        except Exception as e:
+            QMessageBox.warning(self, "エラー", f"接続情報の取得に失敗:\n{str(e)}")
+    
     def show_about(self):
         """バージョン情報表示"""
         from __version__ import APP_NAME, APP_VERSION, __release_date__, APP_DESCRIPTION
@@ -840,8 +986,13 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         """ウィンドウを閉じる時の処理"""
+        # 実行中の一覧の検索を中断
+        self.query_scheduler.cancel()
+        
+        # 接続は終了処理（main.py）で終了ログを記録してから閉じる
         try:
-            self.db_manager.close()
+            if self.logger:
+                self.logger.flush()
         except:
             pass
         event.accept()
@@ -1,18 +1,21 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
                                QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
                                QMessageBox, QComboBox, QSpinBox, QGroupBox,
-                               QTabWidget)
+                               QTabWidget, QCheckBox)
 from PySide6.QtCore import Qt
 from pathlib import Path
 from datetime import datetime
+from utils.missing_entry_checker import MissingEntryChecker
 
 
 class MissingEntryCheckerDialog(QDialog):
     """未入力者チェックダイアログ"""
     
-    def __init__(self, db_manager, parent=None):
+    def __init__(self, db_manager, parent=None, checker=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        # チェック結果はデータが更新されるまで使い回す（メイン画面から渡された場合は共有）
+        self.checker = checker or MissingEntryChecker(db_manager)
         
         self.setup_ui()
     
@@ -46,6 +49,10 @@ class MissingEntryCheckerDialog(QDialog):
         self.period_combo.addItems(['前期', '後期', '通年'])
         condition_layout.addWidget(self.period_combo)
         
+        self.all_periods_check = QCheckBox("全年度・全期間")
+        self.all_periods_check.toggled.connect(self.on_all_periods_toggled)
+        condition_layout.addWidget(self.all_periods_check)
+        
         check_btn = QPushButton("チェック実行")
         check_btn.clicked.connect(self.check_missing_entries)
         condition_layout.addWidget(check_btn)
@@ -82,18 +89,32 @@ class MissingEntryCheckerDialog(QDialog):
         
         layout.addLayout(button_layout)
     
+    def on_all_periods_toggled(self, checked):
+        """全年度・全期間の切り替え"""
+        self.year_spin.setEnabled(not checked)
+        self.period_combo.setEnabled(not checked)
+    
+    def get_scope_label(self):
+        """チェック対象の表示用文字列"""
+        if self.all_periods_check.isChecked():
+            return "全年度・全期間"
+        return f"年度: {self.year_spin.value()}, 期間: {self.period_combo.currentText()}"
+    
+    def get_missing_entries(self):
+        """現在の条件の未入力者を取得（評定・観点を1回で抽出し、結果は使い回す）"""
+        if self.all_periods_check.isChecked():
+            return self.checker.check_all()
+        
+        return self.checker.check(self.year_spin.value(), self.period_combo.currentText())
+    
     def check_missing_entries(self):
         """未入力者チェック実行"""
-        year = self.year_spin.value()
-        period = self.period_combo.currentText()
-        
         try:
-            # 評定未入力チェック
-            missing_grades = self.check_missing_grades(year, period)
-            self.display_missing_data(self.grade_table, missing_grades, "評定")
+            missing_entries = self.get_missing_entries()
+            missing_grades = missing_entries['grades']
+            missing_viewpoints = missing_entries['viewpoints']
             
-            # 観点未入力チェック
-            missing_viewpoints = self.check_missing_viewpoints(year, period)
+            self.display_missing_data(self.grade_table, missing_grades, "評定")
             self.display_missing_data(self.viewpoint_table, missing_viewpoints, "観点")
             
             # 結果サマリー
@@ -104,7 +125,7 @@ class MissingEntryCheckerDialog(QDialog):
                     self,
                     "チェック完了",
                     f"未入力者はいません。\n\n"
-                    f"年度: {year}, 期間: {period}"
+                    f"{self.get_scope_label()}"
                 )
             else:
                 QMessageBox.warning(
@@ -125,17 +146,11 @@ class MissingEntryCheckerDialog(QDialog):
     
     def check_missing_grades(self, year, period):
         """評定未入力をチェック"""
-        query = """ SELECT e.course_number, e.course_name, e.student_number, e.student_name FROM enrollments e LEFT JOIN grades g ON e.student_number = g.student_number AND e.course_number = g.course_number AND g.year = ? AND g.period = ? WHERE g.id IS NULL ORDER BY e.course_number, e.student_number """
-        
-        results = self.db_manager.fetch_all(query, (year, period))
-        return [dict(row) for row in results]
+        return self.checker.check(year, period)['grades']
     
     def check_missing_viewpoints(self, year, period):
         """観点未入力をチェック"""
-        query = """ SELECT e.course_number, e.course_name, e.student_number, e.student_name FROM enrollments e LEFT JOIN viewpoint_evaluations v ON e.student_number = v.student_number AND e.course_number = v.course_number AND v.year = ? AND v.period = ? WHERE v.id IS NULL ORDER BY e.course_number, e.student_number """
-        
-        results = self.db_manager.fetch_all(query, (year, period))
-        return [dict(row) for row in results]
+        return self.checker.check(year, period)['viewpoints']
     
     def display_missing_data(self, table, data, data_type):
         """未入力データを表示"""
@@ -161,12 +176,16 @@ class MissingEntryCheckerDialog(QDialog):
     
     def export_missing_list(self):
         """未入力リストをExcel出力"""
-        year = self.year_spin.value()
-        period = self.period_combo.currentText()
+        if self.all_periods_check.isChecked():
+            filename = "未入力者リスト_全期間.xlsx"
+        else:
+            filename = f"未入力者リスト_{self.year_spin.value()}_{self.period_combo.currentText()}.xlsx"
         
         try:
-            missing_grades = self.check_missing_grades(year, period)
-            missing_viewpoints = self.check_missing_viewpoints(year, period)
+            # チェック実行後であれば同じ結果をそのまま出力する
+            missing_entries = self.get_missing_entries()
+            missing_grades = missing_entries['grades']
+            missing_viewpoints = missing_entries['viewpoints']
             
             if not missing_grades and not missing_viewpoints:
                 QMessageBox.information(self, "情報", "出力するデータがありません")
@@ -187,7 +206,7 @@ class MissingEntryCheckerDialog(QDialog):
             
             export_path = exporter.export_multiple_sheets(
                 data_dict=data_dict,
-                filename=f"未入力者リスト_{year}_{period}.xlsx"
+                filename=filename
             )
             
             reply = QMessageBox.information(
@@ -1,11 +1,14 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                                QPushButton, QComboBox, QSpinBox, QFileDialog,
                                QMessageBox, QTableWidget, QTableWidgetItem,
-                               QProgressDialog, QCheckBox, QGroupBox)
+                               QCheckBox, QGroupBox)
 from PySide6.QtCore import Qt
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
+from ui.background_job import start_job_with_progress
+from utils.preview_service import PreviewService, count_data_rows
+from ui.sheet_prefetcher import SheetPrefetcher
 
 
 class PeriodImportDialog(QDialog):
@@ -23,9 +26,23 @@ class PeriodImportDialog(QDialog):
         self.sheet_names = []
         self.column_mapping = {}
         self.log_viewer = None
+        self.preview_service = PreviewService()
+        self.sheet_info = {}
+        
+        # シート情報の先読み（ファイル選択後にバックグラウンドで実行）
+        self.prefetcher = SheetPrefetcher(self.preview_service, self)
+        self.prefetcher.sheet_names_ready.connect(self.on_sheet_names_prefetched)
+        self.prefetcher.sheet_scanned.connect(self.on_sheet_prefetched)
+        self.prefetcher.failed.connect(self.on_prefetch_failed)
         
         self.setup_ui()
     
+    def done(self, result):
+        """ダイアログ終了時に先読みを止め、プレビュー用のブックを閉じる"""
+        self.prefetcher.cancel()
+        self.preview_service.close()
+        super().done(result)
+    
     def setup_ui(self):
         """UI初期化"""
         self.setWindowTitle(f"{self.data_type}データ取り込み")
@@ -110,6 +127,7 @@ class PeriodImportDialog(QDialog):
         self.header_spin.setValue(0)
         self.header_spin.setToolTip("0 = 1行目がヘッダー")
         self.header_spin.valueChanged.connect(self.update_preview)
+        self.header_spin.valueChanged.connect(self.update_sheet_row_counts)
         header_layout.addWidget(self.header_spin)
         
         header_layout.addWidget(QLabel("行目（0始まり）"))
@@ -138,8 +156,8 @@ class PeriodImportDialog(QDialog):
         sheet_layout = QVBoxLayout()
         
         self.sheet_table = QTableWidget()
-        self.sheet_table.setColumnCount(2)
-        self.sheet_table.setHorizontalHeaderLabels(['選択', 'シート名'])
+        self.sheet_table.setColumnCount(4)
+        self.sheet_table.setHorizontalHeaderLabels(['選択', 'シート名', 'データ行数', 'ヘッダー候補'])
         self.sheet_table.horizontalHeader().setStretchLastSection(True)
         self.sheet_table.setMaximumHeight(150)
         self.sheet_table.setAlternatingRowColors(True)
@@ -193,6 +211,13 @@ class PeriodImportDialog(QDialog):
         self.timestamp_check = QCheckBox("⏰ ファイル名にタイムスタンプを追加")
         self.timestamp_check.setChecked(True)
         option_layout.addWidget(self.timestamp_check)
+        
+        self.incremental_check = QCheckBox("差分取り込み（変更された行のみ更新）")
+        self.incremental_check.setToolTip(
+            "既存データと比較し、追加・変更・削除された行だけを書き込みます。\n"
+            "オフの場合は期間・年度のデータを全て置き換えます。"
+        )
+        option_layout.addWidget(self.incremental_check)
         option_layout.addStretch()
         layout.addLayout(option_layout)
         
@@ -256,17 +281,77 @@ class PeriodImportDialog(QDialog):
             self.file_label.setText(file_name)
             self.file_label.setStyleSheet("color: #27ae60; font-weight: bold;")
             
-            # シート名読み込み
-            self.load_sheet_names()
-            
-            # プレビュー表示
+            # 前のファイルの表示を消して、シート情報をバックグラウンドで読み込む
+            # （シート一覧とプレビューは読み込めたものから表示される）
+            self.prefetcher.cancel()
+            self.sheet_names = []
+            self.sheet_info = {}
+            self.sheet_table.setRowCount(0)
+            self.preview_table.clear()
+            self.preview_table.setRowCount(0)
+            self.preview_table.setColumnCount(0)
+            self.prefetcher.start([file_path], self.header_spin.value())
+    
+    def on_sheet_names_prefetched(self, file_path, sheet_names):
+        """先読みでシート名が取得できたときの処理"""
+        if file_path != self.file_path:
+            return
+        self.load_sheet_names()
+    
+    def on_sheet_prefetched(self, file_path, info):
+        """先読みで1シートの走査が終わったときの処理"""
+        if file_path != self.file_path or info['sheet_name'] not in self.sheet_names:
+            return
+        
+        self.sheet_info[info['sheet_name']] = info
+        self.update_sheet_row(self.sheet_names.index(info['sheet_name']))
+        
+        # 表示中のシート（未選択なら先頭シート）が読み込めたらプレビューを表示
+        if info['sheet_name'] == self.get_current_sheet_name():
             self.update_preview()
     
+    def on_prefetch_failed(self, file_path, message):
+        """先読み失敗時の処理"""
+        if file_path == self.file_path:
+            QMessageBox.warning(self, "エラー", f"シート読み込みエラー:\n{message}")
+    
+    def get_current_sheet_name(self):
+        """選択中のシート名（未選択なら先頭シート）"""
+        current_row = self.sheet_table.currentRow()
+        if current_row >= 0:
+            return self.sheet_table.item(current_row, 1).text()
+        return self.sheet_names[0] if self.sheet_names else None
+    
+    def update_sheet_row(self, row):
+        """シート一覧の行数・ヘッダー候補の列を更新"""
+        info = self.sheet_info.get(self.sheet_names[row])
+        
+        header_item = QTableWidgetItem()
+        
+        if info is None:
+            rows_text = "読み込み中..."
+        else:
+            rows_text = f"{count_data_rows(info, self.header_spin.value()):,}"
+            # 最有力の候補を表示し、他の候補はツールチップで示す
+            candidates = info['header_candidates']
+            if candidates:
+                header_item.setText(f"{candidates[0]}行目")
+                header_item.setToolTip("候補: " + ", ".join(f"{i}行目" for i in candidates))
+        
+        rows_item = QTableWidgetItem(rows_text)
+        rows_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.sheet_table.setItem(row, 2, rows_item)
+        self.sheet_table.setItem(row, 3, header_item)
+    
+    def update_sheet_row_counts(self):
+        """ヘッダー行の変更に合わせてデータ行数を更新"""
+        for row in range(self.sheet_table.rowCount()):
+            self.update_sheet_row(row)
+    
     def load_sheet_names(self):
         """シート名読み込み"""
         try:
-            excel_file = pd.ExcelFile(self.file_path)
-            self.sheet_names = excel_file.sheet_names
+            self.sheet_names = self.preview_service.get_sheet_names(self.file_path)
             
             # テーブルに表示
             self.sheet_table.setRowCount(len(self.sheet_names))
@@ -281,6 +366,9 @@ class PeriodImportDialog(QDialog):
                 # シート名
                 name_item = QTableWidgetItem(sheet_name)
                 self.sheet_table.setItem(i, 1, name_item)
+                
+                # 行数・ヘッダー候補（先読みが終わったシートから埋まる）
+                self.update_sheet_row(i)
             
             self.sheet_table.resizeColumnsToContents()
             
@@ -293,27 +381,17 @@ class PeriodImportDialog(QDialog):
     
     def update_preview(self):
         """プレビュー更新"""
-        if not self.file_path:
+        if not self.file_path or not self.sheet_names:
             return
         
         try:
-            # 選択されているシートを取得
-            current_row = self.sheet_table.currentRow()
-            if current_row >= 0:
-                sheet_name = self.sheet_table.item(current_row, 1).text()
-            else:
-                # 最初のシートを使用
-                sheet_name = self.sheet_names[0] if self.sheet_names else 0
+            # 選択されているシートを取得（未選択なら最初のシート）
+            sheet_name = self.get_current_sheet_name()
             
             header_row = self.header_spin.value()
             
-            # データ読み込み（先頭10行）
-            df = pd.read_excel(
-                self.file_path,
-                sheet_name=sheet_name,
-                header=header_row,
-                nrows=10
-            )
+            # データ読み込み（先頭10行のみ、読み込み済みのシートはキャッシュから）
+            df = self.preview_service.get_preview(self.file_path, sheet_name, header_row)
             
             # プレビューテーブルに表示
             self.preview_table.clear()
@@ -425,8 +503,7 @@ class PeriodImportDialog(QDialog):
                 sheet_name = self.sheet_names[0] if self.sheet_names else 0
             
             header_row = self.header_spin.value()
-            df = pd.read_excel(self.file_path, sheet_name=sheet_name, header=header_row, nrows=0)
-            excel_columns = df.columns.tolist()
+            excel_columns = self.preview_service.get_columns(self.file_path, sheet_name, header_row)
             
             # マッピングダイアログを開く
             dialog = ColumnMappingDialog(
@@ -494,7 +571,15 @@ class PeriodImportDialog(QDialog):
             )
             return
         
-        # 確認ダイアログ
+        # 確認ダイアログ（先読み済みのシートは実際のデータ行数を表示）
+        header_row = self.header_spin.value()
+        scanned = [self.sheet_info[s] for s in selected_sheets if s in self.sheet_info]
+        total_rows = sum(count_data_rows(info, header_row) for info in scanned)
+        if len(scanned) == len(selected_sheets):
+            rows_text = f"{total_rows:,}行"
+        else:
+            rows_text = f"{total_rows:,}行以上（{len(selected_sheets) - len(scanned)}シート集計中）"
+        
         reply = QMessageBox.question(
             self,
             "確認",
@@ -504,7 +589,9 @@ class PeriodImportDialog(QDialog):
             f"年度: {self.year_spin.value()}\n"
             f"ファイル: {Path(self.file_path).name}\n"
             f"シート数: {len(selected_sheets)}\n"
-            f"ヘッダー行: {self.header_spin.value()}",
+            f"データ行数: {rows_text}\n"
+            f"ヘッダー行: {self.header_spin.value()}\n"
+            f"取り込み方法: {'差分取り込み' if self.incremental_check.isChecked() else '全件置き換え'}",
             QMessageBox.Yes | QMessageBox.No
         )
         
@@ -514,55 +601,66 @@ class PeriodImportDialog(QDialog):
         # タイムスタンプ追加確認
         add_timestamp = self.timestamp_check.isChecked()
         
-        # 進捗ダイアログ
-        progress = QProgressDialog("取り込み中...", "キャンセル", 0, 100, self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)
-        progress.setValue(0)
+        # 取り込みはバックグラウンドで実行（進捗ダイアログからキャンセル可能）
+        start_job_with_progress(
+            self,
+            "取り込み中...",
+            self.data_importer.import_data,
+            on_finished=self.on_import_finished,
+            on_failed=self.on_import_failed,
+            on_cancelled=self.on_import_cancelled,
+            file_path=self.file_path,
+            data_type=self.data_type,
+            period=self.period_combo.currentText(),
+            year=self.year_spin.value(),
+            column_mapping=self.column_mapping,
+            sheet_names=selected_sheets,
+            header_row=self.header_spin.value(),
+            add_timestamp=add_timestamp,
+            incremental=self.incremental_check.isChecked()
+        )
+    
+    def on_import_finished(self, success):
+        """取り込み完了時の処理"""
+        if not success:
+            return
         
-        def update_progress(current, total, message):
-            if total > 0:
-                percent = int((current / total) * 100)
-                progress.setValue(percent)
-                progress.setLabelText(message)
+        # マッピング保存確認
+        reply = QMessageBox.question(
+            self,
+            "マッピング保存",
+            "このカラムマッピングを保存しますか?",
+            QMessageBox.Yes | QMessageBox.No
+        )
         
-        try:
-            # データ取り込み実行
-            success = self.data_importer.import_data(
-                file_path=self.file_path,
-                data_type=self.data_type,
-                period=self.period_combo.currentText(),
-                year=self.year_spin.value(),
-                column_mapping=self.column_mapping,
-                sheet_names=selected_sheets,
-                header_row=self.header_spin.value(),
-                progress_callback=update_progress,
-                add_timestamp=add_timestamp
+        if reply == QMessageBox.Yes:
+            self.config_manager.save_column_mapping(
+                self.data_type,
+                self.column_mapping
             )
-            
-            progress.setValue(100)
-            
-            if success:
-                # マッピング保存確認
-                reply = QMessageBox.question(
-                    self,
-                    "マッピング保存",
-                    "このカラムマッピングを保存しますか?",
-                    QMessageBox.Yes | QMessageBox.No
-                )
-                
-                if reply == QMessageBox.Yes:
-                    self.config_manager.save_column_mapping(
-                        self.data_type,
-                        self.column_mapping
-                    )
-                
-                QMessageBox.information(self, "完了", f"{self.data_type}の取り込みが完了しました")
-                self.accept()
-            
-        except Exception as e:
-            progress.close()
-            import traceback
-            error_detail = traceback.format_exc()
-            print(error_detail)
-            QMessageBox.critical(self, "エラー", f"取り込みエラー:\n{str(e)}")
\ No newline at end of file
+        
+        message = f"{self.data_type}の取り込みが完了しました"
+        
+        stats = self.data_importer.last_import_stats
+        if stats.get('mode') == 'incremental':
+            message += (
+                f"\n\n追加: {stats['inserted']:,}件\n"
+                f"更新: {stats['updated']:,}件\n"
+                f"削除: {stats['deleted']:,}件\n"
+                f"変更なし: {stats['unchanged']:,}件"
+            )
+        
+        QMessageBox.information(self, "完了", message)
+        self.accept()
+    
+    def on_import_failed(self, message):
+        """取り込みエラー時の処理"""
+        QMessageBox.critical(self, "エラー", f"取り込みエラー:\n{message}")
+    
+    def on_import_cancelled(self):
+        """取り込みキャンセル時の処理"""
+        QMessageBox.information(
+            self,
+            "キャンセル",
+            "取り込みをキャンセルしました（データベースは変更されていません）"
+        )
\ No newline at end of file
@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+from PySide6.QtCore import QObject, QThreadPool, QTimer, Signal
+from ui.background_job import BackgroundJob
+from utils.job_control import OperationCancelled
+
+
+class QueryScheduler(QObject):
+    """一覧表示の検索を遅延実行し、古い検索を中断するスケジューラ
+
+    schedule() は検索を予約するだけで、delay_ms の間に次の予約が来なければ
+    ワーカースレッドで実行する（年度のスピンボックスを連続で動かした場合は
+    最後の値だけ検索する）。新しい予約が来た時点で実行中の検索は
+    sqlite3.Connection.interrupt() で中断し、結果は最新の予約のものだけを
+    result_ready で通知する。
+
+    検索関数は func(connection) の形で、共有の読み取り接続
+    （DatabaseManager.borrow_read_connection）を受け取る。接続は検索が終わると
+    返却されて次の検索で使い回すため、検索のたびに接続は増えない。
+    UIの部品には触れず、表示に必要な値を返すこと。
+    """
+
+    result_ready = Signal(object, object)
+    failed = Signal(object, str)
+
+    def __init__(self, db_manager, delay_ms=250, parent=None):
+        super().__init__(parent)
+        self.db = db_manager
+        self.delay_ms = delay_ms
+        self.generation = 0
+        self.pending = None
+        self.jobs = set()
+        # 世代 → 実行中の検索が使っている接続
+        self.active_connections = {}
+        self.lock = threading.Lock()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.start_pending)
+
+    def schedule(self, request, func, immediate=False):
+        """検索を予約（immediate=True の場合は待たずに実行）
+
+        request は結果と一緒に通知される任意の値（検索条件など）。
+        """
+        with self.lock:
+            self.generation += 1
+            self.pending = (self.generation, request, func)
+
+        self.interrupt_active()
+
+        if immediate:
+            self.timer.stop()
+            self.start_pending()
+        else:
+            self.timer.start(self.delay_ms)
+
+        return self.generation
+
+    def start_pending(self):
+        """予約された検索をワーカースレッドで開始"""
+        if self.pending is None:
+            return
+
+        generation, request, func = self.pending
+        self.pending = None
+
+        job = BackgroundJob(self.run_query, generation, func)
+        job.signals.finished.connect(lambda result: self.on_finished(job, generation, request, result))
+        job.signals.failed.connect(lambda message, detail: self.on_failed(job, generation, request, message, detail))
+        job.signals.cancelled.connect(lambda: self.jobs.discard(job))
+        self.jobs.add(job)
+
+        QThreadPool.globalInstance().start(job)
+
+    def run_query(self, generation, func, progress_callback=None, cancel_token=None):
+        """検索を実行（ワーカースレッド）"""
+        with self.db.borrow_read_connection() as connection:
+            with self.lock:
+                # 開始前に新しい予約が来ていれば実行しない
+                if generation != self.generation:
+                    raise OperationCancelled()
+                self.active_connections[generation] = connection
+
+            try:
+                return func(connection)
+            except sqlite3.OperationalError:
+                # interrupt() による中断は "interrupted" の OperationalError になる
+                if generation != self.generation:
+                    raise OperationCancelled()
+                raise
+            finally:
+                # 返却前に外す（返却後の接続を interrupt しないため）
+                with self.lock:
+                    self.active_connections.pop(generation, None)
+
+    def interrupt_active(self):
+        """実行中の古い検索を中断"""
+        with self.lock:
+            for generation, connection in self.active_connections.items():
+                if generation != self.generation:
+                    connection.interrupt()
+
+        for job in list(self.jobs):
+            job.cancel()
+
+    def on_finished(self, job, generation, request, result):
+        """検索完了（最新の予約の結果だけを通知）"""
+        self.jobs.discard(job)
+
+        if generation == self.generation:
+            self.result_ready.emit(request, result)
+
+    def on_failed(self, job, generation, request, message, detail):
+        """検索失敗（最新の予約の場合だけ通知）"""
+        self.jobs.discard(job)
+
+        if generation == self.generation:
+            print(detail)
+            self.failed.emit(request, message)
+
+    def cancel(self):
+        """予約と実行中の検索を全て取り消す"""
+        self.timer.stop()
+
+        with self.lock:
+            self.generation += 1
+            self.pending = None
+
+        self.interrupt_active()
+
+    def is_busy(self):
+        """予約または実行中の検索があるか"""
+        return self.pending is not None or bool(self.jobs)
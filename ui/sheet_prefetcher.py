@@ -0,0 +1,70 @@
+from PySide6.QtCore import QObject, QThreadPool, Signal
+from pathlib import Path
+from ui.background_job import BackgroundJob
+from utils.job_control import OperationCancelled, check_cancelled
+
+
+class SheetPrefetcher(QObject):
+    """ブック選択後にシート情報をバックグラウンドで先読みするクラス
+
+    シート名・シートごとの行数・ヘッダー候補・先頭行をワーカースレッドで
+    読み込み、シートごとにシグナルで通知する。画面側は通知を受けるたびに
+    シート一覧やプレビューを埋めていけばよく、ファイル選択直後に画面が
+    止まらない。先頭行は PreviewService にキャッシュされる。
+    """
+
+    sheet_names_ready = Signal(str, object)
+    sheet_scanned = Signal(str, object)
+    file_finished = Signal(str, object)
+    failed = Signal(str, str)
+
+    def __init__(self, preview_service, parent=None):
+        super().__init__(parent)
+        self.preview_service = preview_service
+        self.jobs = set()
+
+    def start(self, file_paths, header_row=0):
+        """ファイルの先読みを開始"""
+        job = BackgroundJob(self.scan_files, list(file_paths), header_row)
+        job.signals.finished.connect(lambda _result: self.jobs.discard(job))
+        job.signals.cancelled.connect(lambda: self.jobs.discard(job))
+        job.signals.failed.connect(lambda message, detail: self.jobs.discard(job))
+        self.jobs.add(job)
+
+        QThreadPool.globalInstance().start(job)
+        return job
+
+    def cancel(self):
+        """実行中の先読みを全て中断"""
+        for job in list(self.jobs):
+            job.cancel()
+
+    def scan_files(self, file_paths, header_row=0, progress_callback=None, cancel_token=None):
+        """ファイルを順に走査（ワーカースレッド）"""
+        results = {}
+
+        for i, file_path in enumerate(file_paths):
+            check_cancelled(cancel_token)
+
+            if progress_callback:
+                progress_callback(i, len(file_paths), f"シート情報読み込み中: {Path(file_path).name}")
+
+            try:
+                results[file_path] = self.preview_service.scan_workbook(
+                    file_path,
+                    header_row,
+                    cancel_token=cancel_token,
+                    on_sheet_names=lambda names, path=file_path: self.sheet_names_ready.emit(path, names),
+                    on_sheet_scanned=lambda info, path=file_path: self.sheet_scanned.emit(path, info)
+                )
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                # 1ファイルの失敗で残りの先読みは止めない
+                print(f"シート情報読み込みエラー: {e}")
+                self.failed.emit(file_path, str(e))
+                continue
+
+            self.file_finished.emit(file_path, results[file_path])
+
+        return results
@@ -0,0 +1,92 @@
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
+                               QLabel, QTableWidget, QTableWidgetItem, QHeaderView,
+                               QMessageBox)
+from PySide6.QtCore import Qt
+from database.migrations import DATA_TABLES
+
+
+class SliceStatisticsDialog(QDialog):
+    """年度・期間ごとの取り込み状況一覧ダイアログ（集計テーブルを表示）"""
+
+    COLUMNS = [
+        ('data_type', 'データ種別'),
+        ('year', '年度'),
+        ('period', '期間'),
+        ('row_count', '件数'),
+        ('student_count', '生徒数'),
+        ('course_count', '講座数'),
+        ('last_import_at', '最終取り込み'),
+        ('source_file', '取り込みファイル')
+    ]
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        # テーブル名 → データ種別
+        self.data_types = {table_name: data_type for data_type, table_name in DATA_TABLES.items()}
+
+        self.setup_ui()
+        self.load_statistics()
+
+    def setup_ui(self):
+        """UI初期化"""
+        self.setWindowTitle("取り込み状況一覧")
+        self.setMinimumSize(900, 500)
+
+        layout = QVBoxLayout(self)
+
+        info_label = QLabel(
+            "年度・期間ごとの件数と最終取り込みを表示します。\n"
+            "件数は取り込み・削除のたびに更新されます。他のツールでデータを変更した場合は「再集計」を実行してください。"
+        )
+        layout.addWidget(info_label)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([label for _, label in self.COLUMNS])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+
+        rebuild_btn = QPushButton("再集計")
+        rebuild_btn.clicked.connect(self.rebuild_statistics)
+        button_layout.addWidget(rebuild_btn)
+
+        button_layout.addStretch()
+
+        close_btn = QPushButton("閉じる")
+        close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(close_btn)
+
+        layout.addLayout(button_layout)
+
+    def load_statistics(self):
+        """集計テーブルを読み込んで表示"""
+        rows = self.db_manager.list_slice_statistics()
+
+        self.table.setRowCount(len(rows))
+
+        for i, row in enumerate(rows):
+            row = dict(row, data_type=self.data_types.get(row['table_name'], row['table_name']))
+            if row['last_import_at']:
+                row['last_import_at'] = row['last_import_at'].replace('T', ' ')
+
+            for j, (key, _) in enumerate(self.COLUMNS):
+                value = row.get(key)
+                item = QTableWidgetItem(str(value) if value is not None else '')
+                if key in ('row_count', 'student_count', 'course_count'):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(i, j, item)
+
+        self.table.resizeColumnsToContents()
+
+    def rebuild_statistics(self):
+        """全データから集計を作り直す"""
+        try:
+            self.db_manager.rebuild_slice_statistics()
+            self.load_statistics()
+        except Exception as e:
+            QMessageBox.critical(self, "エラー", f"再集計に失敗:\n{str(e)}")
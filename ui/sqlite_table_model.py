@@ -0,0 +1,235 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class SqliteTableModel(QAbstractTableModel):
+    """SQLiteテーブルをスクロールに合わせてページ単位で読み込むモデル
+
+    全件を一度に取得せず、QTableView がスクロール末尾に近づくたびに
+    fetchMore で次のページ（id によるキーセットページング）を読み込む。
+    page_cache（PageCache）を設定すると、読み込んだページを保持し、同じ条件を
+    再表示した場合はデータベースを読まない。
+    """
+
+    # 1回の fetchMore で読み込む行数
+    PAGE_SIZE = 500
+
+    def __init__(self, db_manager, parent=None, page_cache=None):
+        super().__init__(parent)
+        self.db = db_manager
+        self.page_cache = page_cache
+        self.table_name = None
+        self.where_str = ""
+        self.params = ()
+        self.columns = []
+        self.rows = []
+        self.total_count = 0
+        # 短いページが返ったら末尾まで読み込み済み
+        self.exhausted = True
+        self.last_id = None
+        self.id_column = None
+
+    def set_query(self, table_name, where_str="", params=(), total_count=None):
+        """表示対象テーブルと絞り込み条件を設定して先頭ページを読み込む
+
+        total_count を渡した場合（集計テーブルの件数など）は COUNT(*) を実行しない。
+        件数は表示用で、続きを読み込むかどうかはページの行数で判断する。
+        """
+        page = self.fetch_first_page(
+            self.db.get_read_connection(), table_name, where_str, params, total_count
+        )
+        self.apply_first_page(page)
+
+    def fetch_first_page(self, connection, table_name, where_str="", params=(), total_count=None):
+        """カラム・件数（表示用）・先頭ページを取得
+
+        モデルの状態は変更しないため、ワーカースレッドの接続で実行できる。
+        結果は apply_first_page に渡してUIスレッドで表示する。
+        """
+        params = tuple(params)
+        columns = [info[1] for info in connection.execute(f"PRAGMA table_info({table_name})").fetchall()]
+        id_column = columns.index('id') if 'id' in columns else None
+
+        if total_count is None:
+            where_sql = f" WHERE {where_str}" if where_str else ""
+            count_result = connection.execute(
+                f"SELECT COUNT(*) as count FROM {table_name}{where_sql}",
+                params
+            ).fetchone()
+            total_count = count_result[0] if count_result else 0
+
+        # 件数が古い場合（他のツールで書き込まれた場合など）もあるため、先頭ページは常に取得する
+        query, query_params = self.build_page_query(table_name, where_str, params, id_column)
+        rows = [tuple(row) for row in connection.execute(query, query_params).fetchall()]
+
+        return {
+            'table_name': table_name,
+            'where_str': where_str,
+            'params': params,
+            'columns': columns,
+            'id_column': id_column,
+            'total_count': total_count,
+            'rows': rows
+        }
+
+    def apply_first_page(self, page):
+        """fetch_first_page の結果を表示"""
+        self.beginResetModel()
+
+        self.table_name = page['table_name']
+        self.where_str = page['where_str']
+        self.params = page['params']
+        self.columns = page['columns']
+        self.id_column = page['id_column']
+        self.rows = list(page['rows'])
+        self.total_count = page['total_count']
+        self.exhausted = len(self.rows) < self.PAGE_SIZE
+        self.last_id = None
+        if self.rows and self.id_column is not None:
+            self.last_id = self.rows[-1][self.id_column]
+
+        self.endResetModel()
+
+    def clear(self):
+        """表示内容をクリア"""
+        self.beginResetModel()
+        self.table_name = None
+        self.columns = []
+        self.rows = []
+        self.total_count = 0
+        self.exhausted = True
+        self.last_id = None
+        self.endResetModel()
+
+    def build_page_query(self, table_name, where_str, params, id_column, last_id=None, offset=0):
+        """ページ取得のSQLとパラメータを作成（id 順のキーセットページング）"""
+        conditions = [where_str] if where_str else []
+        params = list(params)
+
+        if last_id is not None:
+            conditions.append("id > ?")
+            params.append(last_id)
+
+        where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if id_column is not None:
+            query = f"SELECT * FROM {table_name}{where_sql} ORDER BY id LIMIT ?"
+            params.append(self.PAGE_SIZE)
+        else:
+            # id 列がないテーブルは OFFSET でページング
+            query = f"SELECT * FROM {table_name}{where_sql} LIMIT ? OFFSET ?"
+            params.extend([self.PAGE_SIZE, offset])
+
+        return query, tuple(params)
+
+    def fetch_page(self):
+        """次のページを取得（page_cache があれば保持しているページを使う）"""
+        cache_key = ('page', self.where_str, self.params, self.PAGE_SIZE, len(self.rows) // self.PAGE_SIZE)
+
+        if self.page_cache is not None:
+            rows = self.page_cache.get(self.table_name, cache_key)
+            if rows is not None:
+                return rows
+            version = self.page_cache.get_version(self.table_name)
+
+        query, params = self.build_page_query(
+            self.table_name, self.where_str, self.params, self.id_column,
+            self.last_id, len(self.rows)
+        )
+        rows = [tuple(row) for row in self.db.fetch_all(query, params)]
+
+        if self.page_cache is not None and rows:
+            self.page_cache.put(self.table_name, cache_key, rows, version)
+
+        return rows
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        value = self.rows[index.row()][index.column()]
+        return str(value) if value is not None else ''
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+
+        if orientation == Qt.Horizontal:
+            if 0 <= section < len(self.columns):
+                return self.columns[section]
+            return None
+
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.table_name is None:
+            return False
+        return not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.table_name is None:
+            return
+
+        try:
+            page = self.fetch_page()
+        except Exception as e:
+            print(f"ページ読み込みエラー: {e}")
+            raise
+
+        # ページ行数に満たなければ末尾まで読み込み済み（total_count は表示用で使わない）
+        self.exhausted = len(page) < self.PAGE_SIZE
+        if not page:
+            return
+
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+
+        if self.id_column is not None:
+            self.last_id = page[-1][self.id_column]
+
+    def get_loaded_count(self):
+        """読み込み済み行数を取得"""
+        return len(self.rows)
+
+    def get_display_count(self):
+        """表示用の件数（末尾まで読み込み済みなら実際の行数、そうでなければ件数と読み込み済み行数の大きい方）"""
+        if self.exhausted:
+            return len(self.rows)
+        return max(self.total_count, len(self.rows))
+
+
+def fit_columns_to_sample(view, sample_size=200, max_width=300):
+    """読み込み済みの先頭行だけを見て列幅を設定
+
+    resizeColumnsToContents は全行を走査するため、サンプル行とヘッダーの
+    文字幅から列幅を決める。
+    """
+    model = view.model()
+    if model is None:
+        return
+
+    metrics = view.fontMetrics()
+    header_metrics = view.horizontalHeader().fontMetrics()
+    sample_rows = min(model.rowCount(), sample_size)
+    padding = 16
+
+    for col in range(model.columnCount()):
+        header_text = str(model.headerData(col, Qt.Horizontal) or '')
+        width = header_metrics.horizontalAdvance(header_text)
+
+        for row in range(sample_rows):
+            text = model.data(model.index(row, col)) or ''
+            width = max(width, metrics.horizontalAdvance(text))
+
+        view.setColumnWidth(col, min(width + padding, max_width))
@@ -1,17 +1,261 @@
+import os
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
+from utils.workbook_reader import WorkbookReader
+from utils.job_control import OperationCancelled, check_cancelled
+from utils.absence_rules import AbsenceRuleSet, load_absence_rules, merge_hit_counts
+from utils.read_plan import ReadPlan
+
+
+# 集計キー・必須カラム
+REQUIRED_COLUMNS = ['student_number', 'course_number']
+
+# 生徒×講座ごとに最初の値を採用する属性カラム
+ATTRIBUTE_COLUMNS = [
+    'class_name', 'attendance_number', 'student_name',
+    'course_name', 'subject_category_number', 'subject_number'
+]
+
+
+def check_absence(df, rule_set=None):
+    """欠課判定（df と同じインデックスの bool の Series を返す）"""
+    if rule_set is None:
+        rule_set = AbsenceRuleSet()
+    
+    weights, _ = rule_set.evaluate(df)
+    return weights > 0
+
+
+def to_count(value):
+    """欠課数を表示・出力用に変換（整数なら int、重み付きなら小数2桁）"""
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def iter_absence_sheets(file_path, header_row=0, column_mapping=None, log=print, cancel_token=None, rule_set=None, hit_counts=None):
+    """1ファイルの全シートを順に読み込み、欠課フラグ付きのシートデータを返すジェネレータ
+    
+    各シートに is_absence（いずれかのルールに該当）と absence_weight（欠課数の重み）
+    を付ける。hit_counts を渡すと、ルールごとの該当件数を累積する。
+    """
+    file_name = Path(file_path).name
+    
+    if rule_set is None:
+        rule_set = AbsenceRuleSet()
+    
+    # 集計に使う列（必須・属性・判定ルールの列）だけを型を指定して読み込む
+    # （日付ごとの出欠列などは読み込まない）
+    read_plan = ReadPlan.for_table(
+        column_mapping,
+        REQUIRED_COLUMNS + ATTRIBUTE_COLUMNS + rule_set.get_columns(),
+        'absences'
+    )
+    
+    # Excelファイル読み込み（全シート、ブックは1回だけ開く）
+    with WorkbookReader(file_path) as reader:
+        sheet_names = reader.sheet_names
+        total_sheets = len(sheet_names)
+        
+        log(f"シート数: {total_sheets}枚")
+        
+        for sheet_idx, sheet_name in enumerate(sheet_names):
+            check_cancelled(cancel_token)
+            
+            # シート処理の進捗表示
+            prefix = f" [{sheet_idx+1:2d}/{total_sheets:2d}] {sheet_name:<30s} ... "
+            
+            try:
+                # シート読み込み
+                df = reader.read_sheet(sheet_name, header=header_row, **read_plan.read_kwargs())
+                
+                # 空のシートはスキップ
+                if len(df) == 0:
+                    log(prefix + "スキップ (空シート)")
+                    continue
+                
+                # カラムマッピング適用
+                if column_mapping:
+                    df = df.rename(columns=column_mapping)
+                
+                # 必須カラムチェック
+                missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+                
+                if missing_cols:
+                    log(prefix + f"スキップ (カラム不足: {missing_cols})")
+                    continue
+                
+                # NaNの行を除外
+                original_len = len(df)
+                df = df.dropna(subset=REQUIRED_COLUMNS)
+                
+                if len(df) == 0:
+                    log(prefix + f"スキップ (有効データなし, 元{original_len}行)")
+                    continue
+                
+                # ファイル名とシート名を追加
+                df['source_file'] = file_name
+                df['sheet_name'] = sheet_name
+                
+                # 欠課フラグを追加（ルールはシート単位でまとめて評価）
+                weights, sheet_hits = rule_set.evaluate(df)
+                df['absence_weight'] = weights
+                df['is_absence'] = weights > 0
+                
+                if hit_counts is not None:
+                    merge_hit_counts(hit_counts, sheet_hits)
+                
+                absence_count = int(df['is_absence'].sum())
+                log(prefix + f"OK ({len(df):5d}行, 欠課{absence_count:4d}件)")
+            
+            except Exception as e:
+                log(prefix + f"エラー: {str(e)[:50]}")
+                continue
+            
+            yield df
+
+
+def read_absence_file(file_path, header_row=0, column_mapping=None, log=print, cancel_token=None, rule_set=None, hit_counts=None):
+    """1ファイルの全シートを読み込み、欠課フラグ付きのデータを返す
+
+    Returns:
+        tuple: (DataFrame または None, 読み込み行数, 欠課件数)
+    """
+    file_data = list(iter_absence_sheets(
+        file_path, header_row, column_mapping, log, cancel_token, rule_set, hit_counts
+    ))
+    
+    if not file_data:
+        return None, 0, 0
+    
+    file_df = pd.concat(file_data, ignore_index=True)
+    return file_df, len(file_df), int(file_df['is_absence'].sum())
+
+
+def reduce_to_partial(df):
+    """欠課フラグ付きデータを生徒×講座の部分集計に縮約"""
+    agg_spec = {'absence_weight': 'sum'}  # 欠課数（重み付き）
+    for col in ATTRIBUTE_COLUMNS:
+        if col in df.columns:
+            agg_spec[col] = 'first'
+    
+    partial = df.groupby(REQUIRED_COLUMNS).agg(agg_spec).reset_index()
+    return partial.rename(columns={'absence_weight': 'absent_count'})
+
+
+def merge_partials(partials):
+    """部分集計を結合（欠課数は合計、属性は最初に現れた値）"""
+    combined = pd.concat(partials, ignore_index=True)
+    
+    agg_spec = {'absent_count': 'sum'}
+    for col in ATTRIBUTE_COLUMNS:
+        if col in combined.columns:
+            agg_spec[col] = 'first'
+    
+    return combined.groupby(REQUIRED_COLUMNS).agg(agg_spec).reset_index()
+
+
+class AbsenceAccumulator:
+    """生徒×講座の欠課数を逐次集計するアキュムレータ
+
+    シートごとのデータを部分集計に縮約してから累積するため、
+    保持するのは生徒×講座の組み合わせ数に比例したデータのみ。
+    """
+    
+    def __init__(self):
+        self.aggregate = None
+        self.total_rows = 0
+        self.total_absences = 0
+    
+    def add_sheet(self, df):
+        """欠課フラグ付きのシートデータを累積（生データは保持しない）"""
+        self.total_rows += len(df)
+        self.total_absences += int(df['is_absence'].sum())
+        self.merge(reduce_to_partial(df))
+    
+    def merge(self, partial, rows=0, absences=0):
+        """部分集計を累積"""
+        self.total_rows += rows
+        self.total_absences += absences
+        
+        if self.aggregate is None:
+            self.aggregate = partial
+        else:
+            self.aggregate = merge_partials([self.aggregate, partial])
+    
+    def is_empty(self):
+        """累積データが無いか"""
+        return self.aggregate is None
+    
+    def get_result(self):
+        """累積した集計結果を取得"""
+        return self.aggregate
+
+
+def process_file_partial(file_path, header_row=0, column_mapping=None, rules=None):
+    """ワーカープロセス用: 1ファイルをシート単位で逐次集計し、部分集計を返す
+    
+    rules は判定ルールの定義（辞書のリスト）。ワーカー内でルールを組み立てるため、
+    親プロセスと同じ設定で判定される。
+    """
+    log_lines = []
+    result = {
+        'file_name': Path(file_path).name,
+        'partial': None,
+        'rows': 0,
+        'absences': 0,
+        'rule_hits': {},
+        'log_lines': log_lines,
+        'error': None
+    }
+    
+    try:
+        accumulator = AbsenceAccumulator()
+        rule_set = AbsenceRuleSet(rules)
+        
+        for df in iter_absence_sheets(
+            file_path, header_row, column_mapping, log=log_lines.append,
+            rule_set=rule_set, hit_counts=result['rule_hits']
+        ):
+            accumulator.add_sheet(df)
+        
+        if not accumulator.is_empty():
+            result['partial'] = accumulator.get_result()
+            result['rows'] = accumulator.total_rows
+            result['absences'] = accumulator.total_absences
+    
+    except Exception as e:
+        result['error'] = str(e)
+    
+    return result
 
 
 class AbsenceProcessor:
     """欠課データ前処理クラス"""
     
-    def __init__(self):
+    def __init__(self, rules=None):
+        """初期化（rules 省略時は config/absence_rules.json の判定ルールを使用）"""
         self.result_df = None
         self.debug_info = []
+        self.rules = rules if rules is not None else load_absence_rules()
+        self.rule_set = AbsenceRuleSet(self.rules)
+        self.rule_hits = {}
     
-    def process_multiple_files(self, file_paths, header_row=0, column_mapping=None, progress_callback=None):
+    def process_multiple_files(self, file_paths, header_row=0, column_mapping=None, progress_callback=None, parallel=False, max_workers=None, streaming=False, cancel_token=None):
         """複数ファイルを処理して欠課データを集計"""
+        self.rule_hits = {}
+        
+        if parallel and len(file_paths) > 1:
+            return self.process_multiple_files_parallel(
+                file_paths, header_row, column_mapping, progress_callback, max_workers,
+                cancel_token
+            )
+        
+        if streaming:
+            return self.process_multiple_files_streaming(
+                file_paths, header_row, column_mapping, progress_callback, cancel_token
+            )
+        
         all_data = []  # 全データ（欠課あり・なし含む）
         
         total_files = len(file_paths)
@@ -20,6 +264,8 @@ class AbsenceProcessor:
         print(f"{'='*70}")
         
         for idx, file_path in enumerate(file_paths):
+            check_cancelled(cancel_token)
+            
             file_name = Path(file_path).name
             
             # 進捗コールバック
@@ -30,74 +276,13 @@ class AbsenceProcessor:
             print(f"{'-'*70}")
             
             try:
-                # Excelファイル読み込み（全シート）
-                excel_file = pd.ExcelFile(file_path)
-                total_sheets = len(excel_file.sheet_names)
-                
-                print(f"シート数: {total_sheets}枚")
-                
-                file_data = []
-                file_total_rows = 0
-                file_absence_count = 0
-                
-                for sheet_idx, sheet_name in enumerate(excel_file.sheet_names):
-                    # シート処理の進捗表示
-                    print(f" [{sheet_idx+1:2d}/{total_sheets:2d}] {sheet_name:<30s} ... ", end='', flush=True)
-                    
-                    try:
-                        # シート読み込み
-                        df = pd.read_excel(
-                            file_path,
-                            sheet_name=sheet_name,
-                            header=header_row
-                        )
-                        
-                        # 空のシートはスキップ
-                        if len(df) == 0:
-                            print("スキップ (空シート)")
-                            continue
-                        
-                        # カラムマッピング適用
-                        if column_mapping:
-                            df = df.rename(columns=column_mapping)
-                        
-                        # 必須カラムチェック
-                        required_cols = ['student_number', 'course_number']
-                        missing_cols = [col for col in required_cols if col not in df.columns]
-                        
-                        if missing_cols:
-                            print(f"スキップ (カラム不足: {missing_cols})")
-                            continue
-                        
-                        # NaNの行を除外
-                        original_len = len(df)
-                        df = df.dropna(subset=['student_number', 'course_number'])
-                        
-                        if len(df) == 0:
-                            print(f"スキップ (有効データなし, 元{original_len}行)")
-                            continue
-                        
-                        # ファイル名とシート名を追加
-                        df['source_file'] = file_name
-                        df['sheet_name'] = sheet_name
-                        
-                        # 欠課フラグを追加
-                        df['is_absence'] = self.check_absence(df)
-                        
-                        absence_count = df['is_absence'].sum()
-                        print(f"OK ({len(df):5d}行, 欠課{absence_count:4d}件)")
-                        
-                        file_data.append(df)
-                        file_total_rows += len(df)
-                        file_absence_count += absence_count
-                    
-                    except Exception as e:
-                        print(f"エラー: {str(e)[:50]}")
-                        continue
+                file_df, file_total_rows, file_absence_count = read_absence_file(
+                    file_path, header_row, column_mapping, cancel_token=cancel_token,
+                    rule_set=self.rule_set, hit_counts=self.rule_hits
+                )
                 
                 # ファイル単位での結合
-                if file_data:
-                    file_df = pd.concat(file_data, ignore_index=True)
+                if file_df is not None:
                     all_data.append(file_df)
                     print(f"\n ファイル合計: {file_total_rows:,}行, 欠課{file_absence_count:,}件")
                     self.debug_info.append(f"{file_name}: {file_total_rows:,}件読み込み (欠課{file_absence_count:,}件)")
@@ -105,6 +290,9 @@ class AbsenceProcessor:
                     print(f"\n ファイル合計: データなし")
                     self.debug_info.append(f"{file_name}: データなし")
             
+            except OperationCancelled:
+                raise
+            
             except Exception as e:
                 print(f"\nファイル処理エラー: {e}")
                 import traceback
@@ -127,11 +315,8 @@ class AbsenceProcessor:
         combined_df = pd.concat(all_data, ignore_index=True)
         total_records = len(combined_df)
         total_absences = combined_df['is_absence'].sum()
-        total_attendances = (~combined_df['is_absence']).sum()
         
-        print(f"総データ件数: {total_records:,}件")
-        print(f" 欠課データ: {total_absences:,}件 ({total_absences/total_records*100:.1f}%)")
-        print(f" 出席データ: {total_attendances:,}件 ({total_attendances/total_records*100:.1f}%)")
+        self.print_record_summary(total_records, total_absences)
         
         # 生徒×講座で集計
         print(f"\n集計処理中...")
@@ -145,45 +330,239 @@ class AbsenceProcessor:
         
         return self.result_df
     
-    def check_absence(self, df):
-        """欠課判定"""
-        absence_condition = pd.Series([False] * len(df))
+    def process_multiple_files_streaming(self, file_paths, header_row=0, column_mapping=None, progress_callback=None, cancel_token=None):
+        """複数ファイルをシート単位で逐次集計（メモリは集計結果のサイズに比例）"""
+        accumulator = AbsenceAccumulator()
         
-        # absence_markで判定
-        if 'absence_mark' in df.columns:
-            mark_condition = df['absence_mark'].astype(str).str.contains('/', na=False)
-            absence_condition |= mark_condition
+        total_files = len(file_paths)
+        print(f"\n{'='*70}")
+        print(f"処理開始: {total_files}ファイル (逐次集計)")
+        print(f"{'='*70}")
         
-        # absence_typeで判定
-        if 'absence_type' in df.columns:
-            type_condition = df['absence_type'] == 1
-            absence_condition |= type_condition
+        for idx, file_path in enumerate(file_paths):
+            check_cancelled(cancel_token)
+            
+            file_name = Path(file_path).name
+            
+            # 進捗コールバック
+            if progress_callback:
+                progress_callback(idx, total_files, f"処理中 ({idx+1}/{total_files}): {file_name}")
+            
+            print(f"\n[{idx+1}/{total_files}] {file_name}")
+            print(f"{'-'*70}")
+            
+            rows_before = accumulator.total_rows
+            absences_before = accumulator.total_absences
+            
+            try:
+                # シートごとに集計へ畳み込み、生データはすぐに破棄
+                for df in iter_absence_sheets(
+                    file_path, header_row, column_mapping, cancel_token=cancel_token,
+                    rule_set=self.rule_set, hit_counts=self.rule_hits
+                ):
+                    accumulator.add_sheet(df)
+                    del df
+                
+                file_total_rows = accumulator.total_rows - rows_before
+                file_absence_count = accumulator.total_absences - absences_before
+                
+                if file_total_rows > 0:
+                    print(f"\n ファイル合計: {file_total_rows:,}行, 欠課{file_absence_count:,}件")
+                    self.debug_info.append(f"{file_name}: {file_total_rows:,}件読み込み (欠課{file_absence_count:,}件)")
+                else:
+                    print(f"\n ファイル合計: データなし")
+                    self.debug_info.append(f"{file_name}: データなし")
+            
+            except OperationCancelled:
+                raise
+            
+            except Exception as e:
+                print(f"\nファイル処理エラー: {e}")
+                import traceback
+                traceback.print_exc()
+                self.debug_info.append(f"{file_name}: エラー - {str(e)}")
+                continue
+        
+        # データが見つからない場合
+        if accumulator.is_empty():
+            print(f"\n{'='*70}")
+            print("エラー: 有効なデータが見つかりませんでした")
+            print(f"{'='*70}")
+            return None
         
-        return absence_condition
+        print(f"\n{'='*70}")
+        print("逐次集計完了")
+        print(f"{'='*70}")
+        
+        self.print_record_summary(accumulator.total_rows, accumulator.total_absences)
+        
+        print(f"\n集計処理中...")
+        self.result_df = self.finalize_aggregate(accumulator.get_result(), accumulator.total_rows)
+        
+        print(f"\n{'='*70}")
+        print("処理完了")
+        print(f"{'='*70}")
+        
+        return self.result_df
+    
+    def process_multiple_files_parallel(self, file_paths, header_row=0, column_mapping=None, progress_callback=None, max_workers=None, cancel_token=None):
+        """複数ファイルをワーカープロセスで並列処理し、部分集計を結合"""
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        
+        total_files = len(file_paths)
+        if not max_workers:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers, total_files))
+        
+        print(f"\n{'='*70}")
+        print(f"処理開始: {total_files}ファイル (並列処理: {max_workers}プロセス)")
+        print(f"{'='*70}")
+        
+        if progress_callback:
+            progress_callback(0, total_files, f"処理中 (0/{total_files})")
+        
+        results = [None] * total_files
+        
+        # 部分集計はファイル順に累積する（属性は最初に現れた値を採用するため）
+        accumulator = AbsenceAccumulator()
+        pending = {}
+        next_idx = 0
+        
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        cancelled = False
+        
+        try:
+            futures = {
+                executor.submit(process_file_partial, file_path, header_row, column_mapping, self.rules): idx
+                for idx, file_path in enumerate(file_paths)
+            }
+            
+            remaining = set(futures)
+            done_count = 0
+            
+            while remaining:
+                # 完了待ちの間も定期的にキャンセルを確認
+                done, remaining = wait(remaining, timeout=0.5, return_when=FIRST_COMPLETED)
+                
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    cancelled = True
+                    break
+                
+                for future in done:
+                    done_count += 1
+                    idx = futures[future]
+                    file_name = Path(file_paths[idx]).name
+                
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {
+                            'file_name': file_name, 'partial': None, 'rows': 0,
+                            'absences': 0, 'rule_hits': {}, 'log_lines': [], 'error': str(e)
+                        }
+                
+                    results[idx] = result
+                    merge_hit_counts(self.rule_hits, result['rule_hits'])
+                    pending[idx] = result
+                
+                    while next_idx in pending:
+                        ready = pending.pop(next_idx)
+                        if ready['partial'] is not None:
+                            accumulator.merge(ready['partial'], ready['rows'], ready['absences'])
+                            ready['partial'] = None
+                        next_idx += 1
+                
+                    # ワーカーのログは完了したファイル単位でまとめて表示
+                    print(f"\n[{idx+1}/{total_files}] {file_name}")
+                    print(f"{'-'*70}")
+                    for line in result['log_lines']:
+                        print(line)
+                
+                    if result['error']:
+                        print(f"\nファイル処理エラー: {result['error']}")
+                    elif result['rows'] > 0:
+                        print(f"\n ファイル合計: {result['rows']:,}行, 欠課{result['absences']:,}件")
+                    else:
+                        print(f"\n ファイル合計: データなし")
+                
+                    if progress_callback:
+                        progress_callback(done_count, total_files, f"処理完了 ({done_count}/{total_files}): {file_name}")
+        
+        finally:
+            # キャンセル時は未着手のファイルを取り消し、実行中のワーカーを待たない
+            executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+        
+        check_cancelled(cancel_token)
+        
+        # デバッグ情報はファイル順に記録
+        for result in results:
+            file_name = result['file_name']
+            
+            if result['error']:
+                self.debug_info.append(f"{file_name}: エラー - {result['error']}")
+            elif result['rows'] > 0:
+                self.debug_info.append(f"{file_name}: {result['rows']:,}件読み込み (欠課{result['absences']:,}件)")
+            else:
+                self.debug_info.append(f"{file_name}: データなし")
+        
+        # データが見つからない場合
+        if accumulator.is_empty():
+            print(f"\n{'='*70}")
+            print("エラー: 有効なデータが見つかりませんでした")
+            print(f"{'='*70}")
+            return None
+        
+        print(f"\n{'='*70}")
+        print("部分集計結合中...")
+        print(f"{'='*70}")
+        
+        self.print_record_summary(accumulator.total_rows, accumulator.total_absences)
+        
+        # 生徒×講座で集計（部分集計を結合済み）
+        print(f"\n集計処理中...")
+        self.result_df = self.finalize_aggregate(accumulator.get_result(), accumulator.total_rows)
+        
+        print(f"\n{'='*70}")
+        print("処理完了")
+        print(f"{'='*70}")
+        
+        return self.result_df
+    
+    def print_record_summary(self, total_records, total_absences):
+        """読み込み件数のサマリーを表示"""
+        total_attendances = total_records - total_absences
+        
+        print(f"総データ件数: {total_records:,}件")
+        print(f" 欠課データ: {total_absences:,}件 ({total_absences/total_records*100:.1f}%)")
+        print(f" 出席データ: {total_attendances:,}件 ({total_attendances/total_records*100:.1f}%)")
+        
+        # 判定ルールごとの該当件数（1行が複数のルールに該当する場合はそれぞれ数える）
+        print(f"\n【判定ルール別の該当件数】")
+        for name, count in self.rule_hits.items():
+            print(f" {name}: {count:,}件")
+            self.debug_info.append(f"判定ルール {name}: {count:,}件")
+    
+    def check_absence(self, df):
+        """欠課判定"""
+        return check_absence(df, self.rule_set)
     
     def aggregate_by_student_course(self, df):
         """生徒×講座で集計（実際の履修組み合わせのみ）"""
+        grouped = reduce_to_partial(df)
+        return self.finalize_aggregate(grouped, len(df))
+    
+    def finalize_aggregate(self, grouped, source_rows):
+        """集計結果を整形し、集計内容を表示"""
         print(f"\n{'='*70}")
         print("集計処理詳細")
         print(f"{'='*70}")
-        print(f"集計前の行数: {len(df):,}件")
-        
-        # 生徒×講座の組み合わせごとに集計
-        grouped = df.groupby(['student_number', 'course_number']).agg({
-            'is_absence': 'sum',  # 欠課数
-            'class_name': 'first',
-            'attendance_number': 'first',
-            'student_name': 'first',
-            'course_name': 'first',
-            'subject_category_number': 'first',
-            'subject_number': 'first'
-        }).reset_index()
+        print(f"集計前の行数: {source_rows:,}件")
         
-        # カラム名を変更
-        grouped = grouped.rename(columns={'is_absence': 'absent_count'})
-        
-        # absent_countを整数型に変換
-        grouped['absent_count'] = grouped['absent_count'].astype(int)
+        # absent_countを整数型に変換（重み付きのルールで端数がある場合は小数2桁）
+        if (grouped['absent_count'] % 1 == 0).all():
+            grouped['absent_count'] = grouped['absent_count'].astype(int)
+        else:
+            grouped['absent_count'] = grouped['absent_count'].round(2)
         
         print(f"集計後の行数: {len(grouped):,}件")
         print(f" ユニーク生徒数: {grouped['student_number'].nunique():,}人")
@@ -195,7 +574,7 @@ class AbsenceProcessor:
         print(f"\n【欠課数の分布】")
         absence_dist = grouped['absent_count'].value_counts().sort_index()
         for count, freq in absence_dist.head(10).items():
-            print(f" 欠課{count:2d}回: {freq:5,}件")
+            print(f" 欠課{count:2g}回: {freq:5,}件")
         
         if len(absence_dist) > 10:
             print(f" ... (他 {len(absence_dist)-10} パターン)")
@@ -229,10 +608,10 @@ class AbsenceProcessor:
             'total_records': len(self.result_df),
             'unique_students': self.result_df['student_number'].nunique(),
             'unique_courses': self.result_df['course_number'].nunique(),
-            'total_absences': int(self.result_df['absent_count'].sum()),
+            'total_absences': to_count(self.result_df['absent_count'].sum()),
             'average_absences': round(self.result_df['absent_count'].mean(), 2),
             'zero_absence_count': len(self.result_df[self.result_df['absent_count'] == 0]),
-            'max_absences': int(self.result_df['absent_count'].max()),
+            'max_absences': to_count(self.result_df['absent_count'].max()),
             'courses_per_student': round(courses_per_student, 1)
         }
     
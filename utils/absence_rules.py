@@ -0,0 +1,172 @@
+import json
+import operator
+import re
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+# 設定ファイルが無い場合の判定ルール（従来の判定と同じ）
+DEFAULT_RULES = [
+    {'name': '欠課略号「/」', 'column': 'absence_mark', 'type': 'contains', 'value': '/', 'weight': 1},
+    {'name': '欠課区分「1」', 'column': 'absence_type', 'type': 'compare', 'op': '==', 'value': 1, 'weight': 1}
+]
+
+RULE_TYPES = {'contains', 'regex', 'in', 'compare'}
+
+COMPARE_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le
+}
+
+
+def get_default_rules_path():
+    """判定ルール設定ファイルのパス"""
+    return Path(__file__).parent.parent / 'config' / 'absence_rules.json'
+
+
+def load_absence_rules(config_path=None):
+    """absence_rules.json から判定ルールを読み込む（無ければ既定のルール）"""
+    config_path = Path(config_path) if config_path else get_default_rules_path()
+
+    if not config_path.exists():
+        return [dict(rule) for rule in DEFAULT_RULES]
+
+    try:
+        with open(config_path, 'r', encoding='utf-8-sig') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"欠課判定ルール読み込みエラー: {e}")
+        raise
+
+    return config.get('rules', [])
+
+
+def to_text(value):
+    """セルの値を比較用の文字列に変換（1.0 は "1" として扱う）"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class AbsenceRuleSet:
+    """欠課判定ルールをまとめて評価するクラス
+
+    各ルールは対象カラムのカテゴリ（異なる値）ごとに1回だけ判定し、
+    カテゴリコードで行全体のマスクに展開する。欠課略号のように値の種類が
+    少ないカラムでは、行数に関係なく判定回数は値の種類数で済む。
+
+    行の欠課数は、該当したルールの重みのうち最大のもの（該当なしは0）。
+    重み1のルールだけなら従来どおり「いずれかに該当すれば欠課1」となり、
+    遅刻・早退を重み 1/3 などで数えるルールも同じ仕組みで追加できる。
+    """
+
+    def __init__(self, rules=None):
+        """初期化（rules は設定ファイルと同じ形式の辞書のリスト）"""
+        if rules is None:
+            rules = load_absence_rules()
+
+        self.rules = [self.compile_rule(rule) for rule in rules if rule.get('enabled', True)]
+
+    def compile_rule(self, rule):
+        """ルール定義を検証し、カテゴリに対する判定関数を作成"""
+        name = rule.get('name') or f"{rule.get('column')} {rule.get('type')}"
+        rule_type = rule.get('type')
+        column = rule.get('column')
+
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"未対応の欠課判定ルールです: {name} ({rule_type})")
+        if not column:
+            raise ValueError(f"欠課判定ルールにカラムが指定されていません: {name}")
+
+        if rule_type == 'contains':
+            value = str(rule['value'])
+
+            def predicate(categories):
+                return np.asarray(categories.map(to_text).str.contains(value, regex=False), dtype=bool)
+
+        elif rule_type == 'regex':
+            pattern = re.compile(rule['value'])
+
+            def predicate(categories):
+                return np.array([pattern.search(to_text(v)) is not None for v in categories], dtype=bool)
+
+        elif rule_type == 'in':
+            values = {to_text(v) for v in rule['values']}
+
+            def predicate(categories):
+                return np.asarray(categories.map(to_text).isin(values), dtype=bool)
+
+        else:
+            compare = COMPARE_OPERATORS.get(rule.get('op', '=='))
+            if compare is None:
+                raise ValueError(f"未対応の比較演算子です: {name} ({rule.get('op')})")
+            value = float(rule['value'])
+
+            def predicate(categories):
+                numbers = pd.to_numeric(categories.to_series(), errors='coerce')
+                return compare(numbers, value).fillna(False).to_numpy(dtype=bool)
+
+        return {
+            'name': name,
+            'column': column,
+            'weight': float(rule.get('weight', 1)),
+            'predicate': predicate
+        }
+
+    def get_columns(self):
+        """ルールが参照するカラム"""
+        return sorted({rule['column'] for rule in self.rules})
+
+    def evaluate(self, df):
+        """各行の欠課数（重み）とルールごとの該当件数を返す
+
+        Returns:
+            tuple: (df と同じインデックスの Series, {ルール名: 該当行数})
+        """
+        weights = np.zeros(len(df), dtype=float)
+        hit_counts = {}
+        categorical = {}
+
+        for rule in self.rules:
+            column = rule['column']
+
+            if column not in df.columns:
+                hit_counts[rule['name']] = 0
+                continue
+
+            # 同じカラムを参照するルールではカテゴリ化を1回だけ行う
+            if column not in categorical:
+                values = df[column]
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype('category')
+                categorical[column] = values
+
+            mask = self.category_mask(categorical[column], rule['predicate'])
+            hit_counts[rule['name']] = int(mask.sum())
+            np.maximum(weights, np.where(mask, rule['weight'], 0.0), out=weights)
+
+        return pd.Series(weights, index=df.index), hit_counts
+
+    def category_mask(self, values, predicate):
+        """カテゴリごとの判定結果を行のマスクに展開（欠損値は該当なし）"""
+        categories = values.cat.categories
+        codes = values.cat.codes.to_numpy()
+
+        if len(categories) == 0:
+            return np.zeros(len(codes), dtype=bool)
+
+        # 末尾に欠損値（コード -1）用の False を置き、コードでそのまま引けるようにする
+        lookup = np.append(predicate(categories), False)
+        return lookup[codes]
+
+
+def merge_hit_counts(total, hit_counts):
+    """ルールごとの該当件数を累積"""
+    for name, count in hit_counts.items():
+        total[name] = total.get(name, 0) + count
+    return total
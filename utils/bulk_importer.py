@@ -0,0 +1,335 @@
+import time
+from collections import Counter
+import pandas as pd
+from database.slice_statistics import refresh_slice_statistics
+from utils.job_control import OperationCancelled, check_cancelled
+
+
+# 差分取り込みで行を照合するキー（テーブルの UNIQUE 制約と同じ）
+KEY_COLUMNS = ['student_number', 'course_number', 'period', 'year']
+
+
+def to_db_value(value):
+    """sqlite3 にバインドできる値へ変換"""
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return value
+    if pd.isna(value):
+        return None
+    if isinstance(value, (bool, int, float)):
+        return value
+    # Timestamp・time などは文字列として保存（to_sql と同じ表現）
+    return str(value)
+
+
+def frame_to_rows(df):
+    """DataFrame を executemany 用のタプル列に変換"""
+    columns = [
+        [to_db_value(value) for value in df[col].tolist()]
+        for col in df.columns
+    ]
+    return list(zip(*columns))
+
+
+def column_affinity(declared_type):
+    """宣言型から SQLite の型アフィニティを判定"""
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return 'INTEGER'
+    if any(t in declared_type for t in ('CHAR', 'CLOB', 'TEXT')):
+        return 'TEXT'
+    if any(t in declared_type for t in ('REAL', 'FLOA', 'DOUB')):
+        return 'REAL'
+    if declared_type == '' or 'BLOB' in declared_type:
+        return 'BLOB'
+    return 'NUMERIC'
+
+
+def apply_affinity(value, affinity):
+    """保存時に SQLite が行う型変換を再現（差分比較用）"""
+    if value is None or isinstance(value, bytes):
+        return value
+
+    if affinity == 'TEXT':
+        return str(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+    if affinity == 'BLOB':
+        return value
+
+    if isinstance(value, bool):
+        value = int(value)
+
+    if isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return value
+        value = number
+
+    if isinstance(value, float):
+        if affinity == 'REAL':
+            return value
+        if value.is_integer():
+            return int(value)
+
+    if affinity == 'REAL' and isinstance(value, int):
+        return float(value)
+
+    return value
+
+
+class BulkImporter:
+    """一括取り込みエンジン（全シートをステージングして1トランザクションで書き込み）"""
+
+    # executemany 1回あたりの行数（この単位でキャンセルを確認）
+    CHUNK_SIZE = 5000
+
+    def __init__(self, db_manager, table_name, columns):
+        """初期化"""
+        self.db = db_manager
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.staged_rows = []
+        self.stats = {}
+
+    def stage(self, df):
+        """書き込み対象データをステージング（DBにはまだ書き込まない）"""
+        rows = frame_to_rows(df[self.columns])
+        self.staged_rows.extend(rows)
+        return len(rows)
+
+    def get_staged_count(self):
+        """ステージング済み行数を取得"""
+        return len(self.staged_rows)
+
+    def get_affinities(self, connection):
+        """取り込み先の各列の型アフィニティ（self.columns の順）"""
+        column_types = {
+            row[1]: row[2]
+            for row in connection.execute(f"PRAGMA table_info({self.table_name})").fetchall()
+        }
+        return [column_affinity(column_types.get(col)) for col in self.columns]
+
+    def drop_duplicate_keys(self, connection):
+        """同じキーの行は後の行（後のシート）だけを残す（差分取り込みと同じ規則）
+
+        キーは保存時の型変換後の値で比較する（UNIQUE 制約と同じ）。キーに空欄を
+        含む行は UNIQUE 制約の対象外のため全て残す。(残す行, 除いた行数) を返す。
+        """
+        key_indexes = [self.columns.index(col) for col in KEY_COLUMNS]
+        affinities = self.get_affinities(connection)
+
+        rows = []
+        positions = {}
+        for staged in self.staged_rows:
+            key = tuple(apply_affinity(staged[i], affinities[i]) for i in key_indexes)
+            if None in key:
+                rows.append(staged)
+            elif key in positions:
+                rows[positions[key]] = staged
+            else:
+                positions[key] = len(rows)
+                rows.append(staged)
+
+        return rows, len(self.staged_rows) - len(rows)
+
+    def commit(self, period, year, cancel_token=None, source_file=None):
+        """期間・年度のスコープ削除と一括INSERTを1トランザクションで実行
+
+        複数のシートに同じキーの行がある場合は後のシートの行を採用する
+        （commit_incremental と同じ）。年度・期間の集計（slice_statistics）も
+        同じトランザクションで更新する。キャンセルされた場合はロールバックされ、
+        データベースは変更されない。
+        """
+        column_list = ', '.join(self.columns)
+        placeholders = ', '.join(['?'] * len(self.columns))
+
+        delete_query = f"DELETE FROM {self.table_name} WHERE period=? AND year=?"
+        insert_query = f"INSERT INTO {self.table_name} ({column_list}) VALUES ({placeholders})"
+
+        start_time = time.perf_counter()
+
+        try:
+            # with ブロックを抜けた時点で1回だけコミット（失敗・キャンセル時はロールバック）
+            with self.db.transaction() as connection:
+                rows, duplicates = self.drop_duplicate_keys(connection)
+                connection.execute(delete_query, (period, year))
+
+                for start in range(0, len(rows), self.CHUNK_SIZE):
+                    check_cancelled(cancel_token)
+                    connection.executemany(
+                        insert_query,
+                        rows[start:start + self.CHUNK_SIZE]
+                    )
+
+                check_cancelled(cancel_token)
+                refresh_slice_statistics(connection, self.table_name, year, period, source_file)
+        except OperationCancelled:
+            print(f"一括取り込みをキャンセルしました（ロールバック済み）: {self.table_name}")
+            raise
+        except Exception as e:
+            print(f"一括取り込みエラー: {e}")
+            raise
+
+        # 一覧表示のキャッシュを無効にする
+        self.db.mark_table_changed(self.table_name)
+
+        elapsed = time.perf_counter() - start_time
+        row_count = len(rows)
+
+        self.stats = {
+            'table': self.table_name,
+            'rows': row_count,
+            'seconds': elapsed,
+            'rows_per_sec': row_count / elapsed if elapsed > 0 else 0.0,
+            'duplicates': duplicates
+        }
+        self.staged_rows = []
+
+        if duplicates:
+            print(f"同じキーの行が複数あったため後の行を採用: {self.table_name} {duplicates:,}行")
+
+        print(
+            f"一括書き込み完了: {self.table_name} {row_count:,}行 "
+            f"({elapsed:.2f}秒, {self.stats['rows_per_sec']:,.0f}行/秒)"
+        )
+
+        return self.stats
+
+    def commit_incremental(self, period, year, cancel_token=None, source_file=None):
+        """既存データとの差分だけを書き込む（差分取り込み）
+
+        (student_number, course_number, period, year) で既存行と照合し、
+        新規・変更行は INSERT ... ON CONFLICT DO UPDATE、取り込みデータに
+        無くなった行は DELETE する。値が同じ行は書き込まないため created_at は
+        変わらない。キーに空欄を含む行は UNIQUE 制約で照合できないため、
+        行全体の値で照合する。
+        """
+        key_indexes = [self.columns.index(col) for col in KEY_COLUMNS]
+        value_columns = [col for col in self.columns if col not in KEY_COLUMNS]
+
+        column_list = ', '.join(self.columns)
+        placeholders = ', '.join(['?'] * len(self.columns))
+        update_list = ', '.join([f"{col}=excluded.{col}" for col in value_columns] + ["updated_at=CURRENT_TIMESTAMP"])
+
+        upsert_query = (
+            f"INSERT INTO {self.table_name} ({column_list}) VALUES ({placeholders}) "
+            f"ON CONFLICT({', '.join(KEY_COLUMNS)}) DO UPDATE SET {update_list}"
+        )
+        delete_query = f"DELETE FROM {self.table_name} WHERE id=?"
+
+        start_time = time.perf_counter()
+
+        try:
+            with self.db.transaction() as connection:
+                affinities = self.get_affinities(connection)
+
+                def normalize(values):
+                    return tuple(apply_affinity(v, a) for v, a in zip(values, affinities))
+
+                # 既存行の読み込み（書き込みロック内で読むため、比較中に変更されない）
+                existing_by_key = {}
+                existing_null_key = {}
+                cursor = connection.execute(
+                    f"SELECT id, {column_list} FROM {self.table_name} WHERE period=? AND year=?",
+                    (period, year)
+                )
+                for row in cursor:
+                    values = normalize(tuple(row)[1:])
+                    key = tuple(values[i] for i in key_indexes)
+                    if None in key:
+                        existing_null_key.setdefault(values, []).append(row[0])
+                    else:
+                        existing_by_key[key] = (row[0], values)
+
+                check_cancelled(cancel_token)
+
+                # 取り込みデータの照合（同じキーが複数ある場合は後の行を採用）
+                staged_by_key = {}
+                staged_null_key = Counter()
+                for staged in self.staged_rows:
+                    values = normalize(staged)
+                    key = tuple(values[i] for i in key_indexes)
+                    if None in key:
+                        staged_null_key[values] += 1
+                    else:
+                        staged_by_key[key] = values
+
+                upsert_rows = []
+                delete_ids = []
+                inserted = updated = unchanged = 0
+
+                for key, values in staged_by_key.items():
+                    current = existing_by_key.pop(key, None)
+                    if current is None:
+                        inserted += 1
+                        upsert_rows.append(values)
+                    elif current[1] != values:
+                        updated += 1
+                        upsert_rows.append(values)
+                    else:
+                        unchanged += 1
+
+                # 取り込みデータに無くなった行
+                delete_ids.extend(row_id for row_id, _ in existing_by_key.values())
+                deleted = len(existing_by_key)
+
+                # キーに空欄を含む行は値の組み合わせ（件数込み）で照合
+                for values, count in staged_null_key.items():
+                    ids = existing_null_key.pop(values, [])
+                    matched = min(count, len(ids))
+                    unchanged += matched
+                    inserted += count - matched
+                    upsert_rows.extend([values] * (count - matched))
+                    delete_ids.extend(ids[matched:])
+                    deleted += len(ids) - matched
+
+                for ids in existing_null_key.values():
+                    delete_ids.extend(ids)
+                    deleted += len(ids)
+
+                for start in range(0, len(delete_ids), self.CHUNK_SIZE):
+                    check_cancelled(cancel_token)
+                    connection.executemany(
+                        delete_query,
+                        [(row_id,) for row_id in delete_ids[start:start + self.CHUNK_SIZE]]
+                    )
+
+                for start in range(0, len(upsert_rows), self.CHUNK_SIZE):
+                    check_cancelled(cancel_token)
+                    connection.executemany(upsert_query, upsert_rows[start:start + self.CHUNK_SIZE])
+
+                check_cancelled(cancel_token)
+                refresh_slice_statistics(connection, self.table_name, year, period, source_file)
+        except OperationCancelled:
+            print(f"差分取り込みをキャンセルしました（ロールバック済み）: {self.table_name}")
+            raise
+        except Exception as e:
+            print(f"差分取り込みエラー: {e}")
+            raise
+
+        # 一覧表示のキャッシュを無効にする
+        self.db.mark_table_changed(self.table_name)
+
+        elapsed = time.perf_counter() - start_time
+        row_count = len(self.staged_rows)
+
+        self.stats = {
+            'table': self.table_name,
+            'rows': row_count,
+            'seconds': elapsed,
+            'rows_per_sec': row_count / elapsed if elapsed > 0 else 0.0,
+            'inserted': inserted,
+            'updated': updated,
+            'deleted': deleted,
+            'unchanged': unchanged
+        }
+        self.staged_rows = []
+
+        print(
+            f"差分書き込み完了: {self.table_name} 追加{inserted:,}件 / 更新{updated:,}件 / "
+            f"削除{deleted:,}件 / 変更なし{unchanged:,}件 ({elapsed:.2f}秒)"
+        )
+
+        return self.stats
@@ -1,61 +1,164 @@
+import time
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
+from utils.bulk_importer import BulkImporter
+from utils.workbook_reader import WorkbookReader
+from utils.read_plan import ReadPlan
+from utils.job_control import OperationCancelled, check_cancelled
+
+
+# データ型ごとの取り込み定義（テーブル名・必須カラム・列順）
+IMPORT_TARGETS = {
+    '評定': {
+        'table': 'grades',
+        'required': ['student_number', 'course_number'],
+        'columns': [
+            'year', 'period', 'student_number', 'student_name',
+            'course_number', 'course_name', 'school_subject_name',
+            'grade_value', 'credits', 'acquisition_credits', 'remarks'
+        ]
+    },
+    '観点': {
+        'table': 'viewpoint_evaluations',
+        'required': ['student_number', 'course_number'],
+        'columns': [
+            'year', 'period', 'student_number', 'student_name',
+            'course_number', 'course_name', 'school_subject_name',
+            'viewpoint_1', 'viewpoint_2', 'viewpoint_3',
+            'viewpoint_4', 'viewpoint_5', 'remarks'
+        ]
+    },
+    '欠課情報': {
+        'table': 'absences',
+        'required': ['student_number'],
+        'columns': [
+            'student_number', 'class_name', 'attendance_number', 'student_name',
+            'absent_count', 'course_name', 'subject_category_number', 'subject_number',
+            'course_number', 'year', 'period', 'absence_mark', 'absence_type'
+        ]
+    }
+}
 
 
 class DataImporter:
     """データ取り込みクラス"""
     
-    def __init__(self, db_manager, file_manager, logger):
-        """初期化"""
+    def __init__(self, db_manager, file_manager, logger, import_cache=None):
+        """初期化（import_cache を渡すと同じ内容のブックの解析を省略する）"""
         self.db = db_manager
         self.file_manager = file_manager
         self.logger = logger
+        self.import_cache = import_cache
+        self.last_import_stats = {}
+    
+    def import_data(self, file_path, data_type, period, year, column_mapping, sheet_names=None, header_row=0, progress_callback=None, add_timestamp=True, cancel_token=None, incremental=False):
+        """データ取り込み（incremental=True の場合は既存データとの差分のみ書き込み）
+        
+        取り込みは常に import_data_bulk で行う（全シートを1トランザクションで書き込む）。
+        """
+        return self.import_data_bulk(
+            file_path, data_type, period, year, column_mapping,
+            sheet_names, header_row, progress_callback, add_timestamp,
+            cancel_token, incremental
+        )
     
-    def import_data(self, file_path, data_type, period, year, column_mapping, sheet_names=None, header_row=0, progress_callback=None, add_timestamp=True):
-        """データ取り込み"""
+    def import_data_bulk(self, file_path, data_type, period, year, column_mapping, sheet_names=None, header_row=0, progress_callback=None, add_timestamp=True, cancel_token=None, incremental=False):
+        """一括取り込み（全シートをステージングし、1回の削除と1トランザクションで書き込み）
+
+        incremental=True の場合は期間・年度の削除を行わず、既存データとの差分
+        （追加・更新・削除）だけを書き込む。
+        cancel_token でキャンセルされた場合、データベースは変更されない。
+        import_cache がある場合、整形済みのシートをファイル内容のハッシュで
+        キャッシュし、同じ内容のブックはExcelを解析せずに取り込む。
+        """
         try:
-            # ファイルコピー
-            copied_file = self.file_manager.copy_import_file(
-                file_path, data_type, period, year, add_timestamp
-            )
+            if data_type not in IMPORT_TARGETS:
+                raise ValueError(f"未対応のデータ型: {data_type}")
+            
+            target = IMPORT_TARGETS[data_type]
+            start_time = time.perf_counter()
+            
+            importer = BulkImporter(self.db, target['table'], target['columns'])
+            read_plan = self.build_read_plan(data_type, column_mapping)
+            cache_hits = 0
+            
+            # Excel読み込み（ブックは1回だけ開き、全シートをステージング）
+            # キャッシュが全シートに当たればブック自体を開かない
+            with WorkbookReader(file_path, cache=self.import_cache) as reader:
+                # シート名取得
+                if sheet_names is None:
+                    sheet_names = reader.sheet_names
+                
+                total_sheets = len(sheet_names)
+                
+                for i, sheet_name in enumerate(sheet_names):
+                    check_cancelled(cancel_token)
+                    
+                    if progress_callback:
+                        progress_callback(i, total_sheets, f"シート読み込み中: {sheet_name}")
+                    
+                    sheet_start = time.perf_counter()
+                    
+                    df_to_insert, cached = self.read_prepared_sheet(
+                        reader, sheet_name, header_row, column_mapping, data_type, period, year,
+                        read_plan
+                    )
+                    cache_hits += cached
+                    staged = importer.stage(df_to_insert)
+                    
+                    # シート単位の読み込み時間（ログはバックグラウンドでまとめて書き込まれる）
+                    self.logger.log_action(
+                        'import_sheet',
+                        f"{data_type} - {period} {year}年度 - {sheet_name}: {staged}件"
+                        f"{'（キャッシュ）' if cached else ''}",
+                        duration_ms=(time.perf_counter() - sheet_start) * 1000
+                    )
             
-            # Excel読み込み
-            excel_file = pd.ExcelFile(file_path)
+            if progress_callback:
+                progress_callback(
+                    total_sheets, total_sheets,
+                    f"データベース書き込み中: {importer.get_staged_count():,}件"
+                )
             
-            # シート名取得
-            if sheet_names is None:
-                sheet_names = excel_file.sheet_names
+            check_cancelled(cancel_token)
             
-            total_sheets = len(sheet_names)
-            total_rows = 0
+            # 1トランザクションで書き込み
+            source_file = Path(file_path).name
+            if incremental:
+                write_stats = importer.commit_incremental(period, year, cancel_token, source_file)
+            else:
+                write_stats = importer.commit(period, year, cancel_token, source_file)
             
-            for i, sheet_name in enumerate(sheet_names):
-                if progress_callback:
-                    progress_callback(i, total_sheets, f"シート処理中: {sheet_name}")
-                
-                # シート読み込み（header_row指定）
-                df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
-                
-                # カラム名変更
-                df = df.rename(columns=column_mapping)
-                
-                # データ型に応じた処理
-                if data_type == '評定':
-                    rows = self.import_grades(df, period, year)
-                elif data_type == '観点':
-                    rows = self.import_viewpoints(df, period, year)
-                elif data_type == '欠課情報':
-                    rows = self.import_absences(df, period, year)
-                else:
-                    raise ValueError(f"未対応のデータ型: {data_type}")
-                
-                total_rows += rows
+            # ファイルコピー（書き込み完了後）
+            copied_file = self.file_manager.copy_import_file(
+                file_path, data_type, period, year, add_timestamp
+            )
+            
+            self.last_import_stats = self.build_import_stats(
+                'incremental' if incremental else 'bulk',
+                write_stats['rows'], time.perf_counter() - start_time
+            )
+            self.last_import_stats['cache_hits'] = cache_hits
+            self.last_import_stats['write_seconds'] = write_stats['seconds']
+            self.last_import_stats['write_rows_per_sec'] = write_stats['rows_per_sec']
+            
+            change_summary = ""
+            if incremental:
+                for key in ('inserted', 'updated', 'deleted', 'unchanged'):
+                    self.last_import_stats[key] = write_stats[key]
+                change_summary = (
+                    f"追加{write_stats['inserted']}件, 更新{write_stats['updated']}件, "
+                    f"削除{write_stats['deleted']}件, 変更なし{write_stats['unchanged']}件 "
+                )
             
             # ログ記録
             self.logger.log_action(
                 'data_import',
-                f"{data_type} - {period} {year}年度 - {total_rows}件"
+                f"{data_type} - {period} {year}年度 - {write_stats['rows']}件 {change_summary}"
+                f"({self.last_import_stats['rows_per_sec']:,.0f}行/秒, "
+                f"書き込み {write_stats['rows_per_sec']:,.0f}行/秒)",
+                duration_ms=self.last_import_stats['seconds'] * 1000
             )
             
             if progress_callback:
@@ -63,6 +166,10 @@ class DataImporter:
             
             return True
             
+        except OperationCancelled:
+            print(f"データ取り込みキャンセル: {data_type} - {period} {year}年度（データベースは変更されていません）")
+            raise
+            
         except Exception as e:
             print(f"データ取り込みエラー: {e}")
             self.logger.log_action(
@@ -71,159 +178,72 @@ class DataImporter:
             )
             raise
     
-    def import_grades(self, df, period, year):
-        """評定データ取り込み"""
-        try:
-            required_columns = ['student_number', 'course_number']
-            
-            for col in required_columns:
-                if col not in df.columns:
-                    raise ValueError(f"必須カラムがありません: {col}")
-            
-            # データクリーニング
-            df = df.dropna(subset=required_columns)
-            
-            # period と year を列として追加
-            df = df.copy()
-            df['period'] = period
-            df['year'] = year
-            
-            # 必要な列のみ選択（テーブル定義と一致させる）
-            columns_order = [
-                'year', 'period', 'student_number', 'student_name',
-                'course_number', 'course_name', 'school_subject_name',
-                'grade_value', 'credits', 'acquisition_credits', 'remarks'
-            ]
-            
-            # 存在しない列は None で埋める
-            for col in columns_order:
-                if col not in df.columns:
-                    df[col] = None
-            
-            df_to_insert = df[columns_order]
-            
-            # 既存データを削除（INSERT OR REPLACE の代替）
-            self.db.execute_query(
-                "DELETE FROM grades WHERE period=? AND year=?",
-                (period, year)
-            )
-            
-            # 一括INSERT
-            df_to_insert.to_sql(
-                'grades',
-                self.db.get_connection(),
-                if_exists='append',
-                index=False,
-                method='multi'
-            )
-            
-            return len(df_to_insert)
-            
-        except Exception as e:
-            print(f"評定データ取り込みエラー: {e}")
-            raise
+    def build_import_stats(self, mode, rows, seconds):
+        """取り込み統計（行数・処理時間・行/秒）を作成"""
+        stats = {
+            'mode': mode,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_sec': rows / seconds if seconds > 0 else 0.0
+        }
+        print(
+            f"取り込み統計 [{mode}]: {rows:,}行 / {seconds:.2f}秒 "
+            f"({stats['rows_per_sec']:,.0f}行/秒)"
+        )
+        return stats
     
-    def import_viewpoints(self, df, period, year):
-        """観点データ取り込み"""
-        try:
-            required_columns = ['student_number', 'course_number']
-            
-            for col in required_columns:
-                if col not in df.columns:
-                    raise ValueError(f"必須カラムがありません: {col}")
-            
-            # データクリーニング
-            df = df.dropna(subset=required_columns)
-            
-            # period と year を列として追加
-            df = df.copy()
-            df['period'] = period
-            df['year'] = year
-            
-            # 必要な列のみ選択（テーブル定義と一致させる）
-            columns_order = [
-                'year', 'period', 'student_number', 'student_name',
-                'course_number', 'course_name', 'school_subject_name',
-                'viewpoint_1', 'viewpoint_2', 'viewpoint_3',
-                'viewpoint_4', 'viewpoint_5', 'remarks'
-            ]
-            
-            # 存在しない列は None で埋める
-            for col in columns_order:
-                if col not in df.columns:
-                    df[col] = None
-            
-            df_to_insert = df[columns_order]
-            
-            # 既存データを削除（INSERT OR REPLACE の代替）
-            self.db.execute_query(
-                "DELETE FROM viewpoint_evaluations WHERE period=? AND year=?",
-                (period, year)
-            )
-            
-            # 一括INSERT
-            df_to_insert.to_sql(
-                'viewpoint_evaluations',
-                self.db.get_connection(),
-                if_exists='append',
-                index=False,
-                method='multi'
-            )
-            
-            return len(df_to_insert)
-            
-        except Exception as e:
-            print(f"観点データ取り込みエラー: {e}")
-            raise
+    def build_read_plan(self, data_type, column_mapping):
+        """取り込み先の列と db_columns.json の型から読み込み計画を作成"""
+        target = IMPORT_TARGETS[data_type]
+        return ReadPlan.for_table(column_mapping, target['columns'], target['table'])
     
-    def import_absences(self, df, period, year):
-        """欠課情報取り込み (db_columns.json に基づく)"""
-        try:
-            required_columns = ['student_number']
-            
-            for col in required_columns:
-                if col not in df.columns:
-                    raise ValueError(f"必須カラムがありません: {col}")
-            
-            # データクリーニング
-            df = df.dropna(subset=required_columns)
-            
-            # period と year を列として追加
-            df = df.copy()
-            df['period'] = period
-            df['year'] = year
-            
-            # 必要な列のみ選択（テーブル定義と一致させる）
-            columns_order = [
-                'student_number', 'class_name', 'attendance_number', 'student_name',
-                'absent_count', 'course_name', 'subject_category_number', 'subject_number',
-                'course_number', 'year', 'period', 'absence_mark', 'absence_type'
-            ]
-            
-            # 存在しない列は None で埋める
-            for col in columns_order:
-                if col not in df.columns:
-                    df[col] = None
-            
-            df_to_insert = df[columns_order]
-            
-            # 既存データを削除（INSERT OR REPLACE の代替）
-            self.db.execute_query(
-                "DELETE FROM absences WHERE period=? AND year=?",
-                (period, year)
-            )
-            
-            # 一括INSERT
-            df_to_insert.to_sql(
-                'absences',
-                self.db.get_connection(),
-                if_exists='append',
-                index=False,
-                method='multi'
-            )
-            
-            return len(df_to_insert)
-            
-        except Exception as e:
-            print(f"欠課情報取り込みエラー: {e}")
-            raise
+    def read_prepared_sheet(self, reader, sheet_name, header_row, column_mapping, data_type, period, year, read_plan=None):
+        """シートを読み込んで整形した DataFrame と、キャッシュを使ったかを返す"""
+        if read_plan is None:
+            read_plan = self.build_read_plan(data_type, column_mapping)
+        
+        if self.import_cache is None:
+            df = reader.read_sheet(sheet_name, header=header_row, **read_plan.read_kwargs())
+            df = df.rename(columns=column_mapping)
+            return self.prepare_frame(df, data_type, period, year), False
+        
+        # 整形結果は取り込み先の列定義と読み込み計画（列の型）にも依存するためキーに含める
+        # （期間・年度は読み込み後に付け替えるため、別の期間への取り込みでも再利用できる）
+        key = self.import_cache.make_key(
+            reader.file_hash, sheet_name, header_row, column_mapping,
+            data_type=data_type, columns=','.join(IMPORT_TARGETS[data_type]['columns']),
+            read_plan=read_plan.signature()
+        )
+        df_to_insert = self.import_cache.load_frame(key)
+        if df_to_insert is not None:
+            return df_to_insert.assign(period=period, year=year), True
+        
+        # 整形済みのものだけ保存する（生データは保存しない）
+        df = reader.read_sheet(sheet_name, header=header_row, use_cache=False, **read_plan.read_kwargs())
+        df = df.rename(columns=column_mapping)
+        df_to_insert = self.prepare_frame(df, data_type, period, year)
+        self.import_cache.store_frame(key, df_to_insert)
+        return df_to_insert, False
+    
+    def prepare_frame(self, df, data_type, period, year):
+        """取り込み用にデータを整形（必須チェック・period/year付与・列順統一）"""
+        target = IMPORT_TARGETS[data_type]
+        
+        for col in target['required']:
+            if col not in df.columns:
+                raise ValueError(f"必須カラムがありません: {col}")
+        
+        # データクリーニング
+        df = df.dropna(subset=target['required'])
+        
+        # period と year を列として追加
+        df = df.copy()
+        df['period'] = period
+        df['year'] = year
+        
+        # 存在しない列は None で埋める
+        for col in target['columns']:
+            if col not in df.columns:
+                df[col] = None
+        
+        return df[target['columns']]
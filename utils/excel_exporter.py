@@ -1,137 +1,322 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, time
 from pathlib import Path
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import xlsxwriter
+from utils.job_control import OperationCancelled, check_cancelled
+
+
+def to_cell_value(value):
+    """XlsxWriter に書き込める値へ変換（日時は Python の datetime / date / time にする）"""
+    if value is None:
+        return None
+    if isinstance(value, (str, bool, int, float)):
+        return None if isinstance(value, float) and pd.isna(value) else value
+    if pd.isna(value):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, (datetime, date, time)):
+        return value
+    if hasattr(value, 'item'):
+        # numpy のスカラー型は Python の値に変換
+        return value.item()
+    return str(value)
+
+
+def write_cells(worksheet, row_idx, values, cell_format, date_formats):
+    """1行分の値を書き込む（日時は write_datetime で日付の表示形式を付ける）
+
+    date_formats は {'datetime': 書式, 'date': 書式, 'time': 書式}。
+    """
+    for col_idx, value in enumerate(values):
+        if isinstance(value, datetime):
+            worksheet.write_datetime(row_idx, col_idx, value, date_formats['datetime'])
+        elif isinstance(value, date):
+            worksheet.write_datetime(row_idx, col_idx, value, date_formats['date'])
+        elif isinstance(value, time):
+            worksheet.write_datetime(row_idx, col_idx, value, date_formats['time'])
+        else:
+            worksheet.write(row_idx, col_idx, value, cell_format)
 
 
 class ExcelExporter:
-    """Excel出力クラス"""
+    """Excel出力クラス
+    
+    行はXlsxWriterの constant_memory モードで1行ずつ書き出すため、
+    出力行数が増えてもメモリ使用量はほぼ一定になる。書式は行単位の
+    フォーマットで設定し、列幅は先頭の一部の行（サンプル）から決める。
+    """
+    
+    # 列幅の算出に使う先頭行数
+    WIDTH_SAMPLE_ROWS = 500
+    
+    # 列幅の上限
+    MAX_COLUMN_WIDTH = 50
+    
+    # 進捗通知・キャンセル確認の間隔（行数）
+    PROGRESS_INTERVAL = 5000
     
     def __init__(self):
         self.default_export_dir = Path('data/exports')
         self.default_export_dir.mkdir(parents=True, exist_ok=True)
     
-    def export_to_excel(self, data, columns, filename, sheet_name='Sheet1'):
-        """データをExcelファイルに出力"""
-        try:
-            df = pd.DataFrame(data)
-            
-            available_columns = [col for col in columns if col in df.columns]
-            if available_columns:
-                df = df[available_columns]
+    def build_export_path(self, filename):
+        """タイムスタンプ付きの出力パスを作成"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_name = Path(filename).stem
+        export_filename = f"{base_name}_{timestamp}.xlsx"
+        return self.default_export_dir / export_filename
+    
+    def create_workbook(self, export_path):
+        """書き込み専用のブックと共通書式を作成"""
+        workbook = xlsxwriter.Workbook(
+            str(export_path),
+            # タイムゾーン付きの日時は Excel で扱えないため、タイムゾーンを外して書き込む
+            {'constant_memory': True, 'strings_to_urls': False, 'remove_timezone': True}
+        )
+        
+        header_style = {
+            'bold': True,
+            'font_color': '#FFFFFF',
+            'bg_color': '#366092',
+            'align': 'center',
+            'valign': 'vcenter',
+            'border': 1
+        }
+        body_style = {'border': 1}
+        # pd.DataFrame.to_excel と同じ表示形式
+        date_num_formats = {
+            'datetime': 'yyyy-mm-dd hh:mm:ss',
+            'date': 'yyyy-mm-dd',
+            'time': 'hh:mm:ss'
+        }
+        
+        formats = {
+            'header': workbook.add_format(header_style),
+            'body': workbook.add_format(body_style),
+            'header_dates': {
+                kind: workbook.add_format(dict(header_style, num_format=num_format))
+                for kind, num_format in date_num_formats.items()
+            },
+            'body_dates': {
+                kind: workbook.add_format(dict(body_style, num_format=num_format))
+                for kind, num_format in date_num_formats.items()
+            }
+        }
+        
+        return workbook, formats
+    
+    def write_sheet(self, workbook, formats, sheet_name, columns, row_batches,
+                    total_rows=None, progress_callback=None, cancel_token=None):
+        """行バッチのイテレータを1シートに書き出し、書き込んだ行数を返す
+        
+        row_batches は値のシーケンス（columns と同じ順序）のリストを順に返す。
+        """
+        worksheet = workbook.add_worksheet(sheet_name)
+        
+        # 先頭の一部だけをバッファして列幅を決める
+        sample = []
+        batches = iter(row_batches)
+        
+        for batch in batches:
+            sample.extend(batch)
+            if len(sample) >= self.WIDTH_SAMPLE_ROWS:
+                break
+        
+        for col_idx, column in enumerate(columns):
+            max_length = len(str(column))
+            for values in sample[:self.WIDTH_SAMPLE_ROWS]:
+                value = values[col_idx]
+                if value is not None:
+                    max_length = max(max_length, len(str(value)))
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_name = Path(filename).stem
-            export_filename = f"{base_name}_{timestamp}.xlsx"
-            export_path = self.default_export_dir / export_filename
+            worksheet.set_column(col_idx, col_idx, min(max_length + 2, self.MAX_COLUMN_WIDTH))
+        
+        # 日付の列名（出欠の日付列など）も日付として書き込む
+        write_cells(
+            worksheet, 0, [to_cell_value(column) for column in columns],
+            formats['header'], formats['header_dates']
+        )
+        
+        body_format = formats['body']
+        body_date_formats = formats['body_dates']
+        row_idx = 0
+        
+        def write_batch(batch):
+            nonlocal row_idx
             
-            with pd.ExcelWriter(export_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                workbook = writer.book
-                worksheet = writer.sheets[sheet_name]
-                
-                # ヘッダーのスタイル
-                header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                header_font = Font(color="FFFFFF", bold=True)
-                
-                for cell in worksheet[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                
-                # 罫線
-                thin_border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
+            for values in batch:
+                row_idx += 1
+                write_cells(
+                    worksheet, row_idx, [to_cell_value(v) for v in values],
+                    body_format, body_date_formats
                 )
                 
-                for row in worksheet.iter_rows(min_row=1, max_row=worksheet.max_row,
-                                               min_col=1, max_col=worksheet.max_column):
-                    for cell in row:
-                        cell.border = thin_border
+                if row_idx % self.PROGRESS_INTERVAL == 0:
+                    check_cancelled(cancel_token)
+                    if progress_callback:
+                        progress_callback(row_idx, total_rows or 0, f"書き込み中: {sheet_name} {row_idx:,}行")
+        
+        write_batch(sample)
+        
+        for batch in batches:
+            write_batch(batch)
+        
+        return row_idx
+    
+    def finish_export(self, workbook, export_path, progress_callback=None, cancel_token=None):
+        """ブックを閉じて出力パスを返す"""
+        check_cancelled(cancel_token)
+        
+        if progress_callback:
+            progress_callback(1, 1, "ファイル保存中...")
+        
+        workbook.close()
+        
+        if progress_callback:
+            progress_callback(1, 1, "出力完了")
+        
+        return str(export_path)
+    
+    def export_query_to_excel(self, db_manager, query, params, filename, sheet_name='Sheet1',
+                              progress_callback=None, cancel_token=None):
+        """SELECT結果をカーソルから直接Excelファイルに出力"""
+        return self.export_queries_to_excel(
+            db_manager,
+            {sheet_name: (query, params)},
+            filename,
+            progress_callback=progress_callback,
+            cancel_token=cancel_token
+        )
+    
+    def export_queries_to_excel(self, db_manager, query_dict, filename,
+                                progress_callback=None, cancel_token=None):
+        """シート名 -> (クエリ, パラメータ) の各SELECT結果を1ファイルに出力
+        
+        結果が0件のクエリはシートを作成しない。出力行数の合計を
+        (出力パス, 行数) で返す。件数は事前に数えず（結果を2回走査しない）、
+        進捗は書き込んだ行数だけを通知する。
+        """
+        export_path = self.build_export_path(filename)
+        workbook = None
+        total_written = 0
+        
+        try:
+            workbook, formats = self.create_workbook(export_path)
+            
+            for sheet_name, (query, params) in query_dict.items():
+                check_cancelled(cancel_token)
+                
+                # iter_query は検索エラーを例外で返す（0件と区別できる）
+                batches = db_manager.iter_query(query, params)
                 
-                # 列幅の自動調整
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
+                try:
+                    first_batch = next(batches, None)
+                    if not first_batch:
+                        continue
                     
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
+                    if progress_callback:
+                        progress_callback(0, 0, f"書き込み中: {sheet_name}")
                     
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
+                    columns = list(first_batch[0].keys())
+                    
+                    def row_batches():
+                        yield first_batch
+                        yield from batches
+                    
+                    total_written += self.write_sheet(
+                        workbook, formats, sheet_name, columns, row_batches(),
+                        progress_callback=progress_callback, cancel_token=cancel_token
+                    )
+                finally:
+                    # 途中で中断した場合もカーソルを閉じる
+                    batches.close()
             
-            return str(export_path)
+            if total_written == 0:
+                # 出力するデータがない場合はファイルを作らない
+                workbook.close()
+                self.remove_partial_file(export_path)
+                return None, 0
+            
+            return self.finish_export(workbook, export_path, progress_callback, cancel_token), total_written
+        
+        except OperationCancelled:
+            self.close_quietly(workbook)
+            self.remove_partial_file(export_path)
+            raise
         
         except Exception as e:
+            self.close_quietly(workbook)
+            self.remove_partial_file(export_path)
             raise Exception(f"Excel出力エラー: {str(e)}")
     
-    def export_multiple_sheets(self, data_dict, filename):
+    def export_to_excel(self, data, columns, filename, sheet_name='Sheet1', progress_callback=None, cancel_token=None):
+        """データをExcelファイルに出力"""
+        return self.export_multiple_sheets(
+            {sheet_name: (data, columns)},
+            filename,
+            progress_callback=progress_callback,
+            cancel_token=cancel_token
+        )
+    
+    def export_multiple_sheets(self, data_dict, filename, progress_callback=None, cancel_token=None):
         """複数のシートを持つExcelファイルを出力"""
+        export_path = self.build_export_path(filename)
+        workbook = None
+        
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_name = Path(filename).stem
-            export_filename = f"{base_name}_{timestamp}.xlsx"
-            export_path = self.default_export_dir / export_filename
+            workbook, formats = self.create_workbook(export_path)
             
-            with pd.ExcelWriter(export_path, engine='openpyxl') as writer:
-                for sheet_name, (data, columns) in data_dict.items():
-                    df = pd.DataFrame(data)
-                    
-                    available_columns = [col for col in columns if col in df.columns]
-                    if available_columns:
-                        df = df[available_columns]
-                    
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                    worksheet = writer.sheets[sheet_name]
-                    
-                    # ヘッダーのスタイル
-                    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    header_font = Font(color="FFFFFF", bold=True)
-                    
-                    for cell in worksheet[1]:
-                        cell.fill = header_fill
-                        cell.font = header_font
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
-                    
-                    # 罫線
-                    thin_border = Border(
-                        left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin')
-                    )
-                    
-                    for row in worksheet.iter_rows(min_row=1, max_row=worksheet.max_row,
-                                                   min_col=1, max_col=worksheet.max_column):
-                        for cell in row:
-                            cell.border = thin_border
-                    
-                    # 列幅の自動調整
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
+            for sheet_name, (data, columns) in data_dict.items():
+                check_cancelled(cancel_token)
+                
+                if isinstance(data, pd.DataFrame):
+                    data = data.to_dict('records')
+                
+                if progress_callback:
+                    progress_callback(0, len(data), f"書き込み中: {sheet_name}")
+                
+                keys = list(data[0].keys()) if data else list(columns)
+                available_columns = [col for col in columns if col in keys]
+                if not available_columns:
+                    available_columns = keys
+                
+                rows = [[record.get(col) for col in available_columns] for record in data]
+                
+                self.write_sheet(
+                    workbook, formats, sheet_name, available_columns, [rows],
+                    len(rows), progress_callback, cancel_token
+                )
             
-            return str(export_path)
+            return self.finish_export(workbook, export_path, progress_callback, cancel_token)
+        
+        except OperationCancelled:
+            self.close_quietly(workbook)
+            self.remove_partial_file(export_path)
+            raise
         
         except Exception as e:
-            raise Exception(f"Excel出力エラー: {str(e)}")
\ No newline at end of file
+            self.close_quietly(workbook)
+            self.remove_partial_file(export_path)
+            raise Exception(f"Excel出力エラー: {str(e)}")
+    
+    def close_quietly(self, workbook):
+        """エラー・キャンセル時にブックを閉じる"""
+        if workbook is None:
+            return
+        
+        try:
+            workbook.close()
+        except Exception as e:
+            print(f"ブッククローズエラー: {e}")
+    
+    def remove_partial_file(self, export_path):
+        """キャンセル時に書きかけの出力ファイルを削除"""
+        if export_path is None:
+            return
+        
+        try:
+            Path(export_path).unlink(missing_ok=True)
+        except Exception as e:
+            print(f"出力ファイル削除エラー: {e}")
\ No newline at end of file
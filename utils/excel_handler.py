@@ -1,5 +1,6 @@
 import pandas as pd
 from openpyxl import load_workbook
+from utils.workbook_reader import WorkbookReader
 
 
 class ExcelHandler:
@@ -47,22 +48,11 @@ class ExcelHandler:
     def read_multiple_sheets(file_path, header_row=0, exclude_sheets=None):
         """複数シートを読み込んで統合"""
         try:
-            wb = load_workbook(file_path, read_only=True)
-            sheet_names = wb.sheetnames
-            wb.close()
-            
-            if exclude_sheets:
-                sheet_names = [s for s in sheet_names if s not in exclude_sheets]
-            
             dfs = []
-            for sheet_name in sheet_names:
-                df = pd.read_excel(
-                    file_path,
-                    sheet_name=sheet_name,
-                    header=header_row
-                )
-                df['_source_sheet'] = sheet_name
-                dfs.append(df)
+            with WorkbookReader(file_path) as reader:
+                for sheet_name, df in reader.iter_sheets(header=header_row, exclude_sheets=exclude_sheets):
+                    df['_source_sheet'] = sheet_name
+                    dfs.append(df)
             
             combined_df = pd.concat(dfs, ignore_index=True)
             return combined_df
@@ -1,6 +1,9 @@
+import os
+import json
 import shutil
 from pathlib import Path
 from datetime import datetime
+from utils.import_cache import compute_file_hash
 
 
 class FileManager:
@@ -17,6 +20,9 @@ class FileManager:
         self.export_dir = self.data_dir / 'exports'
         self.backup_dir = self.data_dir / 'backups'
         
+        # 取り込みファイルの内容ハッシュ → 保存先（重複コピー防止用）
+        self.import_index_path = self.import_dir / 'import_index.json'
+        
         # ディレクトリ作成
         self.create_directories()
     
@@ -52,13 +58,32 @@ class FileManager:
         return type_dir / new_filename
     
     def copy_import_file(self, source_path, data_type, period, year, add_timestamp=True):
-        """取り込みファイルをコピー"""
+        """取り込みファイルをコピー
+        
+        同じ内容のファイルが同じ保存先に既にあればコピーせずにそのパスを返す。
+        別の保存先にある場合はハードリンクを作成し、ディスク上の実体は共有する。
+        """
         try:
             source = Path(source_path)
             
             if not source.exists():
                 raise FileNotFoundError(f"ファイルが見つかりません: {source_path}")
             
+            file_hash = compute_file_hash(source)
+            index = self.load_import_index()
+            # 削除・上書きされたファイルは除外（ハッシュはサイズ・更新時刻でメモ化済み）
+            stored_paths = [
+                self.import_dir / p for p in index.get(file_hash, [])
+                if (self.import_dir / p).exists()
+                and compute_file_hash(self.import_dir / p) == file_hash
+            ]
+            
+            type_dir = self.import_dir / data_type / str(year) / period
+            for stored_path in stored_paths:
+                if stored_path.parent == type_dir:
+                    print(f"同じ内容のファイルが保存済みのためコピーを省略: {stored_path.name}")
+                    return stored_path
+            
             # コピー先パス生成
             dest_path = self.get_import_path(
                 data_type, 
@@ -68,8 +93,20 @@ class FileManager:
                 add_timestamp
             )
             
-            # ファイルコピー
-            shutil.copy2(source, dest_path)
+            # 上書きする場合、ハードリンク先の内容を書き換えないよう先に削除
+            if dest_path.exists():
+                dest_path.unlink()
+            
+            if stored_paths:
+                self.link_or_copy(stored_paths[0], dest_path)
+            else:
+                # ファイルコピー
+                shutil.copy2(source, dest_path)
+            
+            relative_paths = [p.relative_to(self.import_dir).as_posix() for p in stored_paths]
+            relative_paths.append(dest_path.relative_to(self.import_dir).as_posix())
+            index[file_hash] = relative_paths
+            self.save_import_index(index)
             
             return dest_path
             
@@ -77,6 +114,74 @@ class FileManager:
             print(f"ファイルコピーエラー: {e}")
             raise
     
+    def link_or_copy(self, existing_path, dest_path):
+        """ハードリンクを作成（作成できない場合はコピー）"""
+        try:
+            os.link(existing_path, dest_path)
+        except OSError:
+            shutil.copy2(existing_path, dest_path)
+    
+    def load_import_index(self):
+        """取り込みファイルのハッシュ索引を読み込む"""
+        if not self.import_index_path.exists():
+            return {}
+        
+        try:
+            with open(self.import_index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"取り込み索引読み込みエラー（再作成します）: {e}")
+            return {}
+    
+    def save_import_index(self, index):
+        """取り込みファイルのハッシュ索引を保存"""
+        tmp_path = self.import_index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.import_index_path)
+    
+    def deduplicate_import_files(self):
+        """取り込みフォルダ内の同じ内容のファイルをハードリンクにまとめ、索引を作り直す
+        
+        戻り値は (まとめたファイル数, 削減したバイト数)。
+        """
+        try:
+            index = {}
+            merged_count = 0
+            saved_bytes = 0
+            
+            for file_path in sorted(self.import_dir.rglob('*.xls*')):
+                if not file_path.is_file():
+                    continue
+                
+                file_hash = compute_file_hash(file_path)
+                relative_path = file_path.relative_to(self.import_dir).as_posix()
+                
+                if file_hash in index:
+                    original = self.import_dir / index[file_hash][0]
+                    if not os.path.samefile(original, file_path):
+                        size = file_path.stat().st_size
+                        tmp_path = file_path.with_name(file_path.name + '.dedup')
+                        try:
+                            os.link(original, tmp_path)
+                        except OSError:
+                            # ハードリンク非対応の場合はそのまま残す
+                            index[file_hash].append(relative_path)
+                            continue
+                        tmp_path.replace(file_path)
+                        merged_count += 1
+                        saved_bytes += size
+                    index[file_hash].append(relative_path)
+                else:
+                    index[file_hash] = [relative_path]
+            
+            self.save_import_index(index)
+            return merged_count, saved_bytes
+            
+        except Exception as e:
+            print(f"取り込みファイル重複整理エラー: {e}")
+            raise
+    
     def get_export_path(self, filename, add_timestamp=True):
         """エクスポートファイルパス生成"""
         file_path = Path(filename)
@@ -134,7 +239,7 @@ class FileManager:
         
         if search_dir.exists():
             for file_path in search_dir.rglob('*'):
-                if file_path.is_file():
+                if file_path.is_file() and file_path != self.import_index_path:
                     files.append({
                         'path': file_path,
                         'name': file_path.name,
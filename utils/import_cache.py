@@ -0,0 +1,297 @@
+import hashlib
+import json
+import math
+import threading
+from datetime import datetime, date, time, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+# ファイルハッシュのメモ（パス・サイズ・更新時刻が同じなら再計算しない）
+_hash_memo = {}
+_hash_memo_lock = threading.Lock()
+
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """ファイル内容の SHA-256 を計算"""
+    path = Path(file_path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    with _hash_memo_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    file_hash = digest.hexdigest()
+
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = file_hash
+
+    return file_hash
+
+
+def encode_value(value):
+    """セルの値を JSON で表せる値に変換（日付・時刻は型が分かる形で保存）"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else {'$float': str(value)}
+    if isinstance(value, np.datetime64):
+        return encode_value(pd.Timestamp(value))
+    if isinstance(value, np.timedelta64):
+        return encode_value(pd.Timedelta(value))
+    if isinstance(value, np.generic):
+        return encode_value(value.item())
+    if value is pd.NaT:
+        return {'$nat': True}
+    if value is pd.NA:
+        return {'$na': True}
+    if isinstance(value, pd.Timestamp):
+        return {'$timestamp': value.isoformat()}
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, time):
+        return {'$time': value.isoformat()}
+    if isinstance(value, (pd.Timedelta, timedelta)):
+        return {'$timedelta': pd.Timedelta(value).value}
+    raise TypeError(f"キャッシュに保存できない値の型: {type(value).__name__}")
+
+
+def decode_value(value):
+    """encode_value で保存した値を元の型に戻す"""
+    if not isinstance(value, dict):
+        return value
+    if '$float' in value:
+        return float(value['$float'])
+    if '$nat' in value:
+        return pd.NaT
+    if '$na' in value:
+        return pd.NA
+    if '$timestamp' in value:
+        return pd.Timestamp(value['$timestamp'])
+    if '$datetime' in value:
+        return datetime.fromisoformat(value['$datetime'])
+    if '$date' in value:
+        return date.fromisoformat(value['$date'])
+    if '$time' in value:
+        return time.fromisoformat(value['$time'])
+    if '$timedelta' in value:
+        return pd.Timedelta(value['$timedelta'])
+    raise ValueError(f"不正なキャッシュの値: {value}")
+
+
+def encode_column(series):
+    """1列分の値を変換（欠損のない整数・真偽値の列は tolist のまま）"""
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biu':
+        return series.tolist()
+    return [encode_value(v) for v in series.tolist()]
+
+
+def frame_to_json(df):
+    """DataFrame を列ごとの値と型の JSON に変換（pickle を使わない）"""
+    index = df.index
+    if isinstance(index, pd.RangeIndex):
+        encoded_index = {'range': [index.start, index.stop, index.step]}
+    else:
+        encoded_index = {'values': [encode_value(v) for v in index.tolist()]}
+
+    return {
+        'columns': [encode_value(c) for c in df.columns],
+        'dtypes': [str(dtype) for dtype in df.dtypes],
+        'index': encoded_index,
+        'data': [encode_column(df.iloc[:, i]) for i in range(df.shape[1])]
+    }
+
+
+def frame_from_json(data):
+    """frame_to_json の結果から DataFrame を復元"""
+    if 'range' in data['index']:
+        index = pd.RangeIndex(*data['index']['range'])
+    else:
+        index = pd.Index([decode_value(v) for v in data['index']['values']])
+
+    columns = []
+    for values, dtype in zip(data['data'], data['dtypes']):
+        series = pd.Series([decode_value(v) for v in values], index=index, dtype=object)
+        columns.append(series if dtype == 'object' else series.astype(dtype))
+
+    df = pd.concat(columns, axis=1) if columns else pd.DataFrame(index=index)
+    df.columns = [decode_value(c) for c in data['columns']]
+    return df
+
+
+class ImportCache:
+    """取り込みファイルの解析結果キャッシュ（ファイル内容のハッシュで管理）
+
+    同じ内容のブックを再度取り込み・プレビューする場合に、Excelの解析を
+    省略してキャッシュ済みの DataFrame を読み込む。キーはファイルの
+    SHA-256・シート名・ヘッダー行・カラムマッピングなどから作るため、
+    ファイル名や保存場所が違っても内容が同じなら再利用される。
+
+    DataFrame は列ごとの値と型を JSON で保存する（pickle は読み込み時に任意の
+    コードを実行できるため使わない）。合計サイズは保存のたびに加算して見積もり、
+    上限を超えた時だけディレクトリを走査して古いものから削除する。
+    """
+
+    def __init__(self, cache_dir=None, max_size_mb=512):
+        """初期化"""
+        if cache_dir is None:
+            cache_dir = Path(__file__).parent.parent / 'data' / 'cache' / 'import'
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        # キャッシュの合計サイズの見積もり（初回の保存時に走査して求める）
+        self.total_size = None
+        self.size_lock = threading.Lock()
+
+    def make_key(self, file_hash, sheet_name, header_row=0, column_mapping=None, **extra):
+        """キャッシュキーを作成"""
+        key_source = json.dumps(
+            {
+                'file': file_hash,
+                'sheet': str(sheet_name),
+                'header': header_row,
+                'mapping': sorted((column_mapping or {}).items()),
+                'extra': sorted((k, str(v)) for k, v in extra.items())
+            },
+            ensure_ascii=False
+        )
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def get_path(self, key, suffix='.frame.json'):
+        """キーに対応するキャッシュファイルのパス"""
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def load_frame(self, key):
+        """キャッシュ済みの DataFrame を読み込む（無ければ None）"""
+        path = self.get_path(key)
+
+        if not path.exists():
+            self.misses += 1
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                df = frame_from_json(json.load(f))
+            # 最近使ったものを残すため更新時刻を更新
+            path.touch()
+            self.hits += 1
+            return df
+        except Exception as e:
+            print(f"キャッシュ読み込みエラー（再解析します）: {e}")
+            self.remove(path)
+            self.misses += 1
+            return None
+
+    def store_frame(self, key, df):
+        """DataFrame をキャッシュに保存"""
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+
+        try:
+            # 書き込み途中のファイルを読まないよう、一時ファイルから置き換える
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(frame_to_json(df), f, ensure_ascii=False)
+            tmp_path.replace(path)
+            size = path.stat().st_size
+        except Exception as e:
+            print(f"キャッシュ保存エラー: {e}")
+            self.remove(tmp_path)
+            return
+
+        with self.size_lock:
+            if self.total_size is None:
+                self.total_size = self.scan_size()
+            else:
+                self.total_size += size
+            over_limit = self.total_size > self.max_size_bytes
+
+        if over_limit:
+            self.prune()
+
+    def get_sheet_names(self, file_hash):
+        """キャッシュ済みのシート名一覧（無ければ None）"""
+        path = self.get_path(file_hash, '.sheets.json')
+
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"キャッシュ読み込みエラー: {e}")
+            return None
+
+    def store_sheet_names(self, file_hash, sheet_names):
+        """シート名一覧をキャッシュに保存"""
+        path = self.get_path(file_hash, '.sheets.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(list(sheet_names), f, ensure_ascii=False)
+        except Exception as e:
+            print(f"キャッシュ保存エラー: {e}")
+
+    def list_files(self):
+        """キャッシュファイルの一覧"""
+        return [p for p in self.cache_dir.rglob('*') if p.is_file() and p.suffix != '.tmp']
+
+    def scan_size(self):
+        """キャッシュファイルの合計サイズを走査して求める
+
+        以前の形式（pickle）のファイルは読み込まないため、ここで削除する。
+        """
+        total_size = 0
+        for path in self.list_files():
+            if path.suffix == '.pkl':
+                self.remove(path)
+            else:
+                total_size += path.stat().st_size
+        return total_size
+
+    def prune(self):
+        """合計サイズが上限を超えた場合、使われていないものから削除"""
+        files = self.list_files()
+        total_size = sum(p.stat().st_size for p in files)
+
+        if total_size > self.max_size_bytes:
+            for path in sorted(files, key=lambda p: p.stat().st_mtime):
+                size = path.stat().st_size
+                self.remove(path)
+                total_size -= size
+
+                if total_size <= self.max_size_bytes:
+                    break
+
+        with self.size_lock:
+            self.total_size = total_size
+
+    def clear(self):
+        """キャッシュを全て削除"""
+        for path in self.cache_dir.rglob('*'):
+            if path.is_file():
+                self.remove(path)
+
+        with self.size_lock:
+            self.total_size = 0
+
+    def remove(self, path):
+        """キャッシュファイルを削除"""
+        try:
+            Path(path).unlink(missing_ok=True)
+        except Exception as e:
+            print(f"キャッシュ削除エラー: {e}")
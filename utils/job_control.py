@@ -0,0 +1,35 @@
+import threading
+
+
+class OperationCancelled(Exception):
+    """ユーザー操作による処理キャンセル"""
+
+    def __init__(self, message="処理がキャンセルされました"):
+        super().__init__(message)
+
+
+class CancelToken:
+    """協調的キャンセル用トークン（UIスレッドから cancel、処理側で確認）"""
+
+    def __init__(self):
+        """初期化"""
+        self._event = threading.Event()
+
+    def cancel(self):
+        """キャンセルを要求"""
+        self._event.set()
+
+    def is_cancelled(self):
+        """キャンセルが要求されたか"""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """キャンセルが要求されていれば OperationCancelled を送出"""
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+def check_cancelled(cancel_token):
+    """cancel_token が指定されていればキャンセルを確認"""
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+
+
+class BufferedLogWriter:
+    """操作ログをキューに溜め、バックグラウンドスレッドでまとめて書き込むクラス
+
+    呼び出し側はキューに積むだけなので、取り込みのループ内などでも
+    ログ記録のコスト（INSERT・コミット）がかからない。件数が batch_size に
+    達したとき、または flush_interval 秒経過したときに1トランザクションで
+    書き込む。
+    """
+
+    INSERT_QUERY = """ INSERT INTO action_logs (timestamp, action_type, details, user, duration_ms) VALUES (?, ?, ?, ?, ?) """
+
+    # 書き込みスレッドの停止指示
+    STOP = object()
+
+    def __init__(self, db_manager, batch_size=200, flush_interval=1.0):
+        """初期化"""
+        self.db = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='log-writer', daemon=True)
+        self.closed = False
+        # 停止の判定とキューへの追加をまとめて行うためのロック
+        # （close() の停止指示より前に積まれたログは必ず書き込まれる）
+        self.lock = threading.Lock()
+        self.written_count = 0
+        self.thread.start()
+
+    def put(self, entry):
+        """ログ1件をキューに追加（timestamp, action_type, details, user, duration_ms）
+
+        停止済みの場合は追加せずに False を返す（呼び出し側で直接書き込む）。
+        """
+        return self.put_many([entry])
+
+    def put_many(self, entries):
+        """複数のログをキューに追加（停止済みの場合は False）"""
+        with self.lock:
+            if self.closed:
+                return False
+            for entry in entries:
+                self.queue.put(entry)
+            return True
+
+    def flush(self, timeout=5.0):
+        """キュー内のログを書き込み、完了まで待つ"""
+        if self.closed:
+            return True
+
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """残りのログを書き込んでスレッドを停止"""
+        with self.lock:
+            if self.closed:
+                return
+
+            self.closed = True
+            self.queue.put(self.STOP)
+
+        self.thread.join(timeout)
+
+    def run(self):
+        """書き込みスレッド本体"""
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self.STOP:
+                self.write_batch(batch)
+                return
+
+            if isinstance(item, threading.Event):
+                # flush() の要求: ここまでのログを書き込んでから通知
+                self.write_batch(batch)
+                batch = []
+                deadline = None
+                item.set()
+                continue
+
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self.write_batch(batch)
+                batch = []
+                deadline = None
+
+    def write_batch(self, batch):
+        """ログをまとめて書き込み（1回のコミット）"""
+        if not batch:
+            return
+
+        try:
+            if not self.db.connection:
+                print(f"警告: データベース接続が閉じられています。ログ記録をスキップします: {len(batch)}件")
+                return
+
+            self.db.execute_many(self.INSERT_QUERY, batch)
+            self.written_count += len(batch)
+
+        except Exception as e:
+            print(f"ログ書き込みエラー: {e}")
@@ -1,13 +1,24 @@
-from datetime import datetime
+import gzip
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from utils.log_writer import BufferedLogWriter
 
 
 class Logger:
     """ログ記録クラス"""
     
-    def __init__(self, db_manager):
-        """初期化"""
+    def __init__(self, db_manager, buffered=True, batch_size=200, flush_interval=1.0):
+        """初期化
+        
+        buffered=True の場合、ログはキューに積まれバックグラウンドでまとめて書き込まれる。
+        """
         self.db = db_manager
         self.create_log_table()
+        self.writer = BufferedLogWriter(db_manager, batch_size, flush_interval) if buffered else None
     
     def create_log_table(self):
         """ログテーブル作成"""
@@ -17,24 +28,76 @@ class Logger:
         except Exception as e:
             print(f"ログテーブル作成エラー: {e}")
     
-    def log_action(self, action_type, details="", user="system"):
-        """アクション記録"""
+    def log_action(self, action_type, details="", user="system", duration_ms=None):
+        """アクション記録（duration_ms は処理時間のミリ秒、任意）"""
         try:
+            entry = (datetime.now().isoformat(), action_type, details, user, duration_ms)
+            
+            # 書き込みスレッドが停止済みの場合は直接書き込む
+            if self.writer and self.writer.put(entry):
+                return
+            
             # データベース接続確認
             if not self.db.connection:
                 print(f"警告: データベース接続が閉じられています。ログ記録をスキップします: {action_type}")
                 return
             
-            query = """ INSERT INTO action_logs (timestamp, action_type, details, user) VALUES (?, ?, ?, ?) """
-            params = (datetime.now().isoformat(), action_type, details, user)
-            self.db.execute_query(query, params)
+            self.db.execute_query(BufferedLogWriter.INSERT_QUERY, entry)
+            
+        except Exception as e:
+            print(f"ログ記録エラー: {e}")
+    
+    def log_actions(self, entries, user="system"):
+        """複数のアクションをまとめて記録（1回のコミット）
+        
+        entries は (action_type, details) のリスト。
+        """
+        try:
+            timestamp = datetime.now().isoformat()
+            params = [(timestamp, action_type, details, user, None) for action_type, details in entries]
+            
+            if self.writer and self.writer.put_many(params):
+                return
+            
+            if not self.db.connection:
+                print(f"警告: データベース接続が閉じられています。ログ記録をスキップします: {len(entries)}件")
+                return
+            
+            self.db.execute_many(BufferedLogWriter.INSERT_QUERY, params)
             
         except Exception as e:
             print(f"ログ記録エラー: {e}")
     
+    @contextmanager
+    def timed(self, action_type, details="", user="system"):
+        """ブロックの処理時間を duration_ms 付きで記録
+        
+        使用例:
+            with logger.timed('export', '評定'):
+                ...
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            self.log_action(action_type, details, user, duration_ms)
+    
+    def flush(self):
+        """キュー内のログを書き込む（読み取り前に呼ぶ）"""
+        if self.writer:
+            self.writer.flush()
+    
+    def close(self):
+        """残りのログを書き込んで書き込みスレッドを停止（終了時に呼ぶ）"""
+        if self.writer:
+            self.writer.close()
+    
     def get_logs(self, limit=100, action_type=None, start_date=None, end_date=None):
         """ログ取得"""
         try:
+            self.flush()
+            
             query = "SELECT * FROM action_logs WHERE 1=1"
             params = []
             
@@ -71,26 +134,97 @@ class Logger:
         """期間別ログ取得"""
         return self.get_logs(limit=limit, start_date=start_date, end_date=end_date)
     
-    def clear_old_logs(self, days=90):
-        """古いログ削除"""
+    def clear_old_logs(self, days=90, archive_dir=None):
+        """古いログ削除（archive_dir を指定すると削除前に圧縮ファイルへ退避）"""
         try:
-            cutoff_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            cutoff_date = cutoff_date.replace(day=cutoff_date.day - days)
-            
-            query = "DELETE FROM action_logs WHERE timestamp < ?"
-            params = (cutoff_date.isoformat(),)
-            
-            self.db.execute_query(query, params)
-            
+            self.apply_retention(days, archive_dir)
             return True
             
         except Exception as e:
             print(f"ログ削除エラー: {e}")
             return False
     
+    # 保持期間処理で1回に削除する行数（書き込みロックを長時間持たないため）
+    RETENTION_CHUNK_SIZE = 5000
+    
+    def apply_retention(self, days, archive_dir=None, chunk_size=None):
+        """保持期間（日数）より古いログを分割して削除
+        
+        archive_dir を指定した場合は、削除する行を gzip 圧縮の JSON Lines
+        ファイルに書き出してから削除する。削除件数とアーカイブのパスを返す。
+        読み込み・削除に失敗した場合は例外を送出する（削除済みのチャンクはそのまま）。
+        """
+        chunk_size = chunk_size or self.RETENTION_CHUNK_SIZE
+        
+        self.flush()
+        
+        cutoff_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        cutoff = cutoff_date.isoformat()
+        
+        archive_path = None
+        archive_file = None
+        deleted_count = 0
+        
+        try:
+            while True:
+                # timestamp のインデックス順に古いものから取得
+                # （fetch_all はエラーで空リストを返し、処理済みと区別できないため例外を送出させる）
+                rows = self.db.execute_read(
+                    "SELECT * FROM action_logs WHERE timestamp < ? ORDER BY timestamp LIMIT ?",
+                    (cutoff, chunk_size)
+                ).fetchall()
+                
+                if not rows:
+                    break
+                
+                if archive_dir and archive_file is None:
+                    archive_dir = Path(archive_dir)
+                    archive_dir.mkdir(parents=True, exist_ok=True)
+                    archive_path = archive_dir / f"action_logs_before_{cutoff_date.strftime('%Y%m%d')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+                    archive_file = gzip.open(archive_path, 'wt', encoding='utf-8')
+                
+                if archive_file:
+                    for row in rows:
+                        archive_file.write(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n")
+                    # 削除前に書き出しを確定
+                    archive_file.flush()
+                
+                ids = [row['id'] for row in rows]
+                placeholders = ', '.join(['?'] * len(ids))
+                
+                with self.db.transaction():
+                    self.db.execute_query(f"DELETE FROM action_logs WHERE id IN ({placeholders})", ids)
+                
+                deleted_count += len(ids)
+        
+        finally:
+            if archive_file:
+                archive_file.close()
+        
+        if deleted_count:
+            print(f"古いログを削除しました: {deleted_count:,}件（{cutoff_date.date()} より前）")
+            if archive_path:
+                print(f"アーカイブ: {archive_path}")
+        
+        return {'deleted': deleted_count, 'archive_path': str(archive_path) if archive_path else None}
+    
+    def start_retention_job(self, days, archive_dir=None):
+        """保持期間処理をバックグラウンドスレッドで開始"""
+        def run():
+            try:
+                self.apply_retention(days, archive_dir)
+            except Exception as e:
+                print(f"ログ保持期間処理エラー: {e}")
+        
+        thread = threading.Thread(target=run, name='log-retention', daemon=True)
+        thread.start()
+        return thread
+    
     def get_log_count(self, action_type=None):
         """ログ件数取得"""
         try:
+            self.flush()
+            
             if action_type:
                 query = "SELECT COUNT(*) FROM action_logs WHERE action_type = ?"
                 params = (action_type,)
@@ -108,6 +242,8 @@ class Logger:
     def get_log_statistics(self):
         """ログ統計取得"""
         try:
+            self.flush()
+            
             query = """ SELECT action_type, COUNT(*) as count, MAX(timestamp) as last_occurrence FROM action_logs GROUP BY action_type ORDER BY count DESC """
             
             return self.db.fetch_all(query)
@@ -116,31 +252,111 @@ class Logger:
             print(f"ログ統計取得エラー: {e}")
             return []
     
+    # エクスポートするカラムとCSVのヘッダー
+    EXPORT_COLUMNS = [
+        ('id', 'ID'),
+        ('timestamp', 'タイムスタンプ'),
+        ('action_type', 'アクション'),
+        ('details', '詳細'),
+        ('user', 'ユーザー'),
+        ('duration_ms', '処理時間(ms)'),
+        ('created_at', '作成日時')
+    ]
+    
+    # エクスポートで1回に読み込む行数
+    EXPORT_PAGE_SIZE = 5000
+    
     def export_logs(self, file_path, start_date=None, end_date=None):
         """ログをエクスポート"""
         try:
-            import csv
-            
-            logs = self.get_logs(
-                limit=10000,
-                start_date=start_date,
-                end_date=end_date
-            )
+            self.export_logs_streaming(file_path, start_date=start_date, end_date=end_date)
+            return True
             
+        except Exception as e:
+            print(f"ログエクスポートエラー: {e}")
+            return False
+    
+    def export_logs_streaming(self, file_path, start_date=None, end_date=None, action_type=None,
+                              file_format=None, page_size=None):
+        """ログをページ単位で読み込みながらファイルに書き出し、書き出した行数を返す
+        
+        (timestamp, id) のキーセットページングで古い順に読み込むため、
+        ログの件数にかかわらずメモリ使用量は1ページ分で一定。
+        file_format は 'csv' または 'jsonl'（省略時は拡張子から判定）。
+        読み込みに失敗した場合は途中まで書いたファイルを削除して例外を送出する。
+        """
+        import csv
+        
+        page_size = page_size or self.EXPORT_PAGE_SIZE
+        file_path = Path(file_path)
+        
+        if file_format is None:
+            file_format = 'jsonl' if file_path.suffix.lower() in ('.jsonl', '.json') else 'csv'
+        
+        if file_format not in ('csv', 'jsonl'):
+            raise ValueError(f"未対応の出力形式: {file_format}")
+        
+        self.flush()
+        
+        columns = [name for name, _ in self.EXPORT_COLUMNS]
+        
+        conditions = ["timestamp IS NOT NULL"]
+        params = []
+        
+        if action_type:
+            conditions.append("action_type = ?")
+            params.append(action_type)
+        
+        if start_date:
+            conditions.append("timestamp >= ?")
+            params.append(start_date)
+        
+        if end_date:
+            conditions.append("timestamp <= ?")
+            params.append(end_date)
+        
+        base_query = f"SELECT {', '.join(columns)} FROM action_logs WHERE {' AND '.join(conditions)}"
+        
+        written_count = 0
+        last_key = None
+        
+        try:
             with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                if logs:
+                if file_format == 'csv':
                     writer = csv.writer(f)
+                    writer.writerow([header for _, header in self.EXPORT_COLUMNS])
+                
+                while True:
+                    if last_key is None:
+                        query = f"{base_query} ORDER BY timestamp, id LIMIT ?"
+                        page_params = params + [page_size]
+                    else:
+                        query = f"{base_query} AND (timestamp, id) > (?, ?) ORDER BY timestamp, id LIMIT ?"
+                        page_params = params + [last_key[0], last_key[1], page_size]
                     
-                    # ヘッダー
-                    headers = ['ID', 'タイムスタンプ', 'アクション', '詳細', 'ユーザー', '作成日時']
-                    writer.writerow(headers)
+                    # fetch_all はエラーで空リストを返すため、途中で打ち切られないよう例外を送出させる
+                    rows = self.db.execute_read(query, tuple(page_params)).fetchall()
                     
-                    # データ
-                    for log in logs:
-                        writer.writerow(log)
-            
-            return True
-            
+                    if not rows:
+                        break
+                    
+                    if file_format == 'csv':
+                        writer.writerows(tuple(row) for row in rows)
+                    else:
+                        for row in rows:
+                            f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n")
+                    
+                    written_count += len(rows)
+                    last_key = (rows[-1]['timestamp'], rows[-1]['id'])
+                    
+                    if len(rows) < page_size:
+                        break
+        
         except Exception as e:
             print(f"ログエクスポートエラー: {e}")
-            return False
\ No newline at end of file
+            file_path.unlink(missing_ok=True)
+            raise
+        
+        print(f"ログをエクスポートしました: {written_count:,}件 → {file_path}")
+        
+        return written_count
\ No newline at end of file
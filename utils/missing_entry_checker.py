@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+
+
+ENROLLMENT_COLUMNS = ['course_number', 'course_name', 'student_number', 'student_name']
+
+
+class MissingEntryChecker:
+    """履修者マスタと照合して評定・観点の未入力者を抽出するクラス
+
+    1つの期間は、履修者テーブルを1回だけ走査し、評定・観点それぞれを
+    UNIQUE(student_number, course_number, period, year) のインデックスで
+    NOT EXISTS 判定する（評定と観点で別々に結合しない）。全年度・全期間は、
+    取り込みのある期間ごとに同じ判定を行ってまとめる。
+
+    結果は (年度, 期間) ごとに、評定・観点テーブルの変更カウンタ
+    （DatabaseManager.get_table_version）と他のプロセスによる更新の値
+    （get_external_data_version）の組と一緒に保持するため、画面表示の後の
+    Excel出力や同じ期間の再チェックでは問い合わせを行わない。取り込み・削除や
+    マスタ管理アプリからの書き込み（履修者の登録など）があると値が変わり、
+    次回は再計算される。操作ログの書き込みでは変わらない。
+    """
+
+    def __init__(self, db_manager, max_results=16):
+        """初期化"""
+        self.db_manager = db_manager
+        self.max_results = max_results
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, year, period):
+        """指定した年度・期間の未入力者を取得
+
+        Returns:
+            dict: {'grades': [行の辞書], 'viewpoints': [行の辞書]}
+        """
+        return self.get_cached((year, period), lambda: self.query_slice(year, period))
+
+    def check_all(self):
+        """全年度・全期間の未入力者を取得（行の辞書に year, period を含む）"""
+        return self.get_cached((None, None), self.compute_all)
+
+    def get_version(self):
+        """評定・観点の変更カウンタと他のプロセスによる更新の値の組"""
+        return (
+            self.db_manager.get_table_version('grades'),
+            self.db_manager.get_table_version('viewpoint_evaluations'),
+            self.db_manager.get_external_data_version()
+        )
+
+    def get_cached(self, slice_key, compute):
+        """バージョンが同じ間は前回の結果を返す"""
+        # 計算を始める前の値で保存する（計算中の書き込みは次回の取得で検出される）
+        key = slice_key + self.get_version()
+
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        result = compute()
+
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+
+        return result
+
+    def clear(self):
+        """保持している結果を破棄"""
+        with self.lock:
+            self.results.clear()
+
+    def ensure_enrollments(self):
+        """履修者テーブルの存在を確認"""
+        if not self.db_manager.table_exists('enrollments'):
+            raise Exception("履修者テーブル（enrollments）がありません。マスタ管理アプリで履修者を登録してください")
+
+    def query_slice(self, year, period):
+        """1期間分を1回の問い合わせで抽出"""
+        self.ensure_enrollments()
+
+        query = """
+            SELECT e.course_number, e.course_name, e.student_number, e.student_name,
+                NOT EXISTS (
+                    SELECT 1 FROM grades g
+                    WHERE g.student_number = e.student_number AND g.course_number = e.course_number
+                        AND g.period = :period AND g.year = :year
+                ) AS missing_grade,
+                NOT EXISTS (
+                    SELECT 1 FROM viewpoint_evaluations v
+                    WHERE v.student_number = e.student_number AND v.course_number = e.course_number
+                        AND v.period = :period AND v.year = :year
+                ) AS missing_viewpoint
+            FROM enrollments e
+            WHERE missing_grade OR missing_viewpoint
+            ORDER BY e.course_number, e.student_number
+        """
+
+        try:
+            rows = self.db_manager.execute_read(query, {'year': year, 'period': period}).fetchall()
+        except Exception as e:
+            print(f"未入力チェックエラー: {e}")
+            raise
+
+        result = {'grades': [], 'viewpoints': []}
+
+        for row in rows:
+            record = {column: row[column] for column in ENROLLMENT_COLUMNS}
+            if row['missing_grade']:
+                result['grades'].append(record)
+            if row['missing_viewpoint']:
+                result['viewpoints'].append(record)
+
+        return result
+
+    def get_slices(self):
+        """評定・観点のどちらかに取り込みがある (年度, 期間) の一覧"""
+        query = """
+            SELECT year, period FROM grades WHERE year IS NOT NULL AND period IS NOT NULL
+            UNION
+            SELECT year, period FROM viewpoint_evaluations WHERE year IS NOT NULL AND period IS NOT NULL
+            ORDER BY year, period
+        """
+        return [(row['year'], row['period']) for row in self.db_manager.execute_read(query).fetchall()]
+
+    def compute_all(self):
+        """全年度・全期間分を抽出（期間ごとの結果は1期間のチェックと共有する）"""
+        self.ensure_enrollments()
+
+        try:
+            slices = self.get_slices()
+        except Exception as e:
+            print(f"未入力チェックエラー: {e}")
+            raise
+
+        result = {'grades': [], 'viewpoints': []}
+
+        for year, period in slices:
+            missing_entries = self.check(year, period)
+
+            for key, rows in missing_entries.items():
+                result[key].extend(dict(year=year, period=period, **row) for row in rows)
+
+        return result
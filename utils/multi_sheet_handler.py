@@ -1,6 +1,13 @@
+import shutil
+import tempfile
 import pandas as pd
+from datetime import datetime
+from itertools import chain, islice
 from pathlib import Path
 from openpyxl import load_workbook
+from utils.workbook_reader import WorkbookReader
+from utils.excel_exporter import ExcelExporter
+from utils.job_control import OperationCancelled, check_cancelled
 
 
 class MultiSheetHandler:
@@ -22,46 +29,42 @@ class MultiSheetHandler:
         try:
             print(f"ファイル読み込み中: {Path(file_path).name}")
             
-            wb = load_workbook(file_path, read_only=True)
-            sheet_names = wb.sheetnames
-            wb.close()
-            
-            print(f"シート数: {len(sheet_names)}")
-            
-            if exclude_sheets:
-                sheet_names = [s for s in sheet_names if s not in exclude_sheets]
-                print(f"除外後のシート数: {len(sheet_names)}")
-            
-            dfs = []
-            total_rows = 0
-            
-            for idx, sheet_name in enumerate(sheet_names):
-                print(f"シート {idx+1}/{len(sheet_names)} 読み込み中: {sheet_name}")
+            # ブックは1回だけ開き、各シートは同じハンドルから読み込む
+            with WorkbookReader(file_path) as reader:
+                sheet_names = reader.sheet_names
                 
-                try:
-                    df = pd.read_excel(
-                        file_path,
-                        sheet_name=sheet_name,
-                        header=header_row
-                    )
+                print(f"シート数: {len(sheet_names)}")
+                
+                if exclude_sheets:
+                    sheet_names = [s for s in sheet_names if s not in exclude_sheets]
+                    print(f"除外後のシート数: {len(sheet_names)}")
+                
+                dfs = []
+                total_rows = 0
+                
+                for idx, sheet_name in enumerate(sheet_names):
+                    print(f"シート {idx+1}/{len(sheet_names)} 読み込み中: {sheet_name}")
                     
-                    # 空のDataFrameはスキップ
-                    if df.empty:
-                        print(f"  空のシート - スキップ")
+                    try:
+                        df = reader.read_sheet(sheet_name, header=header_row)
+                        
+                        # 空のDataFrameはスキップ
+                        if df.empty:
+                            print(f"  空のシート - スキップ")
+                            continue
+                        
+                        print(f"  読み込み完了: {len(df)}行")
+                        
+                        # シート名をカラムとして追加
+                        df['_source_sheet'] = sheet_name
+                        dfs.append(df)
+                        total_rows += len(df)
+                        
+                        print(f"  累計: {total_rows}行")
+                        
+                    except Exception as e:
+                        print(f"  シート読み込みエラー: {e}")
                         continue
-                    
-                    print(f"  読み込み完了: {len(df)}行")
-                    
-                    # シート名をカラムとして追加
-                    df['_source_sheet'] = sheet_name
-                    dfs.append(df)
-                    total_rows += len(df)
-                    
-                    print(f"  累計: {total_rows}行")
-                    
-                except Exception as e:
-                    print(f"  シート読み込みエラー: {e}")
-                    continue
             
             if not dfs:
                 raise Exception("有効なデータを含むシートが見つかりませんでした")
@@ -76,74 +79,82 @@ class MultiSheetHandler:
         except Exception as e:
             raise Exception(f"複数シート統合エラー: {str(e)}")
     
+    # 統合ファイルの1シートあたりの最大データ行数（Excelの上限 1,048,576 行からヘッダーを除く）
+    MAX_SHEET_ROWS = 1048575
+    
+    # 中間ファイルから書き出すときのバッチ行数
+    WRITE_BATCH_SIZE = 5000
+    
     @staticmethod
-    def merge_multiple_files(file_paths, header_row=0, output_path=None):
+    def merge_multiple_files(file_paths, header_row=0, output_path=None, progress_callback=None, cancel_token=None):
         """
-        複数ファイルを1つに統合（最適化版）
+        複数ファイルを1つに統合（ディスク退避版）
+        
+        各シートは読み込んだ直後に中間ファイル（pickle）へ退避してメモリから解放し、
+        出力時は中間ファイルを1つずつ読み戻して XlsxWriter の constant_memory で
+        書き出す。メモリに載るのは最大のシート1枚分だけで、全データを結合した
+        DataFrame は作らない。データ行数がExcelの上限を超える場合は
+        Sheet2, Sheet3 ... に続けて出力する。
         
         Args:
             file_paths: ファイルパスのリスト
             header_row: ヘッダー行番号
             output_path: 出力先パス（省略時は自動生成）
+            progress_callback: 進捗コールバック (current, total, message)
+            cancel_token: キャンセル制御（CancelToken）
         
         Returns:
             str: 出力されたファイルパス
         """
+        temp_root = Path("data/temp")
+        temp_root.mkdir(parents=True, exist_ok=True)
+        spill_dir = Path(tempfile.mkdtemp(prefix="merge_", dir=temp_root))
+        
+        exporter = ExcelExporter()
+        workbook = None
+        
         try:
             print(f"\n=== 複数ファイル統合開始 ===")
             print(f"ファイル数: {len(file_paths)}")
             
-            # 中間ファイルリスト
-            temp_files = []
-            temp_dir = Path("data/temp")
-            temp_dir.mkdir(parents=True, exist_ok=True)
+            # (中間ファイル, 元ファイル名, 行数) のリストと、出現順の全カラム
+            spills = []
+            columns = []
             
             for idx, file_path in enumerate(file_paths):
-                print(f"\n[{idx+1}/{len(file_paths)}] 処理中: {Path(file_path).name}")
+                check_cancelled(cancel_token)
+                file_name = Path(file_path).name
+                print(f"\n[{idx+1}/{len(file_paths)}] 処理中: {file_name}")
+                
+                if progress_callback:
+                    progress_callback(idx, len(file_paths), f"読み込み中: {file_name}")
                 
                 try:
-                    # 各ファイルをシート統合
-                    df = MultiSheetHandler.convert_sheets_to_vertical(
-                        file_path,
-                        header_row
+                    file_spills, file_columns = MultiSheetHandler.spill_sheets(
+                        file_path, header_row, spill_dir, f"{idx}", cancel_token
                     )
-                    
-                    # ファイル名をカラムとして追加
-                    df['_source_file'] = Path(file_path).name
-                    
-                    # 中間ファイルとして保存（メモリ節約）
-                    temp_path = temp_dir / f"temp_{idx}.xlsx"
-                    print(f"中間ファイル保存中...")
-                    df.to_excel(temp_path, index=False, engine='openpyxl')
-                    temp_files.append(temp_path)
-                    
-                    print(f"✓ ファイル処理完了: {len(df)}行")
-                    
-                    # メモリ解放
-                    del df
-                    
+                except OperationCancelled:
+                    raise
                 except Exception as e:
                     print(f"❌ ファイル処理エラー: {e}")
                     continue
+                
+                # ファイル名の列は各ファイルのシート列の後ろに付ける
+                for column in file_columns + ['_source_file']:
+                    if column not in columns:
+                        columns.append(column)
+                
+                spills.extend((path, file_name, rows) for path, rows in file_spills)
+                print(f"✓ ファイル処理完了: {sum(rows for _, rows in file_spills)}行")
             
-            if not temp_files:
+            if not spills:
                 raise Exception("有効なデータを含むファイルが見つかりませんでした")
             
-            print(f"\n中間ファイル統合中...")
-            # 中間ファイルを読み込んで統合
-            all_dfs = []
-            for idx, temp_file in enumerate(temp_files):
-                print(f"中間ファイル {idx+1}/{len(temp_files)} 読み込み中...")
-                df = pd.read_excel(temp_file)
-                all_dfs.append(df)
-            
-            print(f"全データ統合中...")
-            final_df = pd.concat(all_dfs, ignore_index=True)
-            print(f"統合完了: 総行数 {len(final_df)}行")
+            total_rows = sum(rows for _, _, rows in spills)
+            print(f"\n統合出力: 総行数 {total_rows}行")
             
             # 出力先パス生成
             if output_path is None:
-                from datetime import datetime
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_path = f"data/merged/merged_{timestamp}.xlsx"
             
@@ -151,37 +162,111 @@ class MultiSheetHandler:
             Path(output_path).parent.mkdir(parents=True, exist_ok=True)
             
             print(f"Excelファイル出力中: {Path(output_path).name}")
-            final_df.to_excel(output_path, index=False, engine='openpyxl')
-            print(f"✓ 出力完了")
+            workbook, formats = exporter.create_workbook(output_path)
             
-            # 中間ファイル削除
-            print(f"中間ファイル削除中...")
-            for temp_file in temp_files:
-                try:
-                    temp_file.unlink()
-                except Exception as e:
-                    print(f"中間ファイル削除エラー: {e}")
+            rows = chain.from_iterable(
+                MultiSheetHandler.iter_spilled_batches(spills, columns, cancel_token)
+            )
+            sheet_number = 1
             
-            # 一時ディレクトリ削除
-            try:
-                temp_dir.rmdir()
-            except:
-                pass
+            while True:
+                first_row = next(rows, None)
+                if first_row is None:
+                    break
+                
+                # 1シートの上限行数まで書き出し、残りは次のシートへ
+                sheet_rows = chain([first_row], islice(rows, MultiSheetHandler.MAX_SHEET_ROWS - 1))
+                sheet_batches = iter(
+                    lambda: list(islice(sheet_rows, MultiSheetHandler.WRITE_BATCH_SIZE)), []
+                )
+                exporter.write_sheet(
+                    workbook, formats, f"Sheet{sheet_number}", columns, sheet_batches,
+                    total_rows, progress_callback, cancel_token
+                )
+                sheet_number += 1
+            
+            exporter.finish_export(workbook, output_path, progress_callback, cancel_token)
+            print(f"✓ 出力完了")
             
             return output_path
         
+        except OperationCancelled:
+            exporter.close_quietly(workbook)
+            if workbook is not None:
+                exporter.remove_partial_file(output_path)
+            raise
+        
         except Exception as e:
-            # エラー時も中間ファイルを削除
+            exporter.close_quietly(workbook)
+            if workbook is not None:
+                exporter.remove_partial_file(output_path)
+            raise Exception(f"複数ファイル統合エラー: {str(e)}")
+        
+        finally:
+            # 中間ファイル削除
+            shutil.rmtree(spill_dir, ignore_errors=True)
             try:
-                temp_dir = Path("data/temp")
-                if temp_dir.exists():
-                    for temp_file in temp_dir.glob("temp_*.xlsx"):
-                        temp_file.unlink()
-                    temp_dir.rmdir()
-            except:
+                temp_root.rmdir()
+            except OSError:
                 pass
+    
+    @staticmethod
+    def spill_sheets(file_path, header_row, spill_dir, prefix, cancel_token=None):
+        """1ファイルの各シートを中間ファイルに退避し、(中間ファイル, 行数) のリストとカラム一覧を返す"""
+        spills = []
+        columns = []
+        
+        # ブックは1回だけ開き、各シートは同じハンドルから読み込む
+        with WorkbookReader(file_path) as reader:
+            for sheet_idx, sheet_name in enumerate(reader.sheet_names):
+                check_cancelled(cancel_token)
+                
+                try:
+                    df = reader.read_sheet(sheet_name, header=header_row)
+                except Exception as e:
+                    print(f"  シート読み込みエラー: {e}")
+                    continue
+                
+                # 空のDataFrameはスキップ
+                if df.empty:
+                    print(f"  空のシート - スキップ: {sheet_name}")
+                    continue
+                
+                # シート名をカラムとして追加
+                df['_source_sheet'] = sheet_name
+                
+                for column in df.columns:
+                    if column not in columns:
+                        columns.append(column)
+                
+                spill_path = Path(spill_dir) / f"{prefix}_{sheet_idx}.pkl"
+                df.to_pickle(spill_path)
+                spills.append((spill_path, len(df)))
+                print(f"  {sheet_name}: {len(df)}行")
+                
+                # メモリ解放
+                del df
+        
+        if not spills:
+            raise Exception("有効なデータを含むシートが見つかりませんでした")
+        
+        return spills, columns
+    
+    @staticmethod
+    def iter_spilled_batches(spills, columns, cancel_token=None):
+        """中間ファイルを1つずつ読み戻し、columns の順に並べた行のバッチを返すジェネレータ"""
+        for spill_path, file_name, _ in spills:
+            check_cancelled(cancel_token)
             
-            raise Exception(f"複数ファイル統合エラー: {str(e)}")
+            df = pd.read_pickle(spill_path)
+            df['_source_file'] = file_name
+            df = df.reindex(columns=columns)
+            
+            for start in range(0, len(df), MultiSheetHandler.WRITE_BATCH_SIZE):
+                chunk = df.iloc[start:start + MultiSheetHandler.WRITE_BATCH_SIZE]
+                yield list(chunk.itertuples(index=False, name=None))
+            
+            del df
     
     @staticmethod
     def get_sheet_names(file_path):
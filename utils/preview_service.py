@@ -0,0 +1,303 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import pandas as pd
+from openpyxl import load_workbook
+from utils.job_control import check_cancelled
+
+
+def count_data_rows(sheet_info, header_row):
+    """走査結果から、ヘッダー行より下のデータ行数を求める
+
+    pd.read_excel での取り込みと同じく、途中の空行は数え、末尾の空行は数えない。
+    """
+    return max(sheet_info['last_nonempty_row'] - (header_row + 1), 0)
+
+
+def detect_header_candidates(rows, max_candidates=3):
+    """先頭行の中からヘッダーらしい行（文字列のセルが多い行）を候補順に返す
+
+    戻り値は0始まりの行番号のリスト（ヘッダー行の設定値と同じ）。
+    """
+    scored = []
+
+    for i, row in enumerate(rows):
+        text_cells = sum(1 for v in row if isinstance(v, str) and v.strip())
+        # 1列だけの行はタイトル行とみなす
+        if text_cells >= 2:
+            scored.append((-text_cells, i))
+
+    return [i for _, i in sorted(scored)[:max_candidates]]
+
+
+class PreviewService:
+    """シートの先頭行だけを読み込むプレビュー用クラス
+
+    openpyxl の読み取り専用モードでシートを先頭から必要な行数だけ読むため、
+    ブック全体を解析しない。開いたブックと読み込んだプレビューは
+    (ファイル, シート, ヘッダー行) ごとに保持し、シートを切り替えて
+    戻った場合やヘッダー行を戻した場合は読み込みを行わない。
+    .xls など openpyxl で開けない形式は pd.read_excel で読み込む。
+    """
+
+    def __init__(self, max_rows=10, max_workbooks=4, max_previews=256):
+        """初期化"""
+        self.max_rows = max_rows
+        self.max_workbooks = max_workbooks
+        self.max_previews = max_previews
+        self.workbooks = OrderedDict()
+        self.previews = OrderedDict()
+        self.sheet_names = {}
+        self.lock = threading.RLock()
+
+    def get_file_key(self, file_path):
+        """ファイルのキー（更新されたら別のキーになる）"""
+        path = Path(file_path)
+        stat = path.stat()
+        return (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    def is_openpyxl_file(self, file_path):
+        """openpyxl で読み込める形式か"""
+        return Path(file_path).suffix.lower() in ('.xlsx', '.xlsm')
+
+    def get_workbook(self, file_key):
+        """読み取り専用でブックを開く（開いたものは使い回す）"""
+        workbook = self.workbooks.get(file_key)
+
+        if workbook is not None:
+            self.workbooks.move_to_end(file_key)
+            return workbook
+
+        workbook = load_workbook(file_key[0], read_only=True, data_only=True)
+        self.workbooks[file_key] = workbook
+
+        while len(self.workbooks) > self.max_workbooks:
+            _, old_workbook = self.workbooks.popitem(last=False)
+            old_workbook.close()
+
+        return workbook
+
+    def get_sheet_names(self, file_path):
+        """シート名のリストを取得"""
+        with self.lock:
+            file_key = self.get_file_key(file_path)
+
+            if file_key in self.sheet_names:
+                return list(self.sheet_names[file_key])
+
+            try:
+                if self.is_openpyxl_file(file_path):
+                    sheet_names = list(self.get_workbook(file_key).sheetnames)
+                else:
+                    with pd.ExcelFile(file_path) as excel_file:
+                        sheet_names = list(excel_file.sheet_names)
+            except Exception as e:
+                raise Exception(f"シート名取得エラー ({Path(file_path).name}): {str(e)}")
+
+            self.sheet_names[file_key] = sheet_names
+            return list(sheet_names)
+
+    def get_preview(self, file_path, sheet_name=None, header_row=0, nrows=None):
+        """シートの先頭 nrows 行を DataFrame で取得（sheet_name 省略時は先頭シート）"""
+        if nrows is None:
+            nrows = self.max_rows
+
+        with self.lock:
+            file_key = self.get_file_key(file_path)
+
+            if sheet_name is None:
+                sheet_name = self.get_sheet_names(file_path)[0]
+
+            preview_key = (file_key, sheet_name, header_row)
+            df = self.previews.get(preview_key)
+
+            # より多くの行を読み込み済みならそこから返す
+            if df is not None and df.attrs.get('preview_rows', 0) >= nrows:
+                self.previews.move_to_end(preview_key)
+                return df.head(nrows)
+
+            try:
+                if self.is_openpyxl_file(file_path):
+                    df = self.read_rows(file_key, sheet_name, header_row, nrows)
+                else:
+                    df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row, nrows=nrows)
+            except Exception as e:
+                raise Exception(f"プレビュー読み込みエラー ({Path(file_path).name}): {str(e)}")
+
+            self.store_preview(preview_key, df, nrows)
+            return df.head(nrows)
+
+    def store_preview(self, preview_key, df, nrows):
+        """プレビューをキャッシュに保存"""
+        with self.lock:
+            df.attrs['preview_rows'] = nrows
+            self.previews[preview_key] = df
+
+            while len(self.previews) > self.max_previews:
+                self.previews.popitem(last=False)
+
+    def get_columns(self, file_path, sheet_name=None, header_row=0):
+        """ヘッダー行のカラム名を取得"""
+        return self.get_preview(file_path, sheet_name, header_row).columns.tolist()
+
+    def read_rows(self, file_key, sheet_name, header_row, nrows):
+        """読み取り専用ワークシートから ヘッダー行＋nrows 行だけ読み込む"""
+        worksheet = self.get_workbook(file_key)[sheet_name]
+
+        # 保存元のアプリによっては寸法情報が不正確なため、実際の行から判定する
+        worksheet.reset_dimensions()
+
+        rows = []
+        for row in worksheet.iter_rows(max_row=header_row + 1 + nrows, values_only=True):
+            rows.append(list(row))
+
+        return self.rows_to_frame(rows, header_row)
+
+    def rows_to_frame(self, rows, header_row):
+        """シート先頭の行（値のリスト）から DataFrame を作成"""
+        if len(rows) <= header_row:
+            return pd.DataFrame()
+
+        header = rows[header_row]
+        data = rows[header_row + 1:]
+
+        # 途中の空行は pd.read_excel と同様に残し（行番号を取り込みと合わせる）、末尾の空行だけ除く
+        while data and all(v is None for v in data[-1]):
+            data = data[:-1]
+
+        # 末尾の空の列は pd.read_excel と同様に除外する
+        width = 0
+        for row in [header] + data:
+            for i in range(len(row) - 1, width - 1, -1):
+                if row[i] is not None:
+                    width = i + 1
+                    break
+
+        columns = self.make_column_names(list(header[:width]) + [None] * (width - len(header)))
+        data = [list(row[:width]) + [None] * (width - len(row)) for row in data]
+
+        return pd.DataFrame(data, columns=columns)
+
+    def make_column_names(self, header):
+        """pd.read_excel と同じ規則でカラム名を作成（空欄は Unnamed: n、重複は .1, .2 ...）"""
+        columns = []
+        seen = {}
+
+        for i, value in enumerate(header):
+            name = f"Unnamed: {i}" if value is None else value
+
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+
+            columns.append(name)
+
+        return columns
+
+    def scan_workbook(self, file_path, header_row=0, cancel_token=None, on_sheet_names=None, on_sheet_scanned=None):
+        """ブックの全シートを走査し、シートごとの情報を返す（ワーカースレッド用）
+
+        シート名を取得した時点で on_sheet_names(シート名リスト) を、各シートの走査が
+        終わるたびに on_sheet_scanned(シート情報) を呼ぶ。走査した先頭行は
+        header_row のプレビューとしてキャッシュするため、走査後のプレビュー表示は
+        ブックを読まない。シート情報は次のキーを持つ辞書:
+            sheet_name, max_row, max_column（ブックに記録された寸法）,
+            nonempty_rows, last_nonempty_row（最後の空でない行までの行数）,
+            leading_nonempty, header_candidates, data_rows
+        """
+        sheet_names = self.get_sheet_names(file_path)
+        if on_sheet_names:
+            on_sheet_names(sheet_names)
+
+        file_key = self.get_file_key(file_path)
+        scan_rows = max(self.max_rows + header_row + 1, 10)
+        results = {}
+
+        if self.is_openpyxl_file(file_path):
+            # UIスレッドのプレビューと共有しないよう、走査用に別途開く
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+        else:
+            workbook = pd.ExcelFile(file_path)
+
+        try:
+            for sheet_name in sheet_names:
+                check_cancelled(cancel_token)
+
+                if self.is_openpyxl_file(file_path):
+                    worksheet = workbook[sheet_name]
+                    max_row, max_column = worksheet.max_row, worksheet.max_column
+                    worksheet.reset_dimensions()
+                    row_iter = worksheet.iter_rows(values_only=True)
+                else:
+                    frame = workbook.parse(sheet_name=sheet_name, header=None)
+                    max_row, max_column = frame.shape
+                    row_iter = (
+                        [None if pd.isna(v) else v for v in row]
+                        for row in frame.itertuples(index=False)
+                    )
+
+                head_rows = []
+                nonempty_rows = 0
+                last_nonempty_row = 0
+
+                for i, row in enumerate(row_iter):
+                    if i < scan_rows:
+                        head_rows.append(list(row))
+                    elif i % 5000 == 0:
+                        check_cancelled(cancel_token)
+
+                    if any(v is not None for v in row):
+                        nonempty_rows += 1
+                        last_nonempty_row = i + 1
+
+                info = {
+                    'sheet_name': sheet_name,
+                    'max_row': max_row,
+                    'max_column': max_column,
+                    'nonempty_rows': nonempty_rows,
+                    'last_nonempty_row': last_nonempty_row,
+                    'leading_nonempty': [any(v is not None for v in row) for row in head_rows],
+                    'header_candidates': detect_header_candidates(head_rows)
+                }
+                info['data_rows'] = count_data_rows(info, header_row)
+                results[sheet_name] = info
+
+                preview_rows = head_rows[:header_row + 1 + self.max_rows]
+                self.store_preview(
+                    (file_key, sheet_name, header_row),
+                    self.rows_to_frame(preview_rows, header_row),
+                    self.max_rows
+                )
+
+                if on_sheet_scanned:
+                    on_sheet_scanned(info)
+        finally:
+            workbook.close()
+
+        return results
+
+    def invalidate(self, file_path=None):
+        """プレビューのキャッシュを破棄（file_path 省略時は全て）"""
+        with self.lock:
+            if file_path is None:
+                self.previews.clear()
+                self.sheet_names.clear()
+                return
+
+            path = str(Path(file_path).resolve())
+            for key in [k for k in self.previews if k[0][0] == path]:
+                del self.previews[key]
+            for key in [k for k in self.sheet_names if k[0] == path]:
+                del self.sheet_names[key]
+
+    def close(self):
+        """開いているブックを全て閉じる"""
+        with self.lock:
+            for workbook in self.workbooks.values():
+                try:
+                    workbook.close()
+                except Exception as e:
+                    print(f"ブッククローズエラー: {e}")
+            self.workbooks.clear()
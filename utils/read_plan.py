@@ -0,0 +1,118 @@
+import math
+from pathlib import Path
+from database.migrations import load_column_definitions
+
+
+def is_blank(value):
+    """空のセルか（None・NaN・空文字）"""
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return isinstance(value, str) and value.strip() == ''
+
+
+def convert_text(value):
+    """TEXT 列の変換（数値として保存されたセルは "1001.0" ではなく "1001" にする）"""
+    if is_blank(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, str):
+        # 文字列のセルはそのまま（先頭の 0 を残す）
+        return value.strip()
+    return str(value)
+
+
+def convert_number(value):
+    """INTEGER / REAL 列の変換（数値にできない値は元の値のまま残す）"""
+    if is_blank(value):
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value) if isinstance(value, float) and value.is_integer() else value
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() else number
+
+
+# db_columns.json の型ごとの変換関数（型が無いものは変換しない）
+CONVERTERS = {
+    'TEXT': convert_text,
+    'INTEGER': convert_number,
+    'REAL': convert_number,
+    'NUMERIC': convert_number
+}
+
+
+class ReadPlan:
+    """シート読み込み時に使う列と変換をまとめた読み込み計画
+
+    カラムマッピングと取り込み先の列から、読み込む Excel 列（usecols）と
+    列ごとの変換（converters）を決める。マッピングされていない列は
+    読み込み時点で除外されるため、型推定も DataFrame 化も行われない。
+
+    使用例:
+        plan = ReadPlan.for_table(column_mapping, columns, 'grades')
+        df = reader.read_sheet(sheet_name, header=0, **plan.read_kwargs())
+        df = df.rename(columns=column_mapping)
+    """
+
+    def __init__(self, column_mapping, keep_columns, column_types=None):
+        """初期化
+
+        column_mapping は {Excel列名: DB列名}、keep_columns は取り込み先で使う
+        DB列名、column_types は {DB列名: 型} （db_columns.json の type）。
+        """
+        column_mapping = dict(column_mapping or {})
+        column_types = column_types or {}
+        keep = set(keep_columns)
+
+        # Excel列名 → DB列名（取り込み先で使う列のみ）
+        self.source_columns = {
+            str(source): target for source, target in column_mapping.items() if target in keep
+        }
+
+        # マッピングが無くても DB列名と同じ名前の列はそのまま使われる
+        mapped_targets = set(self.source_columns.values())
+        for column in keep_columns:
+            if column not in mapped_targets and column not in self.source_columns:
+                self.source_columns[column] = column
+
+        self.column_types = {
+            source: str(column_types.get(target, '')).upper()
+            for source, target in self.source_columns.items()
+        }
+        self.converters = {
+            source: CONVERTERS[column_type]
+            for source, column_type in self.column_types.items()
+            if column_type in CONVERTERS
+        }
+
+    @classmethod
+    def for_table(cls, column_mapping, keep_columns, table_name, config_path=None):
+        """db_columns.json の型を使って読み込み計画を作成"""
+        if config_path is None:
+            config_path = Path(__file__).parent.parent / 'config' / 'db_columns.json'
+
+        definitions = load_column_definitions(config_path)
+        column_types = dict(definitions.get(table_name, []))
+        return cls(column_mapping, keep_columns, column_types)
+
+    def use_column(self, column_name):
+        """読み込む列か（pd.read_excel の usecols に渡す）"""
+        return str(column_name) in self.source_columns
+
+    def read_kwargs(self):
+        """WorkbookReader.read_sheet / pd.read_excel に渡す引数"""
+        return {'usecols': self.use_column, 'converters': dict(self.converters)}
+
+    def signature(self):
+        """キャッシュキー用の文字列（列と型が同じなら同じ値）"""
+        return ';'.join(
+            f"{source}>{target}:{self.column_types[source]}"
+            for source, target in sorted(self.source_columns.items())
+        )
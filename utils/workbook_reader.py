@@ -0,0 +1,108 @@
+import pandas as pd
+from pathlib import Path
+from utils.import_cache import compute_file_hash
+
+
+class WorkbookReader:
+    """Excelブックを1回だけ開き、同じハンドルから各シートを読み込むクラス
+
+    pd.read_excel(file_path, sheet_name=...) をシートごとに呼ぶと、
+    そのたびにzip/XML全体を開き直して解析するため、複数シートの処理では
+    このクラスで1回だけ開いたハンドルを使い回す。
+
+    使用例:
+        with WorkbookReader(file_path) as reader:
+            for sheet_name, df in reader.iter_sheets(header=0):
+                ...
+
+    cache（ImportCache）を渡した場合、シート名と読み込んだシートを
+    ファイル内容のハッシュで保存し、同じ内容のブックではブックを開かずに返す。
+    """
+
+    def __init__(self, file_path, cache=None):
+        """初期化"""
+        self.file_path = str(file_path)
+        self.excel_file = None
+        self.cache = cache
+        self._file_hash = None
+
+    def __enter__(self):
+        # キャッシュ使用時はキャッシュに無いシートを読むときまで開かない
+        if self.cache is not None:
+            return self
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def open(self):
+        """ブックを開く（既に開いている場合は何もしない）"""
+        if self.excel_file is None:
+            try:
+                self.excel_file = pd.ExcelFile(self.file_path)
+            except Exception as e:
+                raise Exception(f"ブック読み込みエラー ({Path(self.file_path).name}): {str(e)}")
+        return self
+
+    def close(self):
+        """ブックを閉じる"""
+        if self.excel_file is not None:
+            try:
+                self.excel_file.close()
+            except Exception as e:
+                print(f"ブッククローズエラー: {e}")
+            self.excel_file = None
+
+    @property
+    def file_hash(self):
+        """ファイル内容のハッシュ（キャッシュキー用）"""
+        if self._file_hash is None:
+            self._file_hash = compute_file_hash(self.file_path)
+        return self._file_hash
+
+    @property
+    def sheet_names(self):
+        """シート名のリスト"""
+        if self.cache is not None:
+            cached = self.cache.get_sheet_names(self.file_hash)
+            if cached is not None:
+                return cached
+
+        self.open()
+        sheet_names = list(self.excel_file.sheet_names)
+
+        if self.cache is not None:
+            self.cache.store_sheet_names(self.file_hash, sheet_names)
+
+        return sheet_names
+
+    def read_sheet(self, sheet_name, header=0, use_cache=True, **kwargs):
+        """開いているハンドルから1シートを読み込む（キャッシュがあればそちらを使用）"""
+        if self.cache is None or not use_cache:
+            return self.parse_sheet(sheet_name, header, **kwargs)
+
+        key = self.cache.make_key(self.file_hash, sheet_name, header, **kwargs)
+        df = self.cache.load_frame(key)
+        if df is not None:
+            return df
+
+        df = self.parse_sheet(sheet_name, header, **kwargs)
+        self.cache.store_frame(key, df)
+        return df
+
+    def parse_sheet(self, sheet_name, header=0, **kwargs):
+        """ブックを開いて1シートを解析"""
+        self.open()
+        return self.excel_file.parse(sheet_name=sheet_name, header=header, **kwargs)
+
+    def iter_sheets(self, sheet_names=None, header=0, exclude_sheets=None, **kwargs):
+        """シートを順に読み込んで (シート名, DataFrame) を返すジェネレータ"""
+        if sheet_names is None:
+            sheet_names = self.sheet_names
+
+        if exclude_sheets:
+            sheet_names = [s for s in sheet_names if s not in exclude_sheets]
+
+        for sheet_name in sheet_names:
+            yield sheet_name, self.read_sheet(sheet_name, header=header, **kwargs)